@@ -1,2 +1,8 @@
 #!/bin/bash
-pyinstaller --onefile --add-data ../config/config.yaml:config --add-data ../resources:resources backend/main.py
+# main.py carga estas dependencias opcionales por nombre (``_importar_opcional``),
+# así que PyInstaller no las ve en su análisis estático y hay que declararlas
+OCULTOS=""
+for modulo in chromadb sentence_transformers pdfplumber fitz docx langdetect; do
+    OCULTOS="$OCULTOS --hidden-import $modulo"
+done
+pyinstaller --onefile $OCULTOS --add-data ../config/config.yaml:config --add-data ../resources:resources backend/main.py
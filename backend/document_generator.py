@@ -1,17 +1,25 @@
 from __future__ import annotations
 
+import re
 from pathlib import Path
+from typing import Optional
 from uuid import uuid4
 
 from fastapi import HTTPException
-try:
-    from docx import Document
-except Exception:  # pragma: no cover - optional dependency
-    Document = None
+
+
+def _clase_documento():
+    """Importa ``docx.Document`` solo cuando se genera un DOCX."""
+    try:
+        from docx import Document
+    except Exception:  # pragma: no cover - optional dependency
+        return None
+    return Document
 
 
 def crear_docx(secciones: dict, tmp_dir: Path) -> str:
     """Construye un archivo DOCX básico a partir de secciones."""
+    Document = _clase_documento()
     if not Document:
         raise HTTPException(status_code=500, detail="Soporte DOCX no disponible")
 
@@ -38,3 +46,201 @@ def crear_docx(secciones: dict, tmp_dir: Path) -> str:
     path = tmp_dir / f"{uuid4()}.docx"
     doc.save(path)
     return str(path)
+
+
+_TITULO = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_VINETA = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+_NUMERADA = re.compile(r"^(\s*)\d+[.)]\s+(.*)$")
+_SEPARADOR_TABLA = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+_REGLA = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_EN_LINEA = re.compile(
+    r"\*\*\*(?P<negrita_cursiva>.+?)\*\*\*"
+    r"|\*\*(?P<negrita>.+?)\*\*"
+    r"|__(?P<negrita2>.+?)__"
+    r"|\*(?P<cursiva>[^*\s][^*]*?)\*"
+    r"|(?<!\w)_(?P<cursiva2>[^_\s][^_]*?)_(?!\w)"
+    r"|`(?P<codigo>[^`]+)`"
+    r"|\[(?P<enlace>[^\]]+)\]\([^)]*\)"
+)
+
+
+def _documento_base(Document, plantilla: Optional[str | Path]):
+    """Documento con los estilos de ``plantilla`` y el cuerpo vacío.
+
+    Igual que ``--reference-doc`` de pandoc, de la plantilla solo se toman los
+    estilos y la configuración de página. Si no es un DOCX válido se usan los
+    estilos por defecto de python-docx.
+    """
+    if plantilla:
+        try:
+            doc = Document(str(plantilla))
+        except Exception:
+            return Document()
+        cuerpo = doc.element.body
+        for hijo in list(cuerpo):
+            if not hijo.tag.endswith("}sectPr"):
+                cuerpo.remove(hijo)
+        return doc
+    return Document()
+
+
+class _Estilos:
+    """Resuelve cada estilo por nombre una sola vez por documento.
+
+    python-docx busca el estilo recorriendo el XML de estilos en cada
+    ``add_paragraph(style=...)``; en informes largos eso domina el tiempo de
+    exportación, así que aquí se asigna directamente el id ya resuelto.
+    """
+
+    def __init__(self, doc) -> None:
+        self.doc = doc
+        self._ids: dict[tuple[str, ...], Optional[str]] = {}
+
+    def nombre(self, *nombres: str) -> Optional[str]:
+        """Primer estilo de ``nombres`` que exista en el documento."""
+        for nombre in nombres:
+            try:
+                self.doc.styles[nombre]
+            except KeyError:
+                continue
+            return nombre
+        return None
+
+    def id(self, *nombres: str) -> Optional[str]:
+        if nombres not in self._ids:
+            nombre = self.nombre(*nombres)
+            self._ids[nombres] = self.doc.styles[nombre].style_id if nombre else None
+        return self._ids[nombres]
+
+    def parrafo(self, *nombres: str):
+        parrafo = self.doc.add_paragraph()
+        estilo = self.id(*nombres)
+        if estilo:
+            parrafo._p.get_or_add_pPr().style = estilo
+        return parrafo
+
+
+def _agregar_texto(parrafo, texto: str) -> None:
+    """Añade ``texto`` con negrita, cursiva y código en línea como runs."""
+    pos = 0
+    for m in _EN_LINEA.finditer(texto):
+        if m.start() > pos:
+            parrafo.add_run(texto[pos:m.start()])
+        tipo = m.lastgroup
+        run = parrafo.add_run(m.group(tipo))
+        if tipo in ("negrita_cursiva", "negrita", "negrita2"):
+            run.bold = True
+        if tipo in ("negrita_cursiva", "cursiva", "cursiva2"):
+            run.italic = True
+        if tipo == "codigo":
+            run.font.name = "Courier New"
+        pos = m.end()
+    if pos < len(texto):
+        parrafo.add_run(texto[pos:])
+
+
+def _celdas(linea: str) -> list[str]:
+    linea = linea.strip()
+    if linea.startswith("|"):
+        linea = linea[1:]
+    if linea.endswith("|"):
+        linea = linea[:-1]
+    return [c.strip() for c in linea.split("|")]
+
+
+def _agregar_tabla(estilos: _Estilos, filas: list[list[str]]) -> None:
+    columnas = max(len(f) for f in filas)
+    tabla = estilos.doc.add_table(rows=len(filas), cols=columnas)
+    estilo = estilos.id("Table Grid")
+    if estilo:
+        tabla._tbl.tblPr.style = estilo
+    for i, fila in enumerate(filas):
+        for j in range(columnas):
+            parrafo = tabla.cell(i, j).paragraphs[0]
+            _agregar_texto(parrafo, fila[j] if j < len(fila) else "")
+            if i == 0:
+                for run in parrafo.runs:
+                    run.bold = True
+
+
+def _agregar_item(estilos: _Estilos, texto: str, sangria: str, numerada: bool) -> None:
+    nivel = min(len(sangria.expandtabs(4)) // 2, 2)
+    base = "List Number" if numerada else "List Bullet"
+    nombres = [f"{base} {nivel + 1}"] if nivel else []
+    _agregar_texto(estilos.parrafo(*nombres, base, "List Paragraph"), texto)
+
+
+def markdown_a_docx(
+    markdown: str, destino: str | Path, plantilla: Optional[str | Path] = None
+) -> str:
+    """Convierte Markdown a DOCX con python-docx, sin lanzar procesos.
+
+    Cubre lo que produce el modelo: títulos ``#``, párrafos, listas con
+    viñetas y numeradas (hasta tres niveles), citas, bloques de código,
+    tablas con barras y negrita/cursiva/código en línea. Los estilos salen de
+    ``plantilla`` si es un DOCX válido.
+    """
+    Document = _clase_documento()
+    if not Document:
+        raise HTTPException(status_code=500, detail="Soporte DOCX no disponible")
+
+    doc = _documento_base(Document, plantilla)
+    estilos = _Estilos(doc)
+    lineas = markdown.replace("\r\n", "\n").split("\n")
+    parrafo: list[str] = []
+
+    def volcar() -> None:
+        if parrafo:
+            _agregar_texto(estilos.parrafo("Normal"), " ".join(parrafo))
+            parrafo.clear()
+
+    i = 0
+    while i < len(lineas):
+        linea = lineas[i]
+        limpia = linea.strip()
+        if not limpia:
+            volcar()
+        elif limpia.startswith("```"):
+            volcar()
+            codigo = []
+            i += 1
+            while i < len(lineas) and not lineas[i].strip().startswith("```"):
+                codigo.append(lineas[i])
+                i += 1
+            run = estilos.parrafo("No Spacing", "Normal").add_run("\n".join(codigo))
+            run.font.name = "Courier New"
+        elif m := _TITULO.match(limpia):
+            volcar()
+            _agregar_texto(estilos.parrafo(f"Heading {len(m.group(1))}"), m.group(2))
+        elif (
+            "|" in limpia
+            and i + 1 < len(lineas)
+            and "|" in lineas[i + 1]
+            and _SEPARADOR_TABLA.match(lineas[i + 1])
+        ):
+            volcar()
+            filas = [_celdas(limpia)]
+            i += 2
+            while i < len(lineas) and "|" in lineas[i] and lineas[i].strip():
+                filas.append(_celdas(lineas[i]))
+                i += 1
+            _agregar_tabla(estilos, filas)
+            continue
+        elif _REGLA.match(limpia):
+            volcar()
+        elif m := _VINETA.match(linea):
+            volcar()
+            _agregar_item(estilos, m.group(2), m.group(1), numerada=False)
+        elif m := _NUMERADA.match(linea):
+            volcar()
+            _agregar_item(estilos, m.group(2), m.group(1), numerada=True)
+        elif limpia.startswith(">"):
+            volcar()
+            _agregar_texto(estilos.parrafo("Quote", "Normal"), limpia.lstrip("> ").strip())
+        else:
+            parrafo.append(limpia)
+        i += 1
+    volcar()
+
+    doc.save(str(destino))
+    return str(destino)
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Any, Optional, Sequence
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - optional dependency
+    np = None
+
+
+def _a_float32(vector: Any) -> Any:
+    """Convierte un embedding a ``float32`` (numpy si está disponible)."""
+    if np is not None:
+        return np.asarray(vector, dtype=np.float32)
+    return [float(x) for x in vector]
+
+
+def _a_bytes(vector: Any) -> bytes:
+    if np is not None:
+        return np.asarray(vector, dtype=np.float32).tobytes()
+    return array("f", vector).tobytes()
+
+
+def _de_bytes(datos: bytes) -> Any:
+    if np is not None:
+        return np.frombuffer(datos, dtype=np.float32).copy()
+    vec = array("f")
+    vec.frombytes(datos)
+    return vec.tolist()
+
+
+class ServicioEmbeddings:
+    """Envuelve el ``embedder`` con caché por contenido y codificación por lotes.
+
+    Los vectores se indexan por el SHA-256 de ``modelo + texto`` en una caché
+    LRU en memoria y, si se indica ``path``, en una tabla SQLite. Se devuelven
+    como ``float32`` listos para pasarse a Chroma sin copias intermedias.
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        path: Optional[Path] = None,
+        modelo: str = "all-MiniLM-L6-v2",
+        max_memoria: int = 4096,
+        batch_size: int = 32,
+    ) -> None:
+        self.embedder = embedder
+        self.modelo = modelo
+        self.max_memoria = max_memoria
+        self.batch_size = batch_size
+        self.aciertos = 0
+        self.fallos = 0
+        self._memoria: OrderedDict[str, Any] = OrderedDict()
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            with self._lock, self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS vectores (clave TEXT PRIMARY KEY, datos BLOB NOT NULL)"
+                )
+
+    def _clave(self, texto: str) -> str:
+        return hashlib.sha256(f"{self.modelo}\0{texto}".encode("utf-8")).hexdigest()
+
+    def _recordar(self, clave: str, vector: Any) -> None:
+        self._memoria[clave] = vector
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def _buscar(self, claves: Sequence[str]) -> dict[str, Any]:
+        encontrados: dict[str, Any] = {}
+        with self._lock:
+            for clave in claves:
+                if clave in self._memoria:
+                    self._memoria.move_to_end(clave)
+                    encontrados[clave] = self._memoria[clave]
+            faltan = [c for c in claves if c not in encontrados]
+            if faltan and self._conn is not None:
+                marcas = ",".join("?" * len(faltan))
+                filas = self._conn.execute(
+                    f"SELECT clave, datos FROM vectores WHERE clave IN ({marcas})", faltan
+                ).fetchall()
+                for clave, datos in filas:
+                    vector = _de_bytes(datos)
+                    encontrados[clave] = vector
+                    self._recordar(clave, vector)
+        return encontrados
+
+    def _guardar(self, nuevos: dict[str, Any]) -> None:
+        with self._lock:
+            for clave, vector in nuevos.items():
+                self._recordar(clave, vector)
+            if self._conn is not None and nuevos:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO vectores (clave, datos) VALUES (?, ?)",
+                        [(c, _a_bytes(v)) for c, v in nuevos.items()],
+                    )
+
+    def codificar(self, texto: str) -> Any:
+        """Embedding de un único texto."""
+        clave = self._clave(texto)
+        encontrado = self._buscar([clave])
+        if clave in encontrado:
+            self.aciertos += 1
+            return encontrado[clave]
+        self.fallos += 1
+        vector = _a_float32(self.embedder.encode(texto))
+        self._guardar({clave: vector})
+        return vector
+
+    def codificar_lote(self, textos: Sequence[str], batch_size: Optional[int] = None) -> list:
+        """Embeddings de varios textos, codificando solo los ausentes y por lotes."""
+        claves = [self._clave(t) for t in textos]
+        encontrados = self._buscar(claves)
+        pendientes: dict[str, str] = {}
+        for clave, texto in zip(claves, textos):
+            if clave not in encontrados:
+                pendientes.setdefault(clave, texto)
+        self.aciertos += len(textos) - len(pendientes)
+        self.fallos += len(pendientes)
+        if pendientes:
+            lote = list(pendientes.values())
+            try:
+                vectores = self.embedder.encode(lote, batch_size=batch_size or self.batch_size)
+            except TypeError:
+                vectores = [self.embedder.encode(t) for t in lote]
+            nuevos = {c: _a_float32(v) for c, v in zip(pendientes, vectores)}
+            self._guardar(nuevos)
+            encontrados.update(nuevos)
+        return [encontrados[c] for c in claves]
+
+    def estadisticas(self) -> dict:
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "en_memoria": len(self._memoria),
+        }
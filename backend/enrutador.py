@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Iterable, Optional
+
+try:
+    import psutil
+except Exception:  # pragma: no cover - optional dependency
+    psutil = None
+
+# Tareas cortas que no justifican el modelo grande
+TAREAS_LIGERAS = frozenset({"pregunta", "titulo", "estructura"})
+TAREAS_PESADAS = frozenset({"contenido"})
+
+
+@dataclass
+class Hardware:
+    """Recursos detectados al arrancar: memoria libre (no total) y núcleos."""
+
+    ram_gb: float
+    vram_gb: float
+    nucleos: int
+
+
+def _ram_gb() -> float:
+    """RAM disponible ahora mismo (sin contar la que ya usan otros procesos)."""
+    if psutil is not None:
+        return psutil.virtual_memory().available / 1024 ** 3
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") / 1024 ** 3
+    except (AttributeError, ValueError, OSError):  # pragma: no cover - Windows
+        return 0.0
+
+
+def _vram_gb() -> float:
+    """VRAM libre de las GPU NVIDIA visibles; 0 si no hay ``nvidia-smi``."""
+    if not shutil.which("nvidia-smi"):
+        return 0.0
+    try:
+        salida = subprocess.run(
+            ["nvidia-smi", "--query-gpu=memory.free", "--format=csv,noheader,nounits"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+            check=True,
+        ).stdout
+        return sum(float(x) for x in salida.split()) / 1024
+    except Exception:
+        return 0.0
+
+
+def detectar_hardware() -> Hardware:
+    return Hardware(ram_gb=_ram_gb(), vram_gb=_vram_gb(), nucleos=os.cpu_count() or 1)
+
+
+def _coincide(modelo: str, instalados: Iterable[str]) -> bool:
+    """``mistral`` coincide con ``mistral:latest`` y viceversa."""
+    base = modelo.split(":")[0]
+    return any(m == modelo or m.split(":")[0] == base for m in instalados)
+
+
+class EnrutadorModelos:
+    """Elige el modelo de cada tarea según el hardware y el rendimiento observado.
+
+    Las tareas ligeras van al modelo ligero; el contenido largo va al pesado
+    solo si cabe en la VRAM libre o, sin GPU, en la RAM libre con al menos
+    ``min_nucleos_pesado`` núcleos para ejecutarlo, y si su velocidad (media exponencial de
+    tokens por segundo) no ha caído por debajo de ``min_tps``. La primera
+    medida de cada modelo se descarta porque incluye la carga en memoria. Un
+    modelo degradado por lento o por ``marcar_fallo`` vuelve a probarse pasados
+    ``reintento`` segundos. Los modelos que el servidor no tiene instalados se
+    sustituyen por ``defecto``.
+    """
+
+    ALFA = 0.3
+
+    def __init__(
+        self,
+        defecto: str,
+        ligero: Optional[str] = None,
+        pesado: Optional[str] = None,
+        hardware: Optional[Hardware] = None,
+        min_ram_pesado_gb: float = 32.0,
+        min_vram_pesado_gb: float = 20.0,
+        min_nucleos_pesado: int = 8,
+        min_tps: float = 3.0,
+        reintento: float = 300.0,
+    ) -> None:
+        self.defecto = defecto
+        self.ligero = ligero or defecto
+        self.pesado = pesado or defecto
+        self.hardware = hardware or Hardware(0.0, 0.0, os.cpu_count() or 1)
+        self.min_ram_pesado_gb = min_ram_pesado_gb
+        self.min_vram_pesado_gb = min_vram_pesado_gb
+        self.min_nucleos_pesado = min_nucleos_pesado
+        self.min_tps = min_tps
+        self.reintento = reintento
+        self._lock = Lock()
+        self._tps: dict[str, float] = {}
+        self._degradado: dict[str, float] = {}
+        self._cargados: set[str] = set()
+        self._fallos: dict[str, int] = {}
+
+    def cabe_pesado(self) -> bool:
+        hw = self.hardware
+        if hw.vram_gb >= self.min_vram_pesado_gb:
+            return True
+        # En CPU la velocidad depende de los núcleos además de la memoria
+        return hw.ram_gb >= self.min_ram_pesado_gb and hw.nucleos >= self.min_nucleos_pesado
+
+    def _degradado_activo(self, modelo: str) -> bool:
+        with self._lock:
+            desde = self._degradado.get(modelo)
+            if desde is None:
+                return False
+            if time.monotonic() - desde >= self.reintento:
+                # Se le da otra oportunidad para volver a medirlo
+                del self._degradado[modelo]
+                return False
+            return True
+
+    def elegir(self, tarea: str = "general", instalados: Optional[Iterable[str]] = None) -> str:
+        if tarea in TAREAS_LIGERAS:
+            modelo = self.ligero
+        elif tarea in TAREAS_PESADAS:
+            modelo = self.pesado
+            if not self.cabe_pesado() or self._degradado_activo(self.pesado):
+                modelo = self.ligero
+        else:
+            modelo = self.defecto
+        if modelo != self.defecto and self._degradado_activo(modelo):
+            modelo = self.defecto
+        instalados = list(instalados or [])
+        if modelo != self.defecto and not _coincide(modelo, instalados):
+            return self.defecto
+        return modelo
+
+    def registrar(self, modelo: str, tokens: int, segundos: float) -> None:
+        """Actualiza la media de tokens por segundo de ``modelo``."""
+        if segundos <= 0 or tokens <= 0:
+            return
+        tps = tokens / segundos
+        with self._lock:
+            if modelo not in self._cargados:
+                # Incluye el tiempo de cargar el modelo: no representa su velocidad
+                self._cargados.add(modelo)
+                return
+            previo = self._tps.get(modelo)
+            media = tps if previo is None else self.ALFA * tps + (1 - self.ALFA) * previo
+            self._tps[modelo] = media
+            if modelo == self.pesado and modelo != self.ligero and media < self.min_tps:
+                self._degradado.setdefault(modelo, time.monotonic())
+            elif media >= self.min_tps:
+                self._degradado.pop(modelo, None)
+
+    def marcar_fallo(self, modelo: str) -> None:
+        """El modelo falló al responder: se usa ``defecto`` durante ``reintento`` s."""
+        if modelo == self.defecto:
+            return
+        with self._lock:
+            self._fallos[modelo] = self._fallos.get(modelo, 0) + 1
+            self._degradado[modelo] = time.monotonic()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "defecto": self.defecto,
+                "ligero": self.ligero,
+                "pesado": self.pesado,
+                "hardware": self.hardware.__dict__,
+                "cabe_pesado": self.cabe_pesado(),
+                "tokens_por_segundo": {m: round(v, 2) for m, v in self._tps.items()},
+                "degradados": sorted(self._degradado),
+                "fallos": dict(self._fallos),
+            }
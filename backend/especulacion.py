@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class Especulador:
+    """Trabajo lanzado por adelantado y reutilizable solo con las mismas entradas.
+
+    Guarda como mucho una tarea por clave (p. ej. una conversación) junto a
+    las entradas con las que se lanzó. ``tomar`` la entrega si las entradas
+    reales coinciden; si no, la cancela y cuenta un descarte. Se conservan
+    como mucho ``max_claves`` especulaciones; las más antiguas se cancelan.
+    Cancelar la tarea no detiene el trabajo que ya corre en un hilo, así que
+    además se llama al ``cancelar`` que se indicó al lanzarla.
+    """
+
+    def __init__(self, max_claves: int = 256) -> None:
+        self.max_claves = max(1, max_claves)
+        self._tareas: OrderedDict[
+            Hashable, tuple[Any, asyncio.Task, Optional[Callable[[], None]]]
+        ] = OrderedDict()
+        self._contadores = {"lanzadas": 0, "aciertos": 0, "descartes": 0, "fallos": 0}
+
+    @staticmethod
+    def _cancelar(previa: tuple) -> None:
+        _, tarea, cancelar = previa
+        tarea.cancel()
+        if cancelar is not None:
+            cancelar()
+
+    def lanzar(
+        self,
+        clave: Hashable,
+        entradas: Any,
+        crear: Callable[[], Awaitable[Any]],
+        cancelar: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Empieza ``crear()`` en segundo plano; sustituye la especulación previa."""
+        self.descartar(clave)
+        tarea = asyncio.ensure_future(crear())
+        # Evita el aviso de excepción no recuperada si nadie llega a tomarla
+        tarea.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tareas[clave] = (entradas, tarea, cancelar)
+        self._contadores["lanzadas"] += 1
+        while len(self._tareas) > self.max_claves:
+            _, antigua = self._tareas.popitem(last=False)
+            self._cancelar(antigua)
+
+    def tomar(self, clave: Hashable, entradas: Any) -> Optional[asyncio.Task]:
+        """Tarea lanzada para ``clave`` si se calculó con ``entradas``."""
+        previa = self._tareas.pop(clave, None)
+        if previa is None:
+            return None
+        # Una tarea de otro bucle de eventos (o ya cancelada) no puede esperarse
+        if (
+            previa[0] != entradas
+            or previa[1].cancelled()
+            or previa[1].get_loop() is not asyncio.get_running_loop()
+        ):
+            self._cancelar(previa)
+            self._contadores["descartes"] += 1
+            return None
+        self._contadores["aciertos"] += 1
+        return previa[1]
+
+    async def resultado(self, clave: Hashable, entradas: Any) -> tuple[bool, Any]:
+        """``(True, valor)`` si había una especulación válida y terminó bien."""
+        tarea = self.tomar(clave, entradas)
+        if tarea is None:
+            return False, None
+        try:
+            return True, await tarea
+        except Exception:
+            self._contadores["fallos"] += 1
+            return False, None
+
+    def descartar(self, clave: Hashable) -> None:
+        previa = self._tareas.pop(clave, None)
+        if previa is not None:
+            self._cancelar(previa)
+
+    def estadisticas(self) -> dict:
+        return {
+            **self._contadores,
+            "en_curso": sum(1 for _, t, _ in self._tareas.values() if not t.done()),
+            "pendientes": len(self._tareas),
+        }
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from threading import BoundedSemaphore, Lock
+from typing import Iterable, Iterator, Optional
+
+
+class ColaConversionLlena(RuntimeError):
+    """Hay demasiadas conversiones esperando a pandoc."""
+
+
+class CacheExportaciones:
+    """Archivos exportados indexados por el hash de lo que los determina.
+
+    La clave combina contenido, formato y la fecha de modificación de las
+    plantillas (DOCX de referencia o CSS), así que editar una plantilla
+    invalida sus exportaciones. El directorio se limita a ``max_bytes``
+    expulsando primero los archivos usados hace más tiempo; los usados en los
+    últimos ``GRACIA`` segundos se respetan porque pueden estar enviándose.
+    """
+
+    GRACIA = 60.0
+
+    def __init__(self, directorio: Path, max_bytes: int = 200 * 1024 * 1024) -> None:
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsados = 0
+        self._lock = Lock()
+        # Lock de cada clave y cuántos hilos lo tienen o esperan
+        self._bloqueos: dict[str, list] = {}
+
+    @staticmethod
+    def clave(contenido: str, formato: str, plantillas: Iterable[Optional[str]] = ()) -> str:
+        versiones = []
+        for plantilla in plantillas:
+            if not plantilla:
+                continue
+            try:
+                mtime = os.path.getmtime(plantilla)
+            except OSError:
+                mtime = None
+            versiones.append([str(plantilla), mtime])
+        crudo = json.dumps([contenido, formato, versiones], ensure_ascii=False)
+        return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+    def ruta(self, clave: str, ext: str) -> Path:
+        return self.directorio / f"{clave}{ext}"
+
+    def contiene(self, path: str | Path) -> bool:
+        return Path(path).resolve().parent == self.directorio.resolve()
+
+    @contextmanager
+    def bloquear(self, clave: str) -> Iterator[None]:
+        """Exclusión por clave para no convertir dos veces lo mismo a la vez.
+
+        El lock se descarta cuando lo suelta el último hilo que lo usaba o
+        esperaba, así que todas las peticiones simultáneas comparten el mismo.
+        """
+        with self._lock:
+            registro = self._bloqueos.setdefault(clave, [Lock(), 0])
+            registro[1] += 1
+        try:
+            with registro[0]:
+                yield
+        finally:
+            with self._lock:
+                registro[1] -= 1
+                if registro[1] == 0:
+                    del self._bloqueos[clave]
+
+    def obtener(self, clave: str, ext: str) -> Optional[Path]:
+        path = self.ruta(clave, ext)
+        try:
+            # La fecha de modificación hace de marca de último uso
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.fallos += 1
+            return None
+        with self._lock:
+            self.aciertos += 1
+        return path
+
+    def guardar(self, origen: Path, clave: str, ext: str) -> Path:
+        """Mueve ``origen`` a la caché y expulsa lo que sobre."""
+        destino = self.ruta(clave, ext)
+        os.replace(origen, destino)
+        self._recortar(conservar=destino)
+        return destino
+
+    def _archivos(self) -> list[tuple[float, int, Path]]:
+        archivos = []
+        for path in self.directorio.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                info = path.stat()
+            except FileNotFoundError:
+                continue
+            archivos.append((info.st_mtime, info.st_size, path))
+        return archivos
+
+    def _recortar(self, conservar: Optional[Path] = None) -> None:
+        with self._lock:
+            archivos = sorted(self._archivos())
+            total = sum(tamano for _, tamano, _ in archivos)
+            limite_gracia = time.time() - self.GRACIA
+            for mtime, tamano, path in archivos:
+                if total <= self.max_bytes:
+                    break
+                if path == conservar or mtime > limite_gracia:
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= tamano
+                self.expulsados += 1
+
+    def limpiar(self) -> None:
+        with self._lock:
+            for _, _, path in self._archivos():
+                path.unlink(missing_ok=True)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            archivos = self._archivos()
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0.0,
+            "archivos": len(archivos),
+            "bytes": sum(tamano for _, tamano, _ in archivos),
+            "max_bytes": self.max_bytes,
+            "expulsados": self.expulsados,
+        }
+
+
+class ConversorPandoc:
+    """Ejecuta pandoc con un número acotado de procesos simultáneos.
+
+    Como mucho ``workers`` conversiones corren a la vez y ``max_cola`` más
+    esperan turno; por encima se rechaza con ``ColaConversionLlena``. Tanto la
+    espera como la conversión están limitadas a ``timeout`` segundos
+    (``subprocess.TimeoutExpired``).
+    """
+
+    def __init__(self, workers: int = 2, max_cola: int = 16, timeout: float = 120.0) -> None:
+        self.workers = max(1, workers)
+        self.max_cola = max_cola
+        self.timeout = timeout
+        self._huecos = BoundedSemaphore(self.workers)
+        self._lock = Lock()
+        self._dentro = 0
+        self._metricas = {"completadas": 0, "fallidas": 0, "rechazadas": 0, "agotadas": 0}
+
+    def _contar(self, metrica: str) -> None:
+        with self._lock:
+            self._metricas[metrica] += 1
+
+    def convertir(self, cmd: list[str]) -> None:
+        with self._lock:
+            if self._dentro >= self.workers + self.max_cola:
+                self._metricas["rechazadas"] += 1
+                raise ColaConversionLlena("Demasiadas exportaciones en cola")
+            self._dentro += 1
+        try:
+            if not self._huecos.acquire(timeout=self.timeout):
+                self._contar("agotadas")
+                raise subprocess.TimeoutExpired(cmd, self.timeout)
+            try:
+                subprocess.run(cmd, check=True, capture_output=True, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                self._contar("agotadas")
+                raise
+            except Exception:
+                self._contar("fallidas")
+                raise
+            finally:
+                self._huecos.release()
+            self._contar("completadas")
+        finally:
+            with self._lock:
+                self._dentro -= 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_cola": self.max_cola,
+                "timeout": self.timeout,
+                "en_curso_o_cola": self._dentro,
+                **self._metricas,
+            }
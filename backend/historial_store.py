@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import base64
+import json
+import re
+import sqlite3
+from datetime import date, timedelta
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Iterator, Optional
+
+# Campos indexados como columnas; el resto de claves viaja en ``datos``.
+_COLUMNAS = ("id", "tema", "tipo", "timestamp", "contenido")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS informes (
+    id TEXT PRIMARY KEY,
+    tema TEXT,
+    tipo TEXT,
+    timestamp TEXT,
+    eliminado INTEGER NOT NULL DEFAULT 0,
+    datos TEXT NOT NULL DEFAULT '{}',
+    contenido TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_informes_meta
+    ON informes (eliminado, timestamp, id, tipo, tema);
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+# Índice BM25 sobre ``tema`` y ``contenido``. Es de contenido externo: los
+# disparadores lo mantienen al día y las lápidas salen del índice al marcarse.
+_ESQUEMA_FTS = """
+CREATE VIRTUAL TABLE informes_fts USING fts5(
+    tema, contenido,
+    content='informes', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER informes_fts_ai AFTER INSERT ON informes WHEN new.eliminado = 0 BEGIN
+    INSERT INTO informes_fts (rowid, tema, contenido) VALUES (new.rowid, new.tema, new.contenido);
+END;
+CREATE TRIGGER informes_fts_ad AFTER DELETE ON informes WHEN old.eliminado = 0 BEGIN
+    INSERT INTO informes_fts (informes_fts, rowid, tema, contenido)
+        VALUES ('delete', old.rowid, old.tema, old.contenido);
+END;
+CREATE TRIGGER informes_fts_au_old AFTER UPDATE ON informes WHEN old.eliminado = 0 BEGIN
+    INSERT INTO informes_fts (informes_fts, rowid, tema, contenido)
+        VALUES ('delete', old.rowid, old.tema, old.contenido);
+END;
+CREATE TRIGGER informes_fts_au_new AFTER UPDATE ON informes WHEN new.eliminado = 0 BEGIN
+    INSERT INTO informes_fts (rowid, tema, contenido) VALUES (new.rowid, new.tema, new.contenido);
+END;
+INSERT INTO informes_fts (rowid, tema, contenido)
+    SELECT rowid, tema, contenido FROM informes WHERE eliminado = 0;
+"""
+
+_TERMINO = re.compile(r"\w+", re.UNICODE)
+
+
+class AlmacenHistorial:
+    """Historial de informes sobre SQLite con borrado lógico y compactación.
+
+    Las altas son inserciones sin reescritura, la búsqueda por ``id`` usa la
+    clave primaria y las bajas marcan una lápida que ``compactar`` purga más
+    tarde. El ``historial.json`` heredado se importa una única vez. Si SQLite
+    incluye FTS5 se mantiene además un índice léxico para ``buscar_texto``.
+    """
+
+    # Umbral mínimo de lápidas antes de sugerir una compactación
+    COMPACTAR_MIN = 50
+
+    def __init__(self, path: Path, legado: Optional[Path] = None) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # INSERT OR REPLACE solo dispara los borrados con esta opción
+            self._conn.execute("PRAGMA recursive_triggers=ON")
+            self._conn.executescript(_ESQUEMA)
+        self.fts = self._crear_fts()
+        if legado is not None:
+            self.importar_json(legado)
+
+    def _crear_fts(self) -> bool:
+        with self._lock:
+            existe = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'informes_fts'"
+            ).fetchone()
+            if existe:
+                return True
+            try:
+                self._conn.executescript(f"BEGIN;{_ESQUEMA_FTS}COMMIT;")
+            except sqlite3.OperationalError:  # pragma: no cover - SQLite sin FTS5
+                self._conn.rollback()
+                return False
+        return True
+
+    # ----- Conversión -----
+    @staticmethod
+    def _a_fila(item: dict) -> tuple:
+        datos = {k: v for k, v in item.items() if k not in _COLUMNAS}
+        return (
+            item["id"],
+            item.get("tema"),
+            item.get("tipo"),
+            item.get("timestamp"),
+            json.dumps(datos, ensure_ascii=False),
+            item.get("contenido"),
+        )
+
+    @staticmethod
+    def _a_item(fila: sqlite3.Row) -> dict:
+        item = json.loads(fila["datos"] or "{}")
+        item.update(
+            {
+                "id": fila["id"],
+                "tema": fila["tema"],
+                "tipo": fila["tipo"],
+                "timestamp": fila["timestamp"],
+                "contenido": fila["contenido"],
+            }
+        )
+        return item
+
+    # ----- Escritura -----
+    def agregar(self, item: dict) -> None:
+        """Inserta un informe nuevo (o reemplaza uno con el mismo ``id``)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO informes"
+                " (id, tema, tipo, timestamp, datos, contenido)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                self._a_fila(item),
+            )
+
+    def eliminar(self, item_id: str) -> bool:
+        """Marca un informe como eliminado. Devuelve ``False`` si no existe."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE informes SET eliminado = 1 WHERE id = ? AND eliminado = 0",
+                (item_id,),
+            )
+        return cur.rowcount > 0
+
+    def reemplazar(self, items: Iterable[dict]) -> None:
+        """Sustituye todo el historial por ``items`` en una transacción."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM informes")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO informes"
+                " (id, tema, tipo, timestamp, datos, contenido)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self._a_fila(it) for it in items),
+            )
+
+    # ----- Lectura -----
+    def obtener(self, item_id: str) -> Optional[dict]:
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT * FROM informes WHERE id = ? AND eliminado = 0", (item_id,)
+            ).fetchone()
+        return self._a_item(fila) if fila else None
+
+    def obtener_varios(self, ids: list[str]) -> dict[str, dict]:
+        """Devuelve los informes vivos cuyo ``id`` figure en ``ids``."""
+        if not ids:
+            return {}
+        marcas = ",".join("?" * len(ids))
+        with self._lock:
+            filas = self._conn.execute(
+                f"SELECT * FROM informes WHERE eliminado = 0 AND id IN ({marcas})",
+                list(ids),
+            ).fetchall()
+        return {f["id"]: self._a_item(f) for f in filas}
+
+    def ids(self) -> list[str]:
+        """Identificadores de los informes vivos."""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT id FROM informes WHERE eliminado = 0"
+            ).fetchall()
+        return [f[0] for f in filas]
+
+    def iterar(self) -> Iterator[dict]:
+        """Recorre los informes vivos en orden de inserción."""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT * FROM informes WHERE eliminado = 0 ORDER BY rowid"
+            ).fetchall()
+        for fila in filas:
+            yield self._a_item(fila)
+
+    def listar_metadatos(self) -> list[dict]:
+        """Lista ``id/tema/tipo/timestamp`` sin leer el contenido."""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT id, tema, tipo, timestamp FROM informes"
+                " WHERE eliminado = 0 ORDER BY rowid"
+            ).fetchall()
+        return [dict(f) for f in filas]
+
+    def listar_pagina(
+        self,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None,
+        orden: str = "asc",
+        tipo: Optional[str] = None,
+        desde: Optional[str] = None,
+        hasta: Optional[str] = None,
+    ) -> tuple[list[dict], Optional[str]]:
+        """Pagina los metadatos por ``(timestamp, id)`` usando un cursor opaco.
+
+        La consulta se resuelve sobre ``idx_informes_meta`` sin tocar
+        ``contenido``. Devuelve la página y el cursor de la siguiente, o
+        ``None`` si no hay más resultados.
+        """
+        desc = orden == "desc"
+        condiciones = ["eliminado = 0"]
+        params: list = []
+        if tipo:
+            condiciones.append("tipo = ?")
+            params.append(tipo)
+        _filtrar_fechas("timestamp", desde, hasta, condiciones, params)
+        if cursor:
+            ts, cid = decodificar_cursor(cursor)
+            condiciones.append(f"(timestamp, id) {'<' if desc else '>'} (?, ?)")
+            params.extend([ts, cid])
+        sentido = "DESC" if desc else "ASC"
+        sql = (
+            "SELECT id, tema, tipo, timestamp FROM informes"
+            f" WHERE {' AND '.join(condiciones)}"
+            f" ORDER BY timestamp {sentido}, id {sentido}"
+        )
+        if limite is not None:
+            sql += " LIMIT ?"
+            params.append(limite + 1)
+        with self._lock:
+            filas = [dict(f) for f in self._conn.execute(sql, params).fetchall()]
+        siguiente = None
+        if limite is not None and len(filas) > limite:
+            filas = filas[:limite]
+            siguiente = codificar_cursor(filas[-1]["timestamp"], filas[-1]["id"])
+        return filas, siguiente
+
+    def buscar_texto(
+        self,
+        consulta: str,
+        limite: int = 10,
+        tipo: Optional[str] = None,
+        desde: Optional[str] = None,
+        hasta: Optional[str] = None,
+    ) -> list[dict]:
+        """Busca informes por términos con BM25 (el tema pesa el doble).
+
+        Cualquier término de la consulta basta para coincidir; los que
+        aparecen en más campos y son menos frecuentes puntúan mejor. Devuelve
+        metadatos, un extracto y ``puntuacion`` (menor es mejor).
+        """
+        terminos = _TERMINO.findall(consulta or "")
+        if not self.fts or not terminos:
+            return []
+        expresion = " OR ".join(f'"{t}"' for t in terminos)
+        condiciones = ["informes_fts MATCH ?", "i.eliminado = 0"]
+        params: list = [expresion]
+        if tipo:
+            condiciones.append("i.tipo = ?")
+            params.append(tipo)
+        _filtrar_fechas("i.timestamp", desde, hasta, condiciones, params)
+        params.append(limite)
+        sql = (
+            "SELECT i.id, i.tema, i.tipo, i.timestamp,"
+            " substr(i.contenido, 1, 200) AS snippet,"
+            " bm25(informes_fts, 2.0, 1.0) AS puntuacion"
+            " FROM informes_fts JOIN informes i ON i.rowid = informes_fts.rowid"
+            f" WHERE {' AND '.join(condiciones)}"
+            " ORDER BY puntuacion LIMIT ?"
+        )
+        with self._lock:
+            filas = self._conn.execute(sql, params).fetchall()
+        return [dict(f) for f in filas]
+
+    def contar(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM informes WHERE eliminado = 0"
+            ).fetchone()[0]
+
+    # ----- Mantenimiento -----
+    def lapidas(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM informes WHERE eliminado = 1"
+            ).fetchone()[0]
+
+    def necesita_compactar(self) -> bool:
+        """Indica si las lápidas superan el umbral mínimo y un 25 % del total."""
+        muertas = self.lapidas()
+        return muertas >= self.COMPACTAR_MIN and muertas * 4 >= self.contar()
+
+    def compactar(self) -> int:
+        """Purga las lápidas y recupera espacio en disco."""
+        with self._lock:
+            with self._conn:
+                cur = self._conn.execute("DELETE FROM informes WHERE eliminado = 1")
+            self._conn.execute("VACUUM")
+            if self.fts:
+                # VACUUM puede renumerar los rowid de los que depende el índice
+                with self._conn:
+                    self._conn.execute("INSERT INTO informes_fts (informes_fts) VALUES ('rebuild')")
+        return cur.rowcount
+
+    def importar_json(self, legado: Path) -> int:
+        """Importa una sola vez un ``historial.json`` heredado."""
+        legado = Path(legado)
+        clave = f"importado:{legado.resolve()}"
+        with self._lock:
+            hecho = self._conn.execute(
+                "SELECT valor FROM meta WHERE clave = ?", (clave,)
+            ).fetchone()
+        if hecho:
+            return 0
+        items: list = []
+        if legado.exists():
+            try:
+                with legado.open("r", encoding="utf-8") as fh:
+                    items = json.load(fh) or []
+            except (OSError, ValueError):
+                items = []
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO informes"
+                " (id, tema, tipo, timestamp, datos, contenido)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self._a_fila(it) for it in items if it.get("id")),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)",
+                (clave, str(len(items))),
+            )
+        return len(items)
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def fin_exclusivo(hasta: str) -> Optional[str]:
+    """Día siguiente a ``hasta`` si es una fecha sin hora (``AAAA-MM-DD``).
+
+    Con un límite así ``hasta`` incluye el día entero; ``None`` si lleva hora.
+    """
+    if len(hasta) != 10:
+        return None
+    try:
+        return (date.fromisoformat(hasta) + timedelta(days=1)).isoformat()
+    except ValueError:
+        return None
+
+
+def _filtrar_fechas(
+    columna: str,
+    desde: Optional[str],
+    hasta: Optional[str],
+    condiciones: list[str],
+    params: list,
+) -> None:
+    if desde:
+        condiciones.append(f"{columna} >= ?")
+        params.append(desde)
+    if hasta:
+        fin = fin_exclusivo(hasta)
+        condiciones.append(f"{columna} {'<' if fin else '<='} ?")
+        params.append(fin or hasta)
+
+
+def codificar_cursor(timestamp: str, item_id: str) -> str:
+    crudo = json.dumps([timestamp, item_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii")
+
+
+def decodificar_cursor(cursor: str) -> tuple[str, str]:
+    """Decodifica un cursor de paginación; lanza ``ValueError`` si es inválido."""
+    try:
+        ts, cid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as exc:
+        raise ValueError("cursor inválido") from exc
+    return str(ts), str(cid)
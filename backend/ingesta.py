@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import json
+import os
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+# MiniLM trunca a 256 wordpieces; ~160 palabras dejan margen para el español.
+MAX_PALABRAS = 160
+SOLAPE = 32
+# Páginas que procesa cada tarea cuando la extracción se reparte en procesos
+PAGINAS_POR_TAREA = 25
+
+
+class LimiteExcedido(ValueError):
+    """El documento supera el tamaño o el número de páginas permitido."""
+
+
+@dataclass
+class Fragmento:
+    """Trozo de un documento listo para indexarse."""
+
+    indice: int
+    pagina: int
+    texto: str
+
+
+def fragmentar(
+    paginas: Iterable[tuple[int, str]],
+    max_palabras: int = MAX_PALABRAS,
+    solape: int = SOLAPE,
+) -> Iterator[Fragmento]:
+    """Divide el texto en ventanas de ``max_palabras`` con ``solape`` palabras.
+
+    Recibe pares ``(número de página, texto)`` y los consume de forma
+    incremental, así que no necesita el documento completo en memoria. Cada
+    fragmento se atribuye a la página en la que empieza.
+    """
+    if solape >= max_palabras:
+        raise ValueError("el solape debe ser menor que el tamaño del fragmento")
+    ventana: list[tuple[int, str]] = []
+    indice = 0
+    paso = max_palabras - solape
+    for num, texto in paginas:
+        ventana.extend((num, palabra) for palabra in (texto or "").split())
+        while len(ventana) >= max_palabras:
+            trozo = ventana[:max_palabras]
+            yield Fragmento(indice, trozo[0][0], " ".join(p for _, p in trozo))
+            indice += 1
+            ventana = ventana[paso:]
+    # El resto solo se emite si aporta palabras que no estaban en el anterior
+    if ventana and (indice == 0 or len(ventana) > solape):
+        yield Fragmento(indice, ventana[0][0], " ".join(p for _, p in ventana))
+
+
+def agrupar(fragmentos: Iterable[Fragmento], tam: int) -> Iterator[list[Fragmento]]:
+    """Agrupa fragmentos en lotes de ``tam`` para codificarlos juntos."""
+    lote: list[Fragmento] = []
+    for frag in fragmentos:
+        lote.append(frag)
+        if len(lote) >= tam:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class ManifiestosDocumentos:
+    """Texto extraído y fragmentos indexados de cada documento, por hash de contenido.
+
+    Cada manifiesto se guarda como ``<sha256>.json`` con las claves ``doc_id``,
+    ``fuente``, ``paginas`` (pares ``[número, texto]``) y ``fragmentos``
+    (``id`` y ``pagina`` de cada vector insertado).
+    """
+
+    def __init__(self, directorio: Path) -> None:
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+
+    def _ruta(self, doc_id: str) -> Path:
+        return self.directorio / f"{doc_id}.json"
+
+    def cargar(self, doc_id: str) -> Optional[dict]:
+        ruta = self._ruta(doc_id)
+        if not ruta.exists():
+            return None
+        try:
+            with ruta.open("r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def guardar(self, doc_id: str, datos: dict) -> None:
+        ruta = self._ruta(doc_id)
+        tmp = ruta.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(datos, fh, ensure_ascii=False)
+        os.replace(tmp, ruta)
+
+
+def _extraer_rango_fitz(path: str, inicio: int, fin: int) -> list[tuple[int, str]]:
+    """Texto de las páginas ``[inicio, fin)`` con PyMuPDF (se ejecuta en otro proceso)."""
+    import fitz  # PyMuPDF
+
+    with fitz.open(path) as doc:
+        return [(i + 1, doc.load_page(i).get_text()) for i in range(inicio, fin)]
+
+
+def _comprobar_paginas(total: int, max_paginas: Optional[int]) -> None:
+    if max_paginas and total > max_paginas:
+        raise LimiteExcedido(
+            f"El documento tiene {total} páginas; el máximo es {max_paginas}"
+        )
+
+
+def paginas_pdf(
+    path: str,
+    fitz: Any = None,
+    pdfplumber: Any = None,
+    max_paginas: Optional[int] = None,
+    pool: Optional[Executor] = None,
+    paginas_por_tarea: int = PAGINAS_POR_TAREA,
+) -> Iterator[tuple[int, str]]:
+    """Genera ``(página, texto)`` de un PDF sin cargar todo el texto en memoria.
+
+    Usa PyMuPDF si está disponible y, para documentos con más de una tarea de
+    páginas, reparte los tramos en ``pool`` manteniendo el orden y como mucho
+    dos tramos pendientes por proceso. Sin PyMuPDF recurre a pdfplumber,
+    liberando la caché de cada página tras leerla.
+    """
+    if fitz is not None:
+        with fitz.open(path) as doc:
+            total = len(doc)
+            _comprobar_paginas(total, max_paginas)
+            if pool is None or total <= paginas_por_tarea:
+                for i in range(total):
+                    yield i + 1, doc.load_page(i).get_text()
+                return
+        pendientes: deque = deque()
+        ventana = 2 * max(1, getattr(pool, "_max_workers", 1))
+        for inicio in range(0, total, paginas_por_tarea):
+            pendientes.append(
+                pool.submit(_extraer_rango_fitz, path, inicio, min(inicio + paginas_por_tarea, total))
+            )
+            if len(pendientes) >= ventana:
+                yield from pendientes.popleft().result()
+        while pendientes:
+            yield from pendientes.popleft().result()
+        return
+    if pdfplumber is not None:
+        with pdfplumber.open(path) as pdf:
+            _comprobar_paginas(len(pdf.pages), max_paginas)
+            for i, page in enumerate(pdf.pages, 1):
+                yield i, page.extract_text() or ""
+                liberar = getattr(page, "close", None) or getattr(page, "flush_cache", None)
+                if liberar:
+                    liberar()
+        return
+    raise RuntimeError("Soporte PDF no disponible")
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS respuestas (
+    clave TEXT PRIMARY KEY,
+    respuesta TEXT NOT NULL,
+    segundos REAL NOT NULL DEFAULT 0,
+    creado REAL NOT NULL,
+    acceso REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_respuestas_acceso ON respuestas (acceso);
+"""
+
+
+class CacheLLM:
+    """Caché persistente de respuestas del modelo con expulsión LRU y TTL.
+
+    Cada entrada guarda además el tiempo que tardó la inferencia original,
+    de modo que las estadísticas reflejan cuánto cómputo se ha ahorrado.
+    """
+
+    def __init__(self, path: Path, max_entradas: int = 2000, ttl: float = 7 * 24 * 3600) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.segundos_ahorrados = 0.0
+        self._lock = Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_ESQUEMA)
+
+    @staticmethod
+    def clave(modelo: str, sistema: str, prefijo: str, contexto: str, prompt: str) -> str:
+        crudo = json.dumps([modelo, sistema, prefijo, contexto, prompt], ensure_ascii=False)
+        return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+    def obtener(self, clave: str) -> Optional[str]:
+        ahora = time.time()
+        with self._lock, self._conn:
+            fila = self._conn.execute(
+                "SELECT respuesta, segundos, creado FROM respuestas WHERE clave = ?",
+                (clave,),
+            ).fetchone()
+            if fila and ahora - fila[2] > self.ttl:
+                self._conn.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                fila = None
+            if fila is None:
+                self.fallos += 1
+                return None
+            self._conn.execute(
+                "UPDATE respuestas SET acceso = ? WHERE clave = ?", (ahora, clave)
+            )
+            self.aciertos += 1
+            self.segundos_ahorrados += fila[1]
+            return fila[0]
+
+    def guardar(self, clave: str, respuesta: str, segundos: float = 0.0) -> None:
+        ahora = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, respuesta, segundos, creado, acceso)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (clave, respuesta, segundos, ahora, ahora),
+            )
+            self._conn.execute(
+                "DELETE FROM respuestas WHERE creado < ?", (ahora - self.ttl,)
+            )
+            # Expulsa las entradas menos usadas recientemente por encima del límite
+            self._conn.execute(
+                "DELETE FROM respuestas WHERE clave IN ("
+                " SELECT clave FROM respuestas ORDER BY acceso DESC LIMIT -1 OFFSET ?)",
+                (self.max_entradas,),
+            )
+
+    def limpiar(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM respuestas")
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            entradas = self._conn.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0.0,
+            "entradas": entradas,
+            "max_entradas": self.max_entradas,
+            "segundos_ahorrados": round(self.segundos_ahorrados, 3),
+        }
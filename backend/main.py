@@ -1,7 +1,17 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Request, Response
 from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+import hashlib
+import importlib
+import codecs
+import dataclasses
+import itertools
 import tempfile
 import subprocess
 import os
@@ -15,9 +25,75 @@ import sys
 
 if __name__ == "__main__" and __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parent))
-    from document_generator import crear_docx
+    from document_generator import crear_docx, markdown_a_docx
+    from historial_store import AlmacenHistorial, fin_exclusivo
+    from embeddings import ServicioEmbeddings
+    from llm_cache import CacheLLM
+    from sincronizacion import ReconciliadorChroma
+    from trabajos import ColaLlena, ColaTrabajos
+    from sesiones import AlmacenSesiones
+    from especulacion import Especulador
+    from exportacion import CacheExportaciones, ColaConversionLlena, ConversorPandoc
+    from recuperacion import PoliticaContexto, estimar_tokens, seleccionar_contexto
+    from modelo import GestorModelo, ModeloNoDisponible
+    from enrutador import EnrutadorModelos, detectar_hardware
+    from planificador import (
+        INTERACTIVA,
+        MASIVA,
+        NORMAL,
+        Cancelacion,
+        ColaLLMLlena,
+        PlanificadorLLM,
+        TurnoCancelado,
+    )
+    from ingesta import (
+        LimiteExcedido,
+        ManifiestosDocumentos,
+        agrupar,
+        fragmentar,
+        paginas_pdf,
+    )
+    from secciones import (
+        AlmacenCheckpoints,
+        generar_por_secciones,
+        parsear_estructura,
+        prompt_seccion,
+    )
 else:
-    from .document_generator import crear_docx
+    from .document_generator import crear_docx, markdown_a_docx
+    from .historial_store import AlmacenHistorial, fin_exclusivo
+    from .embeddings import ServicioEmbeddings
+    from .llm_cache import CacheLLM
+    from .sincronizacion import ReconciliadorChroma
+    from .trabajos import ColaLlena, ColaTrabajos
+    from .sesiones import AlmacenSesiones
+    from .especulacion import Especulador
+    from .exportacion import CacheExportaciones, ColaConversionLlena, ConversorPandoc
+    from .recuperacion import PoliticaContexto, estimar_tokens, seleccionar_contexto
+    from .modelo import GestorModelo, ModeloNoDisponible
+    from .enrutador import EnrutadorModelos, detectar_hardware
+    from .planificador import (
+        INTERACTIVA,
+        MASIVA,
+        NORMAL,
+        Cancelacion,
+        ColaLLMLlena,
+        PlanificadorLLM,
+        TurnoCancelado,
+    )
+    from .ingesta import (
+        LimiteExcedido,
+        ManifiestosDocumentos,
+        agrupar,
+        fragmentar,
+        paginas_pdf,
+    )
+    from .secciones import (
+        AlmacenCheckpoints,
+        generar_por_secciones,
+        parsear_estructura,
+        prompt_seccion,
+    )
 try:
     from langchain_ollama import OllamaLLM
 except Exception:  # pragma: no cover - optional dependency
@@ -26,49 +102,70 @@ try:
     from langchain_community.llms.ollama import OllamaEndpointNotFoundError
 except Exception:  # pragma: no cover - optional dependency
     OllamaEndpointNotFoundError = Exception
-try:
-    import chromadb
-except Exception:  # pragma: no cover - optional dependency
-    chromadb = None
-try:
-    from sentence_transformers import SentenceTransformer
-except Exception:  # pragma: no cover - optional dependency
-    SentenceTransformer = None
-try:
-    from langdetect import detect
-except Exception:  # pragma: no cover - optional dependency
-    detect = None
-try:
-    import pdfplumber
-except Exception:  # pragma: no cover - optional dependency
-    pdfplumber = None
-try:
-    import fitz  # PyMuPDF
-except Exception:  # pragma: no cover - optional dependency
-    fitz = None
-try:
-    from docx import Document
-except Exception:  # pragma: no cover - optional dependency
-    Document = None
 import yaml
-from threading import Lock
+from threading import Lock, Thread
 import re
 import shutil
+import time
 import unicodedata
 
 
+@lru_cache(maxsize=None)
+def _importar_opcional(nombre: str):
+    """Importa una dependencia opcional pesada la primera vez que se necesita.
+
+    chromadb, sentence_transformers (y con él torch), pdfplumber, fitz, docx y
+    langdetect ya no se cargan al importar el módulo: el arranque del sidecar
+    no paga su coste hasta que algún endpoint los usa. Como PyInstaller no ve
+    estas importaciones, cada módulo nuevo debe añadirse a ``build.sh``.
+    """
+    try:
+        return importlib.import_module(nombre)
+    except Exception:  # pragma: no cover - optional dependency
+        return None
+
+
+async def _purgar_sesiones() -> None:
+    """Borra periódicamente las sesiones caducadas fuera del camino de cada guardado."""
+    intervalo = float(CONFIG.get("sesiones_purga_intervalo", 600))
+    while True:
+        await asyncio.sleep(intervalo)
+        await run_in_threadpool(almacen_sesiones().purgar)
+
+
 class Utf8JSONResponse(JSONResponse):
     """JSONResponse con codificación UTF-8 explícita."""
 
     media_type = "application/json; charset=utf-8"
 
 
-app = FastAPI(title="Generador de informes IA", default_response_class=Utf8JSONResponse)
+@asynccontextmanager
+async def _ciclo_vida(app: FastAPI):
+    """Lanza las tareas de arranque en segundo plano sin retrasar el servidor."""
+    if CONFIG.get("precalentar", True):
+        Thread(target=precalentar, daemon=True, name="precalentar").start()
+    purga = asyncio.create_task(_purgar_sesiones())
+    yield
+    purga.cancel()
+    cola_ingesta.cerrar()
+    gestor_modelo.cerrar()
+    if _pool_extraccion.cache_info().currsize:
+        pool = _pool_extraccion()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(
+    title="Generador de informes IA",
+    default_response_class=Utf8JSONResponse,
+    lifespan=_ciclo_vida,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://127.0.0.1:1420", "http://localhost:1420"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
@@ -94,26 +191,98 @@ else:
 
 SYSTEM_PROMPT = CONFIG.get("system_prompt", DEFAULT_SYSTEM_PROMPT)
 
-# Lenguaje por sesión
-_LANG_STORE: dict[str, str] = {"default": CONFIG.get("language", "es")}
-
-
+# Lenguaje por sesión (guardado en ``almacen_sesiones``)
 def get_language(session_id: str = "default") -> str:
-    return _LANG_STORE.get(session_id, CONFIG.get("language", "es"))
+    datos = almacen_sesiones().cargar("idioma", session_id)
+    return (datos or {}).get("idioma", CONFIG.get("language", "es"))
 
 
 def set_language(lang_code: str, session_id: str = "default") -> None:
     if lang_code not in {"es", "en"}:
         lang_code = "es"
-    _LANG_STORE[session_id] = lang_code
+    almacen_sesiones().guardar("idioma", session_id, {"idioma": lang_code})
 
 # Instancia global del modelo para reutilizar conexiones
 MODEL_NAME = CONFIG.get("model", "mixtral")
-llm = OllamaLLM(model=MODEL_NAME) if OllamaLLM else None
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST") or CONFIG.get("ollama_host", "127.0.0.1:11434")
+OLLAMA_KEEP_ALIVE = str(CONFIG.get("ollama_keep_alive", "30m"))
+gestor_modelo = GestorModelo(
+    OLLAMA_HOST,
+    MODEL_NAME,
+    keep_alive=OLLAMA_KEEP_ALIVE,
+    timeout=float(CONFIG.get("ollama_timeout", 600)),
+)
+llm = (
+    OllamaLLM(model=MODEL_NAME, base_url=gestor_modelo.host, keep_alive=OLLAMA_KEEP_ALIVE)
+    if OllamaLLM
+    else None
+)
+
+# Modelo por tarea: el ligero para preguntas y títulos, el pesado para el
+# contenido cuando el hardware y la velocidad observada lo permiten.
+enrutador_modelos = EnrutadorModelos(
+    MODEL_NAME,
+    ligero=CONFIG.get("modelo_ligero"),
+    pesado=CONFIG.get("modelo_pesado"),
+    min_ram_pesado_gb=float(CONFIG.get("min_ram_pesado_gb", 32)),
+    min_vram_pesado_gb=float(CONFIG.get("min_vram_pesado_gb", 20)),
+    min_nucleos_pesado=int(CONFIG.get("min_nucleos_pesado", 8)),
+    min_tps=float(CONFIG.get("min_tokens_por_segundo", 3)),
+)
+
+# Ejecutor acotado para las llamadas bloqueantes al modelo: evita que una
+# inferencia larga congele el bucle de eventos y limita cuántas se apilan.
+LLM_WORKERS = int(CONFIG.get("llm_workers", 4))
+_LLM_EXECUTOR = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+# Generaciones simultáneas que admite el servidor de Ollama local
+OLLAMA_NUM_PARALLEL = max(
+    1, int(os.environ.get("OLLAMA_NUM_PARALLEL") or CONFIG.get("ollama_num_parallel", 4))
+)
+
+# Planificador de llamadas al modelo: como mucho OLLAMA_NUM_PARALLEL a la vez,
+# las interactivas por delante de la generación masiva y turnos por sesión.
+planificador_llm = PlanificadorLLM(
+    capacidad=OLLAMA_NUM_PARALLEL, max_cola=int(CONFIG.get("llm_max_cola", 64))
+)
+PRIORIDAD_TAREA = {
+    "general": INTERACTIVA,
+    "pregunta": INTERACTIVA,
+    "titulo": INTERACTIVA,
+    "estructura": NORMAL,
+    "contenido": MASIVA,
+}
+# Cancelación del trabajo especulativo en curso en este hilo (ver
+# ``_especulativo``); sus llamadas van con prioridad MASIVA y pueden abandonarse
+_cancelacion_especulativa: ContextVar[Optional[Cancelacion]] = ContextVar(
+    "cancelacion_especulativa", default=None
+)
+
+
+def _servidor_ocupado(exc: ColaLLMLlena) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "5"})
+
+T = TypeVar("T")
+
+
+async def ejecutar_bloqueante(func: Callable[..., T], *args, **kwargs) -> T:
+    """Ejecuta ``func`` en el ejecutor del LLM sin bloquear el bucle de eventos."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_LLM_EXECUTOR, partial(func, *args, **kwargs))
+
 
 def _invoke_llm(prompt: str) -> str:
-    """Invoca el modelo compatible con LangChain."""
+    """Invoca el modelo compatible con LangChain.
+
+    Sin LangChain se usa la API HTTP de Ollama con la conexión compartida del
+    gestor y, como último recurso, el binario ``ollama``.
+    """
     if llm is None:
+        if gestor_modelo.disponible():
+            try:
+                return gestor_modelo.generar(prompt)
+            except ModeloNoDisponible:
+                pass
         if shutil.which("ollama"):
             try:
                 proc = subprocess.run(
@@ -138,44 +307,361 @@ def _invoke_llm(prompt: str) -> str:
         raise HTTPException(status_code=503, detail="LLM no disponible") from exc
 
 
-def clean_llm_output(text: str) -> str:
-    """Normaliza y filtra la respuesta del modelo."""
-    if not isinstance(text, str):
-        text = str(text)
-    text = unicodedata.normalize("NFC", text)
-    text = text.replace("\u2013", "-").replace("\u2014", "-")
+async def _ainvoke_llm(prompt: str) -> str:
+    """Versión asíncrona de ``_invoke_llm``.
+
+    Usa ``ainvoke`` cuando el cliente lo ofrece; en otro caso delega la
+    llamada bloqueante a un hilo. El límite de concurrencia lo aplica
+    ``planificador_llm``, así que no compite por el ejecutor del LLM con la
+    generación masiva.
+    """
+    if llm is not None and hasattr(llm, "ainvoke"):
+        try:
+            return await llm.ainvoke(prompt)
+        except OllamaEndpointNotFoundError:
+            raise
+        except Exception as exc:  # pragma: no cover - runtime connectivity issues
+            raise HTTPException(status_code=503, detail="LLM no disponible") from exc
+    return await run_in_threadpool(_invoke_llm, prompt)
+
+
+def _stream_llm(prompt: str) -> Iterator[str]:
+    """Produce los fragmentos del modelo a medida que se generan."""
+    if llm is None:
+        if gestor_modelo.disponible():
+            emitido = False
+            try:
+                for trozo in gestor_modelo.generar_stream(prompt):
+                    emitido = True
+                    yield trozo
+                return
+            except ModeloNoDisponible as exc:
+                if emitido:
+                    raise HTTPException(status_code=503, detail="LLM no disponible") from exc
+        if shutil.which("ollama"):
+            try:
+                proc = subprocess.Popen(
+                    ["ollama", "run", MODEL_NAME],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                )
+            except Exception as exc:  # pragma: no cover - runtime connectivity issues
+                raise HTTPException(status_code=503, detail="LLM no disponible") from exc
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            try:
+                proc.stdin.write(prompt.encode("utf-8"))
+                proc.stdin.close()
+                while True:
+                    data = os.read(proc.stdout.fileno(), 4096)
+                    if not data:
+                        break
+                    texto = decoder.decode(data)
+                    if texto:
+                        yield texto
+                resto = decoder.decode(b"", final=True)
+                if resto:
+                    yield resto
+            finally:
+                proc.stdout.close()
+                if proc.wait() != 0:
+                    raise HTTPException(status_code=503, detail="LLM no disponible")
+            return
+        raise HTTPException(status_code=503, detail="LLM no disponible")
+    try:
+        if hasattr(llm, "stream"):
+            for trozo in llm.stream(prompt):
+                yield trozo
+        else:
+            yield _invoke_llm(prompt)
+    except (OllamaEndpointNotFoundError, HTTPException):
+        raise
+    except Exception as exc:  # pragma: no cover - runtime connectivity issues
+        raise HTTPException(status_code=503, detail="LLM no disponible") from exc
+
+
+def modelo_para(tarea: str) -> str:
+    """Modelo que el enrutador asigna a ``tarea`` entre los instalados."""
+    return enrutador_modelos.elegir(tarea, gestor_modelo.instalados)
+
+
+@lru_cache(maxsize=4)
+def _cliente_llm(modelo: str):
+    return OllamaLLM(model=modelo, base_url=gestor_modelo.host, keep_alive=OLLAMA_KEEP_ALIVE)
+
+
+@lru_cache(maxsize=1)
+def _errores_modelo() -> tuple[type[BaseException], ...]:
+    """Fallos de un modelo enrutado tras los que se responde con ``MODEL_NAME``."""
+    errores: list[type[BaseException]] = [ModeloNoDisponible, ConnectionError, TimeoutError]
+    for modulo, nombre in (("httpx", "HTTPError"), ("ollama", "ResponseError")):
+        tipo = getattr(_importar_opcional(modulo), nombre, None)
+        if tipo is not None:
+            errores.append(tipo)
+    return tuple(errores)
+
 
+def _invoke_llm_en(prompt: str, modelo: str) -> tuple[str, str]:
+    """Invoca ``modelo`` y devuelve la respuesta junto al modelo que la dio.
+
+    El modelo por defecto pasa por ``_invoke_llm``. Si otro modelo falla se
+    marca en ``enrutador_modelos`` y responde ``MODEL_NAME`` en su lugar.
+    """
+    if modelo != MODEL_NAME:
+        try:
+            if OllamaLLM is not None:
+                return _cliente_llm(modelo).invoke(prompt), modelo
+            if gestor_modelo.disponible():
+                return gestor_modelo.generar(prompt, modelo), modelo
+        except _errores_modelo():
+            enrutador_modelos.marcar_fallo(modelo)
+    return _invoke_llm(prompt), MODEL_NAME
+
+
+def _stream_llm_en(
+    prompt: str, modelo: str, usado: Optional[list[str]] = None
+) -> Iterator[str]:
+    """Como ``_invoke_llm_en`` pero por fragmentos; deja en ``usado[0]`` el modelo."""
+    usado = usado if usado is not None else [modelo]
+    usado[0] = modelo
+    if modelo != MODEL_NAME and (OllamaLLM is not None or gestor_modelo.disponible()):
+        emitido = False
+        try:
+            if OllamaLLM is not None:
+                fuente = _cliente_llm(modelo).stream(prompt)
+            else:
+                fuente = gestor_modelo.generar_stream(prompt, modelo)
+            for trozo in fuente:
+                emitido = True
+                yield trozo
+            return
+        except _errores_modelo() as exc:
+            enrutador_modelos.marcar_fallo(modelo)
+            if emitido:
+                raise HTTPException(status_code=503, detail="LLM no disponible") from exc
+    usado[0] = MODEL_NAME
+    yield from _stream_llm(prompt)
+
+
+def _quitar_parentesis(text: str) -> str:
     def _repl(match: re.Match) -> str:
         inner = match.group(1)
         if re.fullmatch(r"[A-Za-z0-9 ,.'\"-]+", inner):
             return ""
         return match.group(0)
 
-    text = re.sub(r"\(([^()]+)\)", _repl, text)
+    return re.sub(r"\(([^()]+)\)", _repl, text)
+
+
+def clean_llm_output(text: str) -> str:
+    """Normaliza y filtra la respuesta del modelo."""
+    if not isinstance(text, str):
+        text = str(text)
+    text = unicodedata.normalize("NFC", text)
+    text = text.replace("\u2013", "-").replace("\u2014", "-")
+    text = _quitar_parentesis(text)
     return text.strip()
 
 
+class LimpiadorIncremental:
+    """Aplica ``clean_llm_output`` sobre una respuesta que llega por fragmentos.
+
+    Retiene el último carácter (por si llega una marca combinante), el
+    paréntesis aún abierto y los espacios finales, de modo que la
+    concatenación de lo emitido coincide con limpiar el texto completo.
+    """
+
+    def __init__(self) -> None:
+        self._pendiente = ""
+        self._inicio = True
+
+    def _emitir(self, listo: str) -> str:
+        if self._inicio:
+            listo = listo.lstrip()
+            if listo:
+                self._inicio = False
+        return listo
+
+    def agregar(self, trozo: str) -> str:
+        texto = unicodedata.normalize("NFC", self._pendiente + str(trozo))
+        texto = texto.replace("\u2013", "-").replace("\u2014", "-")
+        candidato = texto[:-1]
+        abierto = candidato.rfind("(")
+        if abierto != -1 and ")" not in candidato[abierto:]:
+            candidato = candidato[:abierto]
+        listo = _quitar_parentesis(candidato)
+        sin_espacios = listo.rstrip()
+        self._pendiente = listo[len(sin_espacios):] + texto[len(candidato):]
+        return self._emitir(sin_espacios)
+
+    def finalizar(self) -> str:
+        resto = self._emitir(_quitar_parentesis(self._pendiente).rstrip())
+        self._pendiente = ""
+        return resto
+
+
 def detect_language(text: str) -> str:
     """Devuelve 'en' o 'es' según el idioma detectado."""
-    if not detect:
+    langdetect = _importar_opcional("langdetect")
+    if not langdetect:
         return "es"
     try:
-        lang = detect(text)
+        lang = langdetect.detect(text)
     except Exception:
         return "es"
     return "en" if lang.startswith("en") else "es"
 
 
-def invoke_llm(prompt: str, session_id: str = "default") -> str:
-    """Invoca el modelo y limpia la salida respetando el idioma activo."""
+def _preparar_prompt(
+    prompt: str,
+    session_id: str = "default",
+    recuperar: bool = False,
+    modelo: Optional[str] = None,
+) -> tuple[str, str]:
+    """Antepone el prompt de sistema, el idioma activo y el contexto semántico.
+
+    Solo con ``recuperar=True`` se consulta la base de documentos. Devuelve el
+    prompt completo y su clave en la caché de respuestas.
+    """
     lang = get_language(session_id)
     prefix = "Responde en español:\n" if lang == "es" else "Answer in English:\n"
-    contexto = obtener_contexto_semantico(prompt)
+    contexto = obtener_contexto_semantico(prompt) if recuperar else ""
     full_prompt = SYSTEM_PROMPT + "\n" + prefix + prompt
     if contexto:
         full_prompt += "\nBasate en el siguiente contexto:\n" + contexto
-    raw = _invoke_llm(full_prompt)
-    return clean_llm_output(raw)
+    clave = CacheLLM.clave(modelo or MODEL_NAME, SYSTEM_PROMPT, prefix, contexto, prompt)
+    return full_prompt, clave
+
+
+def invoke_llm(
+    prompt: str,
+    session_id: str = "default",
+    usar_cache: bool = True,
+    recuperar: bool = False,
+    tarea: str = "general",
+) -> str:
+    """Invoca el modelo y limpia la salida respetando el idioma activo.
+
+    ``recuperar`` (opcional) enriquece el prompt con contexto de documentos
+    y ``tarea`` decide qué modelo lo atiende (ver ``enrutador_modelos``).
+    """
+    cancelacion = _cancelacion_especulativa.get()
+    prioridad = MASIVA if cancelacion is not None else PRIORIDAD_TAREA.get(tarea, NORMAL)
+    if cancelacion is not None and cancelacion.cancelada:
+        # La especulación se descartó: ni siquiera se prepara el prompt
+        raise TurnoCancelado("Especulación descartada")
+    modelo = modelo_para(tarea)
+    full_prompt, clave = _preparar_prompt(prompt, session_id, recuperar, modelo)
+    if usar_cache:
+        cached = cache_llm().obtener(clave)
+        if cached is not None:
+            return cached
+    try:
+        with planificador_llm.turno(prioridad, session_id, cancelacion):
+            # Solo cuenta la inferencia, no la espera en la cola
+            inicio = time.perf_counter()
+            bruto, usado = _invoke_llm_en(full_prompt, modelo)
+            segundos = time.perf_counter() - inicio
+    except ColaLLMLlena as exc:
+        raise _servidor_ocupado(exc) from exc
+    enrutador_modelos.registrar(usado, estimar_tokens(bruto), segundos)
+    texto = clean_llm_output(bruto)
+    if usar_cache:
+        cache_llm().guardar(clave, texto, segundos)
+    return texto
+
+
+async def ainvoke_llm(
+    prompt: str,
+    session_id: str = "default",
+    usar_cache: bool = True,
+    recuperar: bool = False,
+    tarea: str = "general",
+) -> str:
+    """Equivalente asíncrono de ``invoke_llm``.
+
+    Espera su turno en ``planificador_llm`` sin ocupar hilos, de modo que el
+    chat adelanta a los informes largos en cola.
+    """
+    modelo = modelo_para(tarea)
+    full_prompt, clave = await run_in_threadpool(
+        _preparar_prompt, prompt, session_id, recuperar, modelo
+    )
+    if usar_cache:
+        cached = await run_in_threadpool(cache_llm().obtener, clave)
+        if cached is not None:
+            return cached
+    try:
+        async with planificador_llm.turno_async(PRIORIDAD_TAREA.get(tarea, NORMAL), session_id):
+            inicio = time.perf_counter()
+            if modelo == MODEL_NAME:
+                bruto, usado = await _ainvoke_llm(full_prompt), MODEL_NAME
+            else:
+                bruto, usado = await run_in_threadpool(_invoke_llm_en, full_prompt, modelo)
+            segundos = time.perf_counter() - inicio
+    except ColaLLMLlena as exc:
+        raise _servidor_ocupado(exc) from exc
+    enrutador_modelos.registrar(usado, estimar_tokens(bruto), segundos)
+    texto = clean_llm_output(bruto)
+    if usar_cache:
+        await run_in_threadpool(cache_llm().guardar, clave, texto, segundos)
+    return texto
+
+
+def _cronometrar(fuente: Iterator[str], segundos: list[float]) -> Iterator[str]:
+    """Reenvía ``fuente`` sumando en ``segundos[0]`` lo que tarda en producir.
+
+    El tiempo que el consumidor tarda en leer cada fragmento no se cuenta, así
+    que la velocidad medida es la del modelo y no la del cliente.
+    """
+    while True:
+        inicio = time.perf_counter()
+        trozo = next(fuente, None)
+        segundos[0] += time.perf_counter() - inicio
+        if trozo is None:
+            return
+        yield trozo
+
+
+def stream_llm(
+    prompt: str,
+    session_id: str = "default",
+    usar_cache: bool = True,
+    recuperar: bool = False,
+    tarea: str = "general",
+) -> Iterator[str]:
+    """Como ``invoke_llm`` pero devolviendo la salida limpia por fragmentos."""
+    modelo = modelo_para(tarea)
+    full_prompt, clave = _preparar_prompt(prompt, session_id, recuperar, modelo)
+    if usar_cache:
+        cached = cache_llm().obtener(clave)
+        if cached is not None:
+            if cached:
+                yield cached
+            return
+    limpiador = LimpiadorIncremental()
+    partes: list[str] = []
+    tokens = 0
+    segundos = [0.0]
+    usado = [modelo]
+    try:
+        # El hueco se mantiene mientras dure la emisión
+        with planificador_llm.turno(PRIORIDAD_TAREA.get(tarea, NORMAL), session_id):
+            for trozo in _cronometrar(_stream_llm_en(full_prompt, modelo, usado), segundos):
+                tokens += estimar_tokens(trozo)
+                salida = limpiador.agregar(trozo)
+                if salida:
+                    partes.append(salida)
+                    yield salida
+    except ColaLLMLlena as exc:
+        raise _servidor_ocupado(exc) from exc
+    resto = limpiador.finalizar()
+    if resto:
+        partes.append(resto)
+        yield resto
+    enrutador_modelos.registrar(usado[0], tokens, segundos[0])
+    if usar_cache:
+        cache_llm().guardar(clave, "".join(partes), segundos[0])
 
 EXPORT_DIR = Path(CONFIG.get("export_dir", "exports"))
 EXPORT_DIR.mkdir(parents=True, exist_ok=True)
@@ -183,109 +669,382 @@ UPLOAD_DIR = REPO_ROOT / "backend" / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 TMP_DIR = REPO_ROOT / "backend" / "tmp"
 TMP_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_DIR = REPO_ROOT / "backend" / "cache"
+
+_caches_llm: dict[Path, CacheLLM] = {}
+
+
+_manifiestos: dict[Path, ManifiestosDocumentos] = {}
+
+
+def manifiestos_documentos() -> ManifiestosDocumentos:
+    """Manifiestos de documentos ya ingeridos, en ``CACHE_DIR/documentos``."""
+    almacen = _manifiestos.get(CACHE_DIR)
+    if almacen is None:
+        almacen = ManifiestosDocumentos(CACHE_DIR / "documentos")
+        _manifiestos[CACHE_DIR] = almacen
+    return almacen
+
+
+_almacenes_sesiones: dict[Path, AlmacenSesiones] = {}
+
+
+def almacen_sesiones() -> AlmacenSesiones:
+    """Conversaciones del asistente e idioma por sesión.
+
+    Con ``sesiones_persistentes`` se guardan en ``CACHE_DIR/sesiones.db`` y
+    sobreviven a un reinicio del sidecar.
+    """
+    almacen = _almacenes_sesiones.get(CACHE_DIR)
+    if almacen is None:
+        almacen = AlmacenSesiones(
+            CACHE_DIR / "sesiones.db" if CONFIG.get("sesiones_persistentes", True) else None,
+            ttl=float(CONFIG.get("sesiones_ttl", 24 * 3600)),
+            max_memoria=int(CONFIG.get("sesiones_max_memoria", 1000)),
+        )
+        _almacenes_sesiones[CACHE_DIR] = almacen
+    return almacen
+
+
+def cache_llm() -> CacheLLM:
+    """Devuelve la caché de respuestas del LLM ubicada en ``CACHE_DIR``."""
+    cache = _caches_llm.get(CACHE_DIR)
+    if cache is None:
+        cache = CacheLLM(
+            CACHE_DIR / "llm_cache.db",
+            max_entradas=int(CONFIG.get("llm_cache_max_entries", 2000)),
+            ttl=float(CONFIG.get("llm_cache_ttl", 7 * 24 * 3600)),
+        )
+        _caches_llm[CACHE_DIR] = cache
+    return cache
 
 # Inicializar modelo de embedding y base vectorial persistente
-if SentenceTransformer:
-    try:
-        embedder = SentenceTransformer("all-MiniLM-L6-v2")
-    except Exception:  # pragma: no cover - handle offline env
-        class _DummyEmbedder:
-            def encode(self, text):
-                return [0.0]
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+class _DummyEmbedder:
+    def encode(self, text, **kwargs):
+        if isinstance(text, list):
+            return [[0.0] for _ in text]
+        return [0.0]
+
+
+class _EmbedderPerezoso:
+    """Carga ``SentenceTransformer`` en el primer ``encode``.
+
+    Si sentence-transformers no está instalado o el modelo no puede
+    descargarse, recurre a ``_DummyEmbedder``.
+    """
+
+    def __init__(self, modelo: str) -> None:
+        self.modelo = modelo
+        self._real = None
+        self._lock = Lock()
+
+    def cargar(self):
+        if self._real is None:
+            with self._lock:
+                if self._real is None:
+                    st = _importar_opcional("sentence_transformers")
+                    try:
+                        self._real = st.SentenceTransformer(self.modelo) if st else _DummyEmbedder()
+                    except Exception:  # pragma: no cover - handle offline env
+                        self._real = _DummyEmbedder()
+        return self._real
+
+    def es_real(self) -> bool:
+        return not isinstance(self.cargar(), _DummyEmbedder)
+
+    def encode(self, text, **kwargs):
+        return self.cargar().encode(text, **kwargs)
+
+
+embedder = _EmbedderPerezoso(EMBEDDING_MODEL)
+
+
+def embeddings_reales() -> bool:
+    """``False`` con el embedder de reserva, cuyos vectores no significan nada."""
+    if isinstance(embedder, _EmbedderPerezoso):
+        return embedder.es_real()
+    return bool(embedder) and not isinstance(embedder, _DummyEmbedder)
+
+_servicios_emb: dict[Path, ServicioEmbeddings] = {}
+
+
+def servicio_embeddings() -> ServicioEmbeddings:
+    """Servicio de embeddings con caché sobre el ``embedder`` activo.
+
+    Con el embedder de reserva no se persiste nada en disco para no mezclar
+    vectores vacíos con los del modelo real.
+    """
+    servicio = _servicios_emb.get(CACHE_DIR)
+    if servicio is None or servicio.embedder is not embedder:
+        persistente = embeddings_reales()
+        servicio = ServicioEmbeddings(
+            embedder,
+            CACHE_DIR / "embeddings.db" if persistente else None,
+            modelo=EMBEDDING_MODEL if persistente else "dummy",
+            batch_size=int(CONFIG.get("embedding_batch_size", 32)),
+        )
+        _servicios_emb[CACHE_DIR] = servicio
+    return servicio
+
+
+# Cliente y colecciones de Chroma: se abren en el primer uso (o durante el
+# precalentamiento en segundo plano) a través de los accesores.
+_PENDIENTE = object()
+client = _PENDIENTE
+collection = _PENDIENTE
+docs_collection = _PENDIENTE
+_chroma_lock = Lock()
+
+
+def _cargar_chroma() -> None:
+    global client, collection, docs_collection
+    with _chroma_lock:
+        if client is _PENDIENTE:
+            chromadb = _importar_opcional("chromadb")
+            try:
+                client = chromadb.PersistentClient(path=str(CHROMA_PATH)) if chromadb else None
+            except Exception:  # pragma: no cover - corrupted store or missing deps
+                client = None
+        if collection is _PENDIENTE:
+            collection = client.get_or_create_collection("informes") if client else None
+        if docs_collection is _PENDIENTE:
+            docs_collection = client.get_or_create_collection("documentos") if client else None
+
+
+def coleccion_informes():
+    """Colección Chroma de informes, o ``None`` si Chroma no está disponible."""
+    if collection is _PENDIENTE:
+        _cargar_chroma()
+    return collection
 
-        embedder = _DummyEmbedder()
-else:
-    class _DummyEmbedder:
-        def encode(self, text):
-            return [0.0]
 
-    embedder = _DummyEmbedder()
-client = chromadb.PersistentClient(path=str(CHROMA_PATH)) if chromadb else None
-collection = client.get_or_create_collection("informes") if client else None
-docs_collection = client.get_or_create_collection("documentos") if client else None
+def coleccion_documentos():
+    """Colección Chroma de documentos subidos, o ``None``."""
+    if docs_collection is _PENDIENTE:
+        _cargar_chroma()
+    return docs_collection
+
+
+def precalentar() -> None:
+    """Mide el hardware, precalienta el LLM, carga Chroma y los embeddings y reconcilia.
+
+    La memoria libre se mide antes de que Ollama cargue el modelo; si no, la
+    que ocupa el propio modelo haría parecer que no cabe.
+    """
+    enrutador_modelos.hardware = detectar_hardware()
+    gestor_modelo.iniciar_precalentamiento()
+    coleccion_informes()
+    coleccion_documentos()
+    if isinstance(embedder, _EmbedderPerezoso):
+        embedder.cargar()
+    iniciar_sync_chroma()
+
+
+_almacenes: dict[Path, AlmacenHistorial] = {}
+
+
+def almacen_historial() -> AlmacenHistorial:
+    """Devuelve el almacén SQLite asociado a ``HIST_PATH``.
+
+    La base vive junto al JSON heredado (``historial.db``) y lo importa la
+    primera vez que se abre.
+    """
+    almacen = _almacenes.get(HIST_PATH)
+    if almacen is None:
+        almacen = AlmacenHistorial(HIST_PATH.with_suffix(".db"), legado=HIST_PATH)
+        _almacenes[HIST_PATH] = almacen
+    return almacen
 
 
 def cargar_historial() -> list:
-    if HIST_PATH.exists():
-        with HIST_PATH.open("r", encoding="utf-8") as fh:
-            return json.load(fh)
-    return []
+    return list(almacen_historial().iterar())
 
 
 def guardar_historial(items: list) -> None:
-    with HIST_PATH.open("w", encoding="utf-8") as fh:
-        json.dump(items, fh, ensure_ascii=False, indent=2)
+    almacen_historial().reemplazar(items)
+
+
+def compactar_historial() -> None:
+    """Purga las lápidas del historial si se acumularon suficientes."""
+    almacen = almacen_historial()
+    if almacen.necesita_compactar():
+        almacen.compactar()
 
 
 def agregar_a_chroma(item: dict) -> None:
-    """Guarda el embedding de un informe en ChromaDB."""
-    if not collection or not embedder:
+    """Guarda el embedding de un informe en ChromaDB (solo con embeddings reales)."""
+    col = coleccion_informes()
+    if not col or not embeddings_reales():
         return
     try:
-        existing = collection.get(ids=[item["id"]])
+        existing = col.get(ids=[item["id"]])
         if existing and existing.get("ids"):
             return
     except Exception:
         pass
-    emb_raw = embedder.encode(item["contenido"])
-    emb = emb_raw.tolist() if hasattr(emb_raw, "tolist") else emb_raw
-    collection.add(
+    emb = servicio_embeddings().codificar(item["contenido"])
+    col.add(
         ids=[item["id"]],
         embeddings=[emb],
-        metadatas=[{
-            "tema": item["tema"],
-            "tipo": item["tipo"],
-            "timestamp": item["timestamp"],
-        }],
+        metadatas=[_metadatos_informe(item)],
     )
 
 
+# Caracteres del extracto que se guarda junto al vector de cada informe
+SNIPPET_CHARS = 200
+
+
+def _marca_tiempo(valor: str) -> Optional[float]:
+    """Convierte una fecha ISO (completa o ``AAAA-MM``/``AAAA``) a segundos."""
+    for parser in (
+        datetime.fromisoformat,
+        lambda v: datetime.strptime(v, "%Y-%m"),
+        lambda v: datetime.strptime(v, "%Y"),
+    ):
+        try:
+            return parser(valor).timestamp()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _metadatos_informe(item: dict) -> dict:
+    meta = {
+        "tema": item["tema"],
+        "tipo": item["tipo"],
+        "timestamp": item["timestamp"],
+        "snippet": (item.get("contenido") or "")[:SNIPPET_CHARS],
+    }
+    ts = _marca_tiempo(item["timestamp"])
+    if ts is not None:
+        meta["ts"] = ts
+    return meta
+
+
 def eliminar_de_chroma(item_id: str) -> None:
     """Elimina un embedding de la base vectorial si existe."""
-    if not collection:
+    col = coleccion_informes()
+    if not col:
         return
     try:
-        collection.delete(ids=[item_id])
+        col.delete(ids=[item_id])
     except Exception:
         pass
 
 
-def agregar_documento(texto: str) -> None:
-    """Almacena un documento en la base vectorial de documentos."""
-    if not docs_collection or not embedder:
-        return
-    doc_id = str(uuid4())
-    emb_raw = embedder.encode(texto)
-    emb = emb_raw.tolist() if hasattr(emb_raw, "tolist") else emb_raw
-    try:
-        docs_collection.add(ids=[doc_id], embeddings=[emb], documents=[texto])
-    except Exception:
-        pass
+def agregar_documento(
+    texto: str,
+    fuente: str = "",
+    paginas: Optional[Iterable[tuple[int, str]]] = None,
+    doc_id: Optional[str] = None,
+    al_indexar: Optional[Callable[[int], None]] = None,
+) -> list[dict]:
+    """Fragmenta un documento y almacena cada trozo en la base vectorial.
+
+    Los fragmentos se codifican por lotes y se guardan con su fuente y página
+    de origen bajo los ids ``<doc_id>:<n>``; al usar ``upsert`` volver a
+    indexar el mismo documento no duplica vectores. Devuelve el manifiesto de
+    fragmentos indexados (vacío si no hay base vectorial o falla la inserción).
+    ``al_indexar`` recibe el total acumulado tras cada lote.
+    """
+    docs_col = coleccion_documentos()
+    if not docs_col or not embedder:
+        return []
+    doc_id = doc_id or str(uuid4())
+    indexados: list[dict] = []
+    servicio = servicio_embeddings()
+    for lote in agrupar(fragmentar(paginas or [(1, texto)]), servicio.batch_size):
+        textos = [f.texto for f in lote]
+        ids = [f"{doc_id}:{f.indice}" for f in lote]
+        try:
+            docs_col.upsert(
+                ids=ids,
+                embeddings=servicio.codificar_lote(textos),
+                documents=textos,
+                metadatas=[
+                    {"doc_id": doc_id, "fuente": fuente, "pagina": f.pagina, "fragmento": f.indice}
+                    for f in lote
+                ],
+            )
+        except Exception:
+            return []
+        indexados.extend({"id": i, "pagina": f.pagina} for i, f in zip(ids, lote))
+        if al_indexar:
+            al_indexar(len(indexados))
+    return indexados
+
 
+politica_contexto = PoliticaContexto.desde_config(CONFIG)
 
-def obtener_contexto_semantico(texto: str, k: int = 2) -> str:
-    """Busca fragmentos relevantes en la base vectorial de documentos."""
-    if not docs_collection or not embedder or not texto:
+
+def obtener_contexto_semantico(texto: str, k: Optional[int] = None) -> str:
+    """Devuelve los fragmentos de documentos relevantes para ``texto``.
+
+    Aplica ``politica_contexto``: omite las consultas triviales, descarta los
+    fragmentos por debajo del umbral de similitud, elimina redundancias con
+    MMR y respeta el presupuesto de tokens.
+    """
+    politica = politica_contexto
+    if k:
+        politica = dataclasses.replace(politica, k=k)
+    if not politica.merece_recuperar(texto):
+        return ""
+    docs_col = coleccion_documentos()
+    if not docs_col or not embedder:
         return ""
-    emb_raw = embedder.encode(texto)
-    emb = emb_raw.tolist() if hasattr(emb_raw, "tolist") else emb_raw
+    emb = servicio_embeddings().codificar(texto)
     try:
-        res = docs_collection.query(
-            query_embeddings=[emb], n_results=k, include=["documents"]
+        res = docs_col.query(
+            query_embeddings=[emb],
+            n_results=max(politica.k, politica.candidatos),
+            include=["documents", "metadatas", "distances", "embeddings"],
         )
     except Exception:
         return ""
-    docs = res.get("documents", [[]])[0]
-    return "\n".join(docs)
+    espacio = (getattr(docs_col, "metadata", None) or {}).get("hnsw:space", "l2")
+    partes = []
+    for doc, meta in seleccionar_contexto(res, politica, espacio):
+        if meta.get("fuente"):
+            partes.append(f"[{meta['fuente']}, p. {meta.get('pagina', '?')}]\n{doc}")
+        else:
+            partes.append(doc)
+    return "\n\n".join(partes)
+
+
+# Los informes guardados antes de añadir ``snippet`` y ``ts`` se completan al
+# reconciliar; sin ``ts`` los filtros de fecha de la búsqueda los descartarían
+reconciliador_chroma = ReconciliadorChroma(
+    lote=int(CONFIG.get("embedding_batch_size", 32)), campos=("snippet", "ts")
+)
 
 
-def sync_chroma() -> None:
+def sync_chroma() -> dict:
     """Sincroniza la base vectorial con el historial guardado."""
-    if not collection or not embedder:
-        return
-    historial = cargar_historial()
-    for it in historial:
-        agregar_a_chroma(it)
+    col = coleccion_informes()
+    if not col or not embeddings_reales():
+        return {"estado": "no_disponible"}
+    return reconciliador_chroma.ejecutar(
+        col,
+        almacen_historial(),
+        servicio_embeddings().codificar_lote,
+        _metadatos_informe,
+    )
+
+
+def iniciar_sync_chroma() -> bool:
+    """Lanza la reconciliación de Chroma en un hilo de fondo."""
+    col = coleccion_informes()
+    if not col or not embeddings_reales():
+        return False
+    return reconciliador_chroma.iniciar(
+        col,
+        almacen_historial(),
+        servicio_embeddings().codificar_lote,
+        _metadatos_informe,
+    )
 
 # --- Conversación Asistente Curioso ---
 class EstadoConversacion(BaseModel):
@@ -298,9 +1057,6 @@ class EstadoConversacion(BaseModel):
     estructura: str | None = None
 
 
-_convs: dict[str, EstadoConversacion] = {}
-_conv_lock = Lock()
-
 
 class Mensaje(BaseModel):
     mensaje: str
@@ -327,8 +1083,39 @@ _PREGUNTAS_PREDETERMINADAS = {
 }
 
 
-def generar_pregunta(paso: int, estado: EstadoConversacion) -> str:
-    """Genera la siguiente pregunta de forma dinámica usando el LLM."""
+# Datos que usa la pregunta de cada paso. No incluyen la respuesta al paso
+# anterior: así la pregunta puede formularse mientras el usuario la escribe.
+_CAMPOS_PREGUNTA = {
+    1: (),
+    2: ("proposito",),
+    3: ("proposito", "tema"),
+    4: ("proposito", "tema", "estilo"),
+}
+_ETIQUETAS_PREGUNTA = {"proposito": "Propósito", "tema": "Tema", "estilo": "Estilo"}
+
+
+def _entradas_pregunta(
+    paso: int, estado: EstadoConversacion, session_id: str = "default"
+) -> tuple:
+    """Todo lo que determina la pregunta del paso ``paso``."""
+    campos = _CAMPOS_PREGUNTA.get(paso, ())
+    return (
+        "pregunta",
+        paso,
+        tuple(getattr(estado, c) for c in campos),
+        session_id,
+        get_language(session_id),
+    )
+
+
+def generar_pregunta(
+    paso: int, estado: EstadoConversacion, session_id: str = "default"
+) -> str:
+    """Genera la siguiente pregunta de forma dinámica usando el LLM.
+
+    Solo usa los datos de ``_CAMPOS_PREGUNTA``, de modo que el resultado es el
+    mismo antes y después de la respuesta al paso anterior.
+    """
     base = _PREGUNTAS_PREDETERMINADAS.get(paso, "")
     if llm is None:
         return base
@@ -337,12 +1124,9 @@ def generar_pregunta(paso: int, estado: EstadoConversacion) -> str:
         "Eres un asistente que ayuda a planificar un informe. "
         "Con la información recopilada hasta ahora, formula la siguiente pregunta "
         "de manera concisa en español.\n"
-        f"Propósito: {estado.proposito or 'N/A'}. "
-        f"Tema: {estado.tema or 'N/A'}. "
-        f"Estilo: {estado.estilo or 'N/A'}. "
-        f"Páginas: {estado.paginas or 'N/A'}. "
-        f"Extras: {estado.extras or 'N/A'}. "
     )
+    for campo in _CAMPOS_PREGUNTA.get(paso, ()):
+        prompt += f"{_ETIQUETAS_PREGUNTA[campo]}: {getattr(estado, campo) or 'N/A'}. "
     if paso == 1:
         prompt += "Necesitamos conocer el tema específico del informe."
     elif paso == 2:
@@ -357,71 +1141,202 @@ def generar_pregunta(paso: int, estado: EstadoConversacion) -> str:
         return base
 
     try:
-        return invoke_llm(prompt)
+        # La pregunta solo depende del estado de la conversación: sin contexto
+        return invoke_llm(prompt, session_id=session_id, tarea="pregunta")
     except Exception:
         return base
 
 
+def _aplicar_respuesta(
+    estado: EstadoConversacion, texto: str
+) -> tuple[Optional[dict], Optional[str]]:
+    """Aplica la respuesta del usuario al paso actual sin llamar al LLM.
+
+    Devuelve ``(réplica, None)`` si la réplica ya está decidida, o
+    ``(None, pendiente)`` cuando falta generar la ``pregunta`` del nuevo paso
+    o la ``estructura``; esa generación se hace fuera del lock.
+    """
+    if estado.paso == 0:
+        estado.proposito = texto
+        estado.paso = 1
+        return None, "pregunta"
+    if estado.paso == 1:
+        estado.tema = texto
+        estado.paso = 2
+        return None, "pregunta"
+    if estado.paso == 2:
+        estado.estilo = texto
+        estado.paso = 3
+        return None, "pregunta"
+    if estado.paso == 3:
+        try:
+            num = int(texto.split()[0])
+        except Exception:
+            return {
+                "reply": "Indica un número de páginas válido entre 1 y 30."}, None
+        if num < 1 or num > 30:
+            return {"reply": "El número debe estar entre 1 y 30."}, None
+        estado.paginas = num
+        estado.paso = 4
+        return None, "pregunta"
+    if estado.paso == 4:
+        # Sigue en el paso 4 hasta que la estructura esté generada
+        estado.extras = texto
+        estado.estructura = None
+        return None, "estructura"
+    if estado.paso == 5:
+        if texto.lower().startswith("s"):
+            estado.paso = 6
+            return {"reply": "Contexto completado", "contexto": estado.model_dump()}, None
+        else:
+            estado.paso = 4
+            return {"reply": "Indica los ajustes que deseas realizar"}, None
+
+    return {"reply": "Conversación finalizada"}, None
+
+
+# Respuestas al paso 4 que equivalen a no añadir consideraciones
+_SIN_EXTRAS = {"", "-", "no", "nada", "ninguna", "ninguno", "none", "n/a"}
+
+especulador_asistente = Especulador()
+
+
+def _extras_efectivos(extras: str | None) -> str | None:
+    texto = (extras or "").strip().lower().rstrip(".!")
+    return None if texto in _SIN_EXTRAS else extras
+
+
+def _entradas_estructura(estado: EstadoConversacion, session_id: str) -> tuple:
+    """Todo lo que determina la estructura propuesta en el paso 4."""
+    return (
+        "estructura",
+        estado.tema,
+        estado.proposito,
+        estado.estilo,
+        estado.paginas,
+        _extras_efectivos(estado.extras),
+        session_id,
+        get_language(session_id),
+    )
+
+
+def _estructura_asistente(estado: EstadoConversacion, session_id: str) -> str:
+    return generar_estructura(
+        estado.tema or "",
+        "Informe",
+        proposito=estado.proposito,
+        estilo=estado.estilo,
+        paginas=estado.paginas,
+        extras=_extras_efectivos(estado.extras),
+        session_id=session_id,
+    )
+
+
+def _especulativo(cancelacion: Cancelacion, trabajo: Callable[[], T]) -> T:
+    """Ejecuta ``trabajo`` en el hilo actual como especulación cancelable."""
+    marca = _cancelacion_especulativa.set(cancelacion)
+    try:
+        return trabajo()
+    finally:
+        _cancelacion_especulativa.reset(marca)
+
+
+async def _especular_siguiente(
+    conv_id: str, estado: EstadoConversacion, session_id: str
+) -> None:
+    """Adelanta el trabajo del LLM que necesitará la próxima respuesta.
+
+    Mientras el usuario escribe se genera la pregunta del paso siguiente, que
+    no depende de la respuesta pendiente (ver ``_CAMPOS_PREGUNTA``), o, en el
+    paso 4, la estructura suponiendo que no hay consideraciones extra.
+    ``asistente`` solo la usa si sus entradas siguen siendo las mismas; si se
+    descarta, su llamada al LLM sale de la cola del planificador.
+    """
+    if not CONFIG.get("asistente_prefetch", True):
+        return
+    previo = estado.model_copy()
+    cancelacion = Cancelacion()
+    if previo.paso < 4:
+        entradas = await run_in_threadpool(
+            _entradas_pregunta, previo.paso + 1, previo, session_id
+        )
+        trabajo = partial(generar_pregunta, previo.paso + 1, previo, session_id)
+    elif previo.paso == 4:
+        previo.extras = None
+        entradas = await run_in_threadpool(_entradas_estructura, previo, session_id)
+        trabajo = partial(_estructura_asistente, previo, session_id)
+    else:
+        especulador_asistente.descartar(conv_id)
+        return
+    crear = partial(run_in_threadpool, _especulativo, cancelacion, trabajo)
+    especulador_asistente.lanzar(conv_id, entradas, crear, cancelacion.cancelar)
+
+
 @app.post("/asistente/{conv_id}")
 async def asistente(conv_id: str, msg: Mensaje, request: Request):
-    """Conversación paso a paso para recolectar contexto."""
-    with _conv_lock:
-        estado = _convs.get(conv_id)
-        if estado is None:
+    """Conversación paso a paso para recolectar contexto.
+
+    Las transiciones de estado son atómicas por conversación (un
+    ``asyncio.Lock`` propio de cada una), pero la inferencia se hace fuera del
+    lock y en el pool de hilos: conversaciones distintas avanzan en paralelo
+    hasta el límite del servidor del modelo. Cada guardado incrementa
+    ``version``; si llega otro mensaje mientras se genera la estructura, el
+    resultado obsoleto no sobrescribe el estado. La pregunta o estructura
+    siguiente se especula en segundo plano (ver ``_especular_siguiente``). El
+    almacén de sesiones usa SQLite, así que se consulta desde el pool de hilos.
+    """
+    session_id = request.headers.get("X-Session-Id", "default")
+    sesiones = almacen_sesiones()
+    async with sesiones.bloquear("conversacion", conv_id):
+        datos = await run_in_threadpool(sesiones.cargar, "conversacion", conv_id)
+        if datos is None:
             estado = EstadoConversacion()
-            _convs[conv_id] = estado
+            await run_in_threadpool(
+                sesiones.guardar,
+                "conversacion",
+                conv_id,
+                {**estado.model_dump(), "version": 0},
+            )
+            await _especular_siguiente(conv_id, estado, session_id)
             return {"reply": _iniciar_conv()}
 
-        texto = msg.mensaje.strip()
-        if estado.paso == 0:
-            estado.proposito = texto
-            estado.paso = 1
-            return {"reply": generar_pregunta(1, estado)}
-        if estado.paso == 1:
-            estado.tema = texto
-            estado.paso = 2
-            return {"reply": generar_pregunta(2, estado)}
-        if estado.paso == 2:
-            estado.estilo = texto
-            estado.paso = 3
-            return {"reply": generar_pregunta(3, estado)}
-        if estado.paso == 3:
-            try:
-                num = int(texto.split()[0])
-            except Exception:
-                return {
-                    "reply": "Indica un número de páginas válido entre 1 y 30."}
-            if num < 1 or num > 30:
-                return {"reply": "El número debe estar entre 1 y 30."}
-            estado.paginas = num
-            estado.paso = 4
-            return {"reply": generar_pregunta(4, estado)}
-        if estado.paso == 4:
-            estado.extras = texto
-            estado.estructura = generar_estructura(
-                estado.tema or "",
-                "Informe",
-                proposito=estado.proposito,
-                estilo=estado.estilo,
-                paginas=estado.paginas,
-                extras=estado.extras,
-                session_id=request.headers.get("X-Session-Id", "default"),
-            )
-            estado.paso = 5
-            return {
-                "reply": estado.estructura
-                + "\n¿Te parece bien esta estructura? (sí/no)",
-                "estructura": estado.estructura,
-            }
-        if estado.paso == 5:
-            if texto.lower().startswith("s"):
-                estado.paso = 6
-                return {"reply": "Contexto completado", "contexto": estado.dict()}
-            else:
-                estado.paso = 4
-                return {"reply": "Indica los ajustes que deseas realizar"}
+        version = datos.pop("version", 0) + 1
+        estado = EstadoConversacion(**datos)
+        respuesta, pendiente = _aplicar_respuesta(estado, msg.mensaje.strip())
+        await run_in_threadpool(
+            sesiones.guardar,
+            "conversacion",
+            conv_id,
+            {**estado.model_dump(), "version": version},
+        )
 
-    return {"reply": "Conversación finalizada"}
+    if pendiente is None:
+        return respuesta
+    if pendiente == "pregunta":
+        entradas = await run_in_threadpool(
+            _entradas_pregunta, estado.paso, estado, session_id
+        )
+        acierto, pregunta = await especulador_asistente.resultado(conv_id, entradas)
+        if not acierto:
+            pregunta = await run_in_threadpool(
+                generar_pregunta, estado.paso, estado, session_id
+            )
+        await _especular_siguiente(conv_id, estado, session_id)
+        return {"reply": pregunta}
+
+    entradas = await run_in_threadpool(_entradas_estructura, estado, session_id)
+    acierto, estructura = await especulador_asistente.resultado(conv_id, entradas)
+    if not acierto:
+        estructura = await run_in_threadpool(_estructura_asistente, estado, session_id)
+    async with sesiones.bloquear("conversacion", conv_id):
+        datos = await run_in_threadpool(sesiones.cargar, "conversacion", conv_id)
+        if datos is not None and datos.get("version") == version:
+            datos.update(estructura=estructura, paso=5, version=version + 1)
+            await run_in_threadpool(sesiones.guardar, "conversacion", conv_id, datos)
+    return {
+        "reply": estructura + "\n¿Te parece bien esta estructura? (sí/no)",
+        "estructura": estructura,
+    }
 
 def generar_estructura(
     tema: str,
@@ -441,7 +1356,9 @@ def generar_estructura(
         "Devuelve solo los títulos de las secciones con una breve descripción de cada una."
     )
     try:
-        return invoke_llm(prompt, session_id=session_id)
+        return invoke_llm(
+            prompt, session_id=session_id, recuperar=True, tarea="estructura"
+        )
     except OllamaEndpointNotFoundError as exc:
         raise HTTPException(
             status_code=500,
@@ -458,8 +1375,133 @@ def generar_contenido(
     extras: str | None = None,
     contexto: str | None = None,
     session_id: str = "default",
+    estructura: str | None = None,
+    usar_cache: bool = True,
+) -> str:
+    """Genera un informe usando LangChain + Ollama.
+
+    Si se indica ``estructura`` el informe se redacta sección a sección con
+    ``generar_informe_por_secciones``.
+    """
+    try:
+        if estructura:
+            eventos = generar_informe_por_secciones(
+                tema,
+                tipo,
+                proposito=proposito,
+                estilo=estilo,
+                paginas=paginas,
+                extras=extras,
+                contexto=contexto,
+                estructura=estructura,
+                session_id=session_id,
+                usar_cache=usar_cache,
+            )
+            return "\n\n".join(
+                ev["contenido"] for ev in eventos if ev["evento"] == "seccion"
+            )
+        prompt = _prompt_contenido(tema, tipo, proposito, estilo, paginas, extras, contexto)
+        return invoke_llm(
+            prompt,
+            session_id=session_id,
+            usar_cache=usar_cache,
+            recuperar=True,
+            tarea="contenido",
+        )
+    except OllamaEndpointNotFoundError as exc:
+        raise HTTPException(
+            status_code=500,
+            detail="Modelo Mixtral no encontrado. Ejecute `ollama pull mixtral`",
+        ) from exc
+
+
+def generar_informe_por_secciones(
+    tema: str,
+    tipo: str,
+    proposito: str | None = None,
+    estilo: str | None = None,
+    paginas: int | None = None,
+    extras: str | None = None,
+    contexto: str | None = None,
+    estructura: str | None = None,
+    session_id: str = "default",
+    usar_cache: bool = True,
+) -> Iterator[dict]:
+    """Redacta el informe con una llamada acotada al LLM por sección.
+
+    Emite primero ``{"evento": "inicio", ...}`` con el índice y después un
+    evento ``seccion`` por apartado. Las secciones terminadas se guardan en
+    ``TMP_DIR/checkpoints`` y una repetición de la misma petición las reutiliza.
+    """
+    datos = {
+        "tema": tema,
+        "tipo": tipo,
+        "proposito": proposito,
+        "estilo": estilo,
+        "paginas": paginas,
+        "extras": extras,
+        "contexto": contexto,
+        "estructura": estructura,
+        "idioma": get_language(session_id),
+    }
+    checkpoints = AlmacenCheckpoints(TMP_DIR / "checkpoints")
+    clave = checkpoints.clave(datos)
+    previo = checkpoints.cargar(clave) or {}
+    estructura = estructura or previo.get("estructura")
+    if not estructura:
+        estructura = generar_estructura(
+            tema,
+            tipo,
+            proposito=proposito,
+            estilo=estilo,
+            paginas=paginas,
+            extras=extras,
+            session_id=session_id,
+        )
+        checkpoints.guardar(clave, {"estructura": estructura, "secciones": {}})
+    secciones = parsear_estructura(estructura)
+
+    def construir(indice: int, resumen: str) -> str:
+        prompt = prompt_seccion(
+            secciones, indice, resumen, tema, tipo, proposito, estilo, paginas, extras
+        )
+        if contexto:
+            prompt += "\nUtiliza la siguiente informaci\u00f3n como referencia:\n" + contexto
+        return prompt
+
+    yield {
+        "evento": "inicio",
+        "total": len(secciones),
+        "secciones": [sec.titulo for sec in secciones],
+        "completadas": len(previo.get("secciones", {})),
+    }
+    for ev in generar_por_secciones(
+        secciones,
+        construir,
+        lambda prompt: invoke_llm(
+            prompt,
+            session_id=session_id,
+            usar_cache=usar_cache,
+            recuperar=True,
+            tarea="contenido",
+        ),
+        checkpoints=checkpoints,
+        clave=clave,
+        extra_checkpoint={"estructura": estructura},
+    ):
+        yield {"evento": "seccion", **ev}
+    checkpoints.eliminar(clave)
+
+
+def _prompt_contenido(
+    tema: str,
+    tipo: str,
+    proposito: str | None = None,
+    estilo: str | None = None,
+    paginas: int | None = None,
+    extras: str | None = None,
+    contexto: str | None = None,
 ) -> str:
-    """Genera un informe usando LangChain + Ollama."""
     prompt = (
         f"Redacta un informe profesional en espa\u00f1ol tipo \"{tipo}\" sobre el tema: \"{tema}\". "
         f"Prop\u00f3sito: {proposito or 'N/A'}. "
@@ -470,62 +1512,248 @@ def generar_contenido(
     )
     if contexto:
         prompt += "\nUtiliza la siguiente informaci\u00f3n como referencia:\n" + contexto
-    try:
-        return invoke_llm(prompt, session_id=session_id)
-    except OllamaEndpointNotFoundError as exc:
-        raise HTTPException(
-            status_code=500,
-            detail="Modelo Mixtral no encontrado. Ejecute `ollama pull mixtral`",
-        ) from exc
+    return prompt
 
 
-def exportar_a_archivo(contenido: str, formato: str) -> str:
-    """Convierte el contenido a DOCX o PDF usando pandoc."""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".md", mode="w", encoding="utf-8") as tmp_md:
-        tmp_md.write(contenido)
-        md_path = tmp_md.name
+_caches_exportacion: dict[Path, CacheExportaciones] = {}
 
-    ext = ".docx" if formato == "docx" else ".pdf"
-    out_name = f"{Path(md_path).stem}{ext}"
-    out_path = EXPORT_DIR / out_name
+conversor_pandoc = ConversorPandoc(
+    workers=int(CONFIG.get("export_workers", 2)),
+    max_cola=int(CONFIG.get("export_max_cola", 16)),
+    timeout=float(CONFIG.get("export_timeout", 120)),
+)
 
-    pandoc_cmd = ["pandoc", md_path, "-o", str(out_path)]
-    if formato == "docx" and CONFIG.get("docx_template"):
-        pandoc_cmd.extend(["--reference-doc", CONFIG["docx_template"]])
-    if formato == "pdf" and CONFIG.get("pdf_css"):
-        pandoc_cmd.extend(["-c", CONFIG["pdf_css"]])
 
-    try:
-        subprocess.run(pandoc_cmd, check=True)
-    except subprocess.CalledProcessError as exc:
-        os.remove(md_path)
-        raise HTTPException(status_code=500, detail="Error al exportar") from exc
+def cache_exportaciones() -> CacheExportaciones:
+    """Exportaciones DOCX/PDF ya generadas, en ``CACHE_DIR/exportaciones``."""
+    cache = _caches_exportacion.get(CACHE_DIR)
+    if cache is None:
+        cache = CacheExportaciones(
+            CACHE_DIR / "exportaciones",
+            max_bytes=int(CONFIG.get("export_cache_mb", 200)) * 1024 * 1024,
+        )
+        _caches_exportacion[CACHE_DIR] = cache
+    return cache
+
 
-    os.remove(md_path)
-    return str(out_path)
+def exportar_a_archivo(contenido: str, formato: str) -> str:
+    """Convierte el contenido a DOCX (python-docx) o PDF (pandoc).
+
+    Con ``docx_nativo`` desactivado, o sin python-docx, el DOCX también se
+    hace con pandoc. El resultado se guarda en ``cache_exportaciones``:
+    exportar otra vez el mismo texto con las mismas plantillas devuelve el
+    archivo ya generado. Es bloqueante; los endpoints la ejecutan en el pool
+    de hilos.
+    """
+    ext = ".docx" if formato == "docx" else ".pdf"
+    plantilla = CONFIG.get("docx_template") if formato == "docx" else CONFIG.get("pdf_css")
+    # El DOCX se genera en proceso con python-docx; pandoc queda para el PDF
+    nativo = (
+        formato == "docx"
+        and CONFIG.get("docx_nativo", True)
+        and _importar_opcional("docx") is not None
+    )
+    cache = cache_exportaciones()
+    clave = cache.clave(contenido, f"{formato}:nativo" if nativo else formato, [plantilla])
+    with cache.bloquear(clave):
+        existente = cache.obtener(clave, ext)
+        if existente is not None:
+            return str(existente)
+
+        if nativo:
+            out_path = cache.directorio / f".{clave}.{uuid4().hex}{ext}"
+            try:
+                markdown_a_docx(contenido, out_path, plantilla)
+            except Exception as exc:
+                out_path.unlink(missing_ok=True)
+                raise HTTPException(status_code=500, detail="Error al exportar") from exc
+            return str(cache.guardar(out_path, clave, ext))
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".md", mode="w", encoding="utf-8") as tmp_md:
+            tmp_md.write(contenido)
+            md_path = tmp_md.name
+        # Nombre oculto hasta que la conversión termina para no servir archivos a medias
+        out_path = cache.directorio / f".{clave}.{uuid4().hex}{ext}"
+
+        pandoc_cmd = ["pandoc", md_path, "-o", str(out_path)]
+        if formato == "docx" and plantilla:
+            pandoc_cmd.extend(["--reference-doc", plantilla])
+        if formato == "pdf" and plantilla:
+            pandoc_cmd.extend(["-c", plantilla])
 
+        try:
+            conversor_pandoc.convertir(pandoc_cmd)
+        except ColaConversionLlena as exc:
+            raise HTTPException(
+                status_code=503, detail=str(exc), headers={"Retry-After": "5"}
+            ) from exc
+        except subprocess.TimeoutExpired as exc:
+            raise HTTPException(status_code=504, detail="La exportación tardó demasiado") from exc
+        except (subprocess.CalledProcessError, OSError) as exc:
+            raise HTTPException(status_code=500, detail="Error al exportar") from exc
+        finally:
+            os.remove(md_path)
+            if out_path.exists() and not out_path.stat().st_size:
+                out_path.unlink()
+
+        return str(cache.guardar(out_path, clave, ext))
+
+
+def _borrar_si_temporal(path: str) -> None:
+    """Elimina una exportación servida salvo que pertenezca a la caché."""
+    if not cache_exportaciones().contiene(path):
+        os.remove(path)
+
+
+# Límites de subida y extracción de documentos
+MAX_DOCUMENTO_BYTES = int(CONFIG.get("max_documento_mb", 50)) * 1024 * 1024
+MAX_PAGINAS_DOCUMENTO = int(CONFIG.get("max_paginas_documento", 2000))
+EXTRACCION_PROCESOS = int(CONFIG.get("extraccion_procesos", 2))
+
+
+@lru_cache(maxsize=1)
+def _pool_extraccion() -> Optional[ProcessPoolExecutor]:
+    """Pool de procesos para extraer PDFs grandes con PyMuPDF (solo si está instalado)."""
+    if EXTRACCION_PROCESOS < 2 or _importar_opcional("fitz") is None:
+        return None
+    return ProcessPoolExecutor(max_workers=EXTRACCION_PROCESOS)
 
-def _leer_documento(path: Path, ext: str) -> str:
-    """Extrae texto de un archivo según su extensión."""
+
+def _iterar_paginas(path: Path, ext: str) -> Iterator[tuple[int, str]]:
+    """Genera el texto de un archivo como pares ``(página, texto)``."""
     if ext == ".pdf":
-        if pdfplumber:
-            with pdfplumber.open(path) as pdf:
-                return "\n".join(page.extract_text() or "" for page in pdf.pages)
-        if fitz:
-            doc = fitz.open(str(path))
-            return "\n".join(page.get_text() for page in doc)
-        raise HTTPException(status_code=500, detail="Soporte PDF no disponible")
+        fitz = _importar_opcional("fitz")  # PyMuPDF, mucho más rápido
+        pdfplumber = None if fitz else _importar_opcional("pdfplumber")
+        if not fitz and not pdfplumber:
+            raise HTTPException(status_code=500, detail="Soporte PDF no disponible")
+        yield from paginas_pdf(
+            str(path),
+            fitz=fitz,
+            pdfplumber=pdfplumber,
+            max_paginas=MAX_PAGINAS_DOCUMENTO,
+            pool=_pool_extraccion(),
+        )
+        return
     if ext == ".docx":
-        if not Document:
+        docx = _importar_opcional("docx")
+        if not docx:
             raise HTTPException(status_code=500, detail="Soporte DOCX no disponible")
-        doc = Document(str(path))
-        return "\n".join(p.text for p in doc.paragraphs)
+        doc = docx.Document(str(path))
+        yield 1, "\n".join(p.text for p in doc.paragraphs)
+        return
     if ext == ".txt":
         with path.open("r", encoding="utf-8") as fh:
-            return fh.read()
+            yield 1, fh.read()
+        return
     raise HTTPException(status_code=400, detail="Formato no soportado")
 
 
+def _leer_documento(path: Path, ext: str) -> str:
+    """Extrae texto de un archivo según su extensión."""
+    return "\n".join(texto for _, texto in _iterar_paginas(path, ext))
+
+
+def _guardar_subida(origen, destino: Path) -> str:
+    """Copia un archivo subido a disco cortando en cuanto supera el límite.
+
+    Devuelve el SHA-256 del contenido, que identifica al documento.
+    """
+    copiados = 0
+    huella = hashlib.sha256()
+    with destino.open("wb") as fh:
+        while bloque := origen.read(1024 * 1024):
+            copiados += len(bloque)
+            if copiados > MAX_DOCUMENTO_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"El documento supera {MAX_DOCUMENTO_BYTES // (1024 * 1024)} MB",
+                )
+            huella.update(bloque)
+            fh.write(bloque)
+    return huella.hexdigest()
+
+
+def _ingerir_documento(
+    path: Path,
+    ext: str,
+    fuente: str,
+    doc_id: str,
+    actualizar: Optional[Callable[..., None]] = None,
+) -> str:
+    """Extrae, fragmenta e indexa un documento página a página.
+
+    Las páginas se pasan a la fragmentación según se extraen, de modo que el
+    indexado avanza a la vez que la lectura. Si el contenido ya se ingirió se
+    devuelve el texto del manifiesto sin volver a extraer ni codificar; solo se
+    reindexa si la vez anterior no había base vectorial. ``actualizar`` recibe
+    el avance (``paginas`` y ``fragmentos``). Devuelve el texto completo.
+    """
+    actualizar = actualizar or (lambda **_: None)
+
+    def al_indexar(total: int) -> None:
+        actualizar(fragmentos=total)
+
+    manifiestos = manifiestos_documentos()
+    previo = manifiestos.cargar(doc_id)
+    if previo is not None:
+        actualizar(paginas=len(previo["paginas"]), reutilizado=True)
+        if not previo.get("fragmentos"):
+            previo["fragmentos"] = agregar_documento(
+                "",
+                fuente=previo.get("fuente", fuente),
+                paginas=[(num, texto) for num, texto in previo["paginas"]],
+                doc_id=doc_id,
+                al_indexar=al_indexar,
+            )
+            if previo["fragmentos"]:
+                manifiestos.guardar(doc_id, previo)
+        actualizar(fragmentos=len(previo["fragmentos"]))
+        return "\n".join(texto for _, texto in previo["paginas"])
+
+    leidas: list[tuple[int, str]] = []
+
+    def _paginas() -> Iterator[tuple[int, str]]:
+        for num, texto in _iterar_paginas(path, ext):
+            texto = unicodedata.normalize("NFC", texto)
+            leidas.append((num, texto))
+            actualizar(paginas=len(leidas))
+            yield num, texto
+
+    paginas = _paginas()
+    try:
+        fragmentos = agregar_documento(
+            "", fuente=fuente, paginas=paginas, doc_id=doc_id, al_indexar=al_indexar
+        )
+        # Sin base vectorial no se consumen las páginas: se terminan de leer aquí
+        for _ in paginas:
+            pass
+    except LimiteExcedido as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    manifiestos.guardar(
+        doc_id,
+        {"doc_id": doc_id, "fuente": fuente, "paginas": leidas, "fragmentos": fragmentos},
+    )
+    return "\n".join(texto for _, texto in leidas)
+
+
+# Ingesta asíncrona: las subidas se aceptan al instante y se procesan aparte
+cola_ingesta = ColaTrabajos(
+    workers=int(CONFIG.get("ingesta_workers", 2)),
+    max_pendientes=int(CONFIG.get("ingesta_max_pendientes", 32)),
+    nombre="ingesta",
+)
+
+
+def _trabajo_ingesta(path: Path, ext: str, fuente: str, doc_id: str, actualizar) -> None:
+    try:
+        _ingerir_documento(path, ext, fuente, doc_id, actualizar)
+    finally:
+        try:
+            path.unlink()
+        except Exception:
+            pass
+
+
 
 class GenerarRequest(BaseModel):
     tema: str
@@ -535,6 +1763,8 @@ class GenerarRequest(BaseModel):
     paginas: int | None = None
     extras: str | None = None
     contexto: str | None = None
+    estructura: str | None = None
+    usar_cache: bool = True
 
 
 class GenerarInformeRequest(BaseModel):
@@ -543,6 +1773,19 @@ class GenerarInformeRequest(BaseModel):
     estilo: str | None = None
     idioma: str | None = None
     longitud: str | None = None
+    estructura: str | None = None
+
+
+def _informe_por_secciones(req: GenerarInformeRequest) -> bool:
+    """Indica si ``/generar_informe`` debe redactar sección a sección.
+
+    Ocurre con un índice aprobado o con un informe largo, que en una sola
+    llamada al modelo se truncaría.
+    """
+    if req.estructura or req.longitud == "largo":
+        return True
+    umbral = int(CONFIG.get("informe_paginas_por_secciones", 5))
+    return bool(req.paginas and req.paginas >= umbral)
 
 
 class ExportarRequest(BaseModel):
@@ -557,41 +1800,38 @@ class GenerarDocxRequest(BaseModel):
     idioma: str | None = None
 
 
-def generar_docx_tema(
+async def generar_docx_tema(
     tema: str,
     objetivo: str | None = None,
     audiencia: str | None = None,
     idioma: str | None = None,
     session_id: str = "default",
 ) -> str:
-    """Genera secciones y construye un DOCX temporal."""
-
-    sec_titles = invoke_llm(
-        f"Proporciona un título breve en {idioma or 'español'} para un informe sobre {tema}.",
-        session_id=session_id,
-    )
-    sec_intro = invoke_llm(
-        f"Redacta una introducción en {idioma or 'español'} sobre {tema} dirigida a {audiencia or 'público general'}.",
-        session_id=session_id,
-    )
-    sec_dev = invoke_llm(
-        f"Desarrolla el tema {tema} en {idioma or 'español'} alcanzando el objetivo {objetivo or 'informativo'}.",
-        session_id=session_id,
-    )
-    sec_conc = invoke_llm(
-        f"Concluye el informe sobre {tema} en {idioma or 'español'}.",
-        session_id=session_id,
-    )
-
-    return crear_docx(
-        {
-            "titulo": sec_titles,
-            "introduccion": sec_intro,
-            "desarrollo": sec_dev,
-            "conclusion": sec_conc,
-        },
-        TMP_DIR,
+    """Genera secciones y construye un DOCX temporal.
+
+    Las cuatro secciones son independientes, así que se piden a la vez al
+    ejecutor compartido del LLM; el límite de llamadas simultáneas lo ponen
+    ese ejecutor y ``planificador_llm`` para todo el servidor, no cada petición.
+    """
+    prompts = {
+        "titulo": f"Proporciona un título breve en {idioma or 'español'} para un informe sobre {tema}.",
+        "introduccion": f"Redacta una introducción en {idioma or 'español'} sobre {tema} dirigida a {audiencia or 'público general'}.",
+        "desarrollo": f"Desarrolla el tema {tema} en {idioma or 'español'} alcanzando el objetivo {objetivo or 'informativo'}.",
+        "conclusion": f"Concluye el informe sobre {tema} en {idioma or 'español'}.",
+    }
+    textos = await asyncio.gather(
+        *(
+            ejecutar_bloqueante(
+                invoke_llm,
+                prompt,
+                session_id=session_id,
+                recuperar=clave != "titulo",
+                tarea="titulo" if clave == "titulo" else "contenido",
+            )
+            for clave, prompt in prompts.items()
+        )
     )
+    return await run_in_threadpool(crear_docx, dict(zip(prompts, textos)), TMP_DIR)
 
 
 @app.post("/documento")
@@ -599,41 +1839,138 @@ async def cargar_documento(file: UploadFile = File(...)):
     """Sube un documento y devuelve su texto extraído."""
     ext = Path(file.filename).suffix.lower()
     tmp_path = UPLOAD_DIR / f"{uuid4()}{ext}"
-    with tmp_path.open("wb") as fh:
-        shutil.copyfileobj(file.file, fh)
-    file.file.close()
     try:
-        texto = _leer_documento(tmp_path, ext)
+        doc_id = await run_in_threadpool(_guardar_subida, file.file, tmp_path)
+        texto = await run_in_threadpool(
+            _ingerir_documento, tmp_path, ext, Path(file.filename).name, doc_id
+        )
     finally:
+        file.file.close()
         try:
             tmp_path.unlink()
         except Exception:
             pass
-    texto = unicodedata.normalize("NFC", texto)
-    agregar_documento(texto)
     return {"contenido": texto}
 
 
+@app.post("/documentos", status_code=202)
+async def encolar_documento(file: UploadFile = File(...)):
+    """Acepta un documento y lo ingiere en segundo plano; devuelve el id del trabajo."""
+    ext = Path(file.filename).suffix.lower()
+    if ext not in (".pdf", ".docx", ".txt"):
+        raise HTTPException(status_code=400, detail="Formato no soportado")
+    tmp_path = UPLOAD_DIR / f"{uuid4()}{ext}"
+    fuente = Path(file.filename).name
+    try:
+        doc_id = await run_in_threadpool(_guardar_subida, file.file, tmp_path)
+        trabajo_id = cola_ingesta.enviar(
+            partial(_trabajo_ingesta, tmp_path, ext, fuente, doc_id),
+            doc_id=doc_id,
+            fuente=fuente,
+            paginas=0,
+            fragmentos=0,
+        )
+    except BaseException as exc:
+        # El trabajo no llegó a encolarse: nadie más borrará la subida
+        tmp_path.unlink(missing_ok=True)
+        if isinstance(exc, ColaLlena):
+            raise HTTPException(status_code=503, detail=str(exc)) from exc
+        raise
+    finally:
+        file.file.close()
+    return {"id": trabajo_id, "estado": "pendiente", "doc_id": doc_id}
+
+
+def _trabajo_o_404(trabajo_id: str) -> dict:
+    trabajo = cola_ingesta.estado(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    trabajo.pop("resultado", None)
+    return trabajo
+
+
+@app.get("/documentos/{trabajo_id}")
+def estado_documento(trabajo_id: str):
+    """Estado de un trabajo de ingesta: páginas, fragmentos y errores."""
+    return _trabajo_o_404(trabajo_id)
+
+
+@app.get("/documentos/{trabajo_id}/texto")
+def texto_documento(trabajo_id: str):
+    """Texto extraído de un trabajo de ingesta terminado."""
+    trabajo = _trabajo_o_404(trabajo_id)
+    if trabajo["estado"] == "error":
+        raise HTTPException(status_code=422, detail=trabajo["error"])
+    if trabajo["estado"] != "completado":
+        raise HTTPException(status_code=409, detail="El documento aún se está procesando")
+    manifiesto = manifiestos_documentos().cargar(trabajo["doc_id"])
+    if manifiesto is None:
+        raise HTTPException(status_code=404, detail="Texto no disponible")
+    return {"contenido": "\n".join(texto for _, texto in manifiesto["paginas"])}
+
+
 @app.post("/generar_informe")
-async def generar_informe(req: GenerarInformeRequest):
-    """Genera un informe por secciones simulando escritura en tiempo real."""
-    texto_base = (
-        f"Informe en {req.idioma or 'español'} sobre {req.tema}.\n"
-        f"Estilo: {req.estilo or 'estándar'}.\n"
-    )
+async def generar_informe(req: GenerarInformeRequest, request: Request):
+    """Genera un informe transmitiendo los tokens del modelo como texto plano.
+
+    Es el flujo de la interfaz principal: el cuerpo es el informe según lo
+    produce el modelo y termina con la línea ``{"finalizado": true}``. El
+    informe se guarda en el historial al completarse. Con ``estructura`` o
+    para informes largos se redacta sección a sección y cada fragmento es
+    una sección completa.
+    """
+    if not req.tema:
+        raise HTTPException(status_code=400, detail="Tema es requerido")
 
-    secciones = [
-        "Introducción...\n",
-        "Desarrollo del tema...\n",
-        "Conclusiones.\n",
-    ]
+    session_id = request.headers.get("X-Session-Id", "default")
+    extras = "; ".join(
+        f"{nombre}: {valor}"
+        for nombre, valor in (("Idioma", req.idioma), ("Longitud", req.longitud))
+        if valor
+    )
+    peticion = GenerarRequest(
+        tema=req.tema,
+        tipo="Informe",
+        estilo=req.estilo,
+        paginas=req.paginas,
+        extras=extras or None,
+        estructura=req.estructura,
+    )
+    if _informe_por_secciones(req):
+        tokens = _fragmentos_por_secciones(
+            generar_informe_por_secciones(
+                peticion.tema,
+                peticion.tipo,
+                estilo=peticion.estilo,
+                paginas=peticion.paginas,
+                extras=peticion.extras,
+                estructura=peticion.estructura,
+                session_id=session_id,
+            )
+        )
+    else:
+        prompt = _prompt_contenido(
+            peticion.tema,
+            peticion.tipo,
+            estilo=peticion.estilo,
+            paginas=peticion.paginas,
+            extras=peticion.extras,
+        )
+        tokens = stream_llm(
+            prompt, session_id=session_id, recuperar=True, tarea="contenido"
+        )
+    primero = await _primer_fragmento(tokens)
 
-    async def gen():
-        yield texto_base
-        for sec in secciones:
-            for ch in sec:
-                yield ch
-                await asyncio.sleep(0.02)
+    def gen():
+        partes: list[str] = []
+        try:
+            for trozo in itertools.chain([primero] if primero else [], tokens):
+                partes.append(trozo)
+                yield trozo
+        except Exception as exc:  # pragma: no cover - runtime connectivity issues
+            yield f"\n[Error: {getattr(exc, 'detail', 'LLM no disponible')}]"
+        else:
+            _registrar_informe(peticion, "".join(partes))
         yield "\n" + json.dumps({"finalizado": True})
 
     return StreamingResponse(gen(), media_type="text/plain; charset=utf-8")
@@ -645,7 +1982,8 @@ async def generar(req: GenerarRequest, request: Request):
         raise HTTPException(status_code=400, detail="Tema es requerido")
 
     session_id = request.headers.get("X-Session-Id", "default")
-    contenido = generar_contenido(
+    contenido = await ejecutar_bloqueante(
+        generar_contenido,
         req.tema,
         req.tipo,
         proposito=req.proposito,
@@ -654,7 +1992,19 @@ async def generar(req: GenerarRequest, request: Request):
         extras=req.extras,
         contexto=req.contexto,
         session_id=session_id,
+        estructura=req.estructura,
+        usar_cache=req.usar_cache,
     )
+    informe = await run_in_threadpool(_registrar_informe, req, contenido)
+    return {"id": informe["id"], "contenido": contenido}
+
+
+def _registrar_informe(req: GenerarRequest, contenido: str) -> dict:
+    """Guarda un informe generado en el historial y en la base vectorial.
+
+    Es bloqueante (SQLite y el embedding): se llama desde el pool de hilos,
+    donde Starlette ya itera los generadores síncronos de ``StreamingResponse``.
+    """
     informe = {
         "id": str(uuid4()),
         "tema": req.tema,
@@ -666,11 +2016,155 @@ async def generar(req: GenerarRequest, request: Request):
         "extras": req.extras,
         "timestamp": datetime.now().isoformat(),
     }
-    historial = cargar_historial()
-    historial.append(informe)
-    guardar_historial(historial)
+    almacen_historial().agregar(informe)
     agregar_a_chroma(informe)
-    return {"id": informe["id"], "contenido": contenido}
+    return informe
+
+
+def _fragmentos_por_secciones(eventos: Iterator[dict]) -> Iterator[str]:
+    """Texto de cada sección terminada, unido como en ``generar_contenido``."""
+    separador = ""
+    for ev in eventos:
+        if ev["evento"] == "seccion":
+            yield separador + ev["contenido"]
+            separador = "\n\n"
+
+
+async def _primer_fragmento(tokens: Iterator[str]) -> Optional[str]:
+    """Espera el primer fragmento antes de responder.
+
+    Así un modelo no disponible produce un código de error HTTP real en vez
+    de una respuesta en streaming vacía.
+    """
+    try:
+        return await run_in_threadpool(next, tokens, None)
+    except OllamaEndpointNotFoundError as exc:
+        raise HTTPException(
+            status_code=500,
+            detail="Modelo Mixtral no encontrado. Ejecute `ollama pull mixtral`",
+        ) from exc
+
+
+def _sse(evento: str, datos: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+@app.post("/generar/stream")
+async def generar_stream(req: GenerarRequest, request: Request):
+    """Genera un informe reenviando los tokens del modelo como Server-Sent Events.
+
+    Emite eventos ``token`` con ``{"texto": ...}`` ya limpios y un evento
+    final ``fin`` con el ``id`` guardado en el historial (o ``error``). Con
+    ``estructura``, como en ``/generar``, el informe se redacta sección a
+    sección y cada ``token`` es una sección completa.
+    """
+    if not req.tema:
+        raise HTTPException(status_code=400, detail="Tema es requerido")
+
+    session_id = request.headers.get("X-Session-Id", "default")
+    if req.estructura:
+        tokens = _fragmentos_por_secciones(
+            generar_informe_por_secciones(
+                req.tema,
+                req.tipo,
+                proposito=req.proposito,
+                estilo=req.estilo,
+                paginas=req.paginas,
+                extras=req.extras,
+                contexto=req.contexto,
+                estructura=req.estructura,
+                session_id=session_id,
+                usar_cache=req.usar_cache,
+            )
+        )
+    else:
+        prompt = _prompt_contenido(
+            req.tema,
+            req.tipo,
+            proposito=req.proposito,
+            estilo=req.estilo,
+            paginas=req.paginas,
+            extras=req.extras,
+            contexto=req.contexto,
+        )
+        tokens = stream_llm(
+            prompt,
+            session_id=session_id,
+            usar_cache=req.usar_cache,
+            recuperar=True,
+            tarea="contenido",
+        )
+    primero = await _primer_fragmento(tokens)
+
+    def eventos():
+        partes: list[str] = []
+        try:
+            for trozo in itertools.chain([primero] if primero else [], tokens):
+                partes.append(trozo)
+                yield _sse("token", {"texto": trozo})
+        except Exception as exc:  # pragma: no cover - runtime connectivity issues
+            yield _sse("error", {"detail": getattr(exc, "detail", "LLM no disponible")})
+            return
+        informe = _registrar_informe(req, "".join(partes))
+        yield _sse("fin", {"id": informe["id"]})
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream; charset=utf-8",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.post("/generar/secciones")
+async def generar_secciones(req: GenerarRequest, request: Request):
+    """Genera un informe largo sección a sección informando del progreso por SSE.
+
+    Emite ``inicio`` (índice de secciones), un evento ``seccion`` por apartado
+    terminado y ``fin`` con el ``id`` guardado. Si la generación falla, una
+    nueva petición idéntica reanuda desde la última sección completada.
+    """
+    if not req.tema:
+        raise HTTPException(status_code=400, detail="Tema es requerido")
+
+    session_id = request.headers.get("X-Session-Id", "default")
+    eventos = generar_informe_por_secciones(
+        req.tema,
+        req.tipo,
+        proposito=req.proposito,
+        estilo=req.estilo,
+        paginas=req.paginas,
+        extras=req.extras,
+        contexto=req.contexto,
+        estructura=req.estructura,
+        session_id=session_id,
+        usar_cache=req.usar_cache,
+    )
+    try:
+        inicio = await run_in_threadpool(next, eventos)
+    except OllamaEndpointNotFoundError as exc:
+        raise HTTPException(
+            status_code=500,
+            detail="Modelo Mixtral no encontrado. Ejecute `ollama pull mixtral`",
+        ) from exc
+
+    def sse():
+        yield _sse(inicio.pop("evento"), inicio)
+        partes: list[str] = []
+        try:
+            for ev in eventos:
+                partes.append(ev["contenido"])
+                yield _sse(ev.pop("evento"), ev)
+        except Exception as exc:  # pragma: no cover - runtime connectivity issues
+            yield _sse("error", {"detail": getattr(exc, "detail", "LLM no disponible")})
+            return
+        informe = _registrar_informe(req, "\n\n".join(partes))
+        yield _sse("fin", {"id": informe["id"]})
+
+    return StreamingResponse(
+        sse(),
+        media_type="text/event-stream; charset=utf-8",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 
 @app.post("/generar-docx")
@@ -680,7 +2174,7 @@ async def generar_docx(
     """Genera un documento DOCX listo para descargar."""
     session_id = request.headers.get("X-Session-Id", "default")
 
-    path = generar_docx_tema(
+    path = await generar_docx_tema(
         req.tema,
         objetivo=req.objetivo,
         audiencia=req.audiencia,
@@ -708,10 +2202,10 @@ async def exportar(req: ExportarRequest, background_tasks: BackgroundTasks):
     if not req.contenido:
         raise HTTPException(status_code=400, detail="Contenido vac\u00edo")
 
-    file_path = exportar_a_archivo(req.contenido, req.formato)
+    file_path = await run_in_threadpool(exportar_a_archivo, req.contenido, req.formato)
     if not os.path.exists(file_path):
         Path(file_path).touch()
-    background_tasks.add_task(os.remove, file_path)
+    background_tasks.add_task(_borrar_si_temporal, file_path)
     media = (
         "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
         if req.formato == "docx"
@@ -721,62 +2215,85 @@ async def exportar(req: ExportarRequest, background_tasks: BackgroundTasks):
 
 
 @app.get("/historial")
-async def listar_historial():
-    """Devuelve la lista de informes guardados (sin contenido)."""
-    historial = cargar_historial()
-    return [
-        {
-            "id": item["id"],
-            "tema": item["tema"],
-            "tipo": item["tipo"],
-            "timestamp": item["timestamp"],
-        }
-        for item in historial
-    ]
+async def listar_historial(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    orden: str = "asc",
+    tipo: Optional[str] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+):
+    """Devuelve la lista de informes guardados (sin contenido).
+
+    Con ``limit`` la respuesta se pagina; el cursor de la página siguiente
+    viaja en la cabecera ``X-Next-Cursor``.
+    """
+    if limit is not None and not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit debe estar entre 1 y 500")
+    if orden not in {"asc", "desc"}:
+        raise HTTPException(status_code=400, detail="Orden no soportado")
+    try:
+        items, siguiente = almacen_historial().listar_pagina(
+            limite=limit, cursor=cursor, orden=orden, tipo=tipo, desde=desde, hasta=hasta
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Cursor inválido") from exc
+    if siguiente:
+        response.headers["X-Next-Cursor"] = siguiente
+    return items
 
 
 @app.get("/historial/{item_id}")
 async def obtener_informe(item_id: str, background_tasks: BackgroundTasks, exportar: Optional[str] = None):
     """Obtiene un informe completo por ID o lo exporta en el formato indicado."""
-    historial = cargar_historial()
-    for item in historial:
-        if item["id"] == item_id:
-            if exportar:
-                if exportar not in {"docx", "pdf"}:
-                    raise HTTPException(status_code=400, detail="Formato no soportado")
-                file_path = exportar_a_archivo(item["contenido"], exportar)
-                if background_tasks:
-                    background_tasks.add_task(os.remove, file_path)
-                media = (
-                    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                    if exportar == "docx"
-                    else "application/pdf"
-                )
-                return FileResponse(
-                    file_path,
-                    media_type=media,
-                    filename=f"informe.{exportar}",
-                    background=background_tasks,
-                )
-            return item
-    raise HTTPException(status_code=404, detail="Informe no encontrado")
+    item = almacen_historial().obtener(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Informe no encontrado")
+    if exportar:
+        if exportar not in {"docx", "pdf"}:
+            raise HTTPException(status_code=400, detail="Formato no soportado")
+        file_path = await run_in_threadpool(exportar_a_archivo, item["contenido"], exportar)
+        if background_tasks:
+            background_tasks.add_task(_borrar_si_temporal, file_path)
+        media = (
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            if exportar == "docx"
+            else "application/pdf"
+        )
+        return FileResponse(
+            file_path,
+            media_type=media,
+            filename=f"informe.{exportar}",
+            background=background_tasks,
+        )
+    return item
 
 
 @app.delete("/historial/{item_id}")
-async def eliminar_informe(item_id: str):
+async def eliminar_informe(item_id: str, background_tasks: BackgroundTasks):
     """Elimina un informe del historial."""
-    historial = cargar_historial()
-    nuevo_historial = [it for it in historial if it["id"] != item_id]
-    if len(nuevo_historial) == len(historial):
+    if not almacen_historial().eliminar(item_id):
         raise HTTPException(status_code=404, detail="Informe no encontrado")
-    guardar_historial(nuevo_historial)
     eliminar_de_chroma(item_id)
+    background_tasks.add_task(compactar_historial)
     return {"ok": True}
 
 
 class BuscarRequest(BaseModel):
     query: str
     k: int = 5
+    tipo: Optional[str] = None
+    desde: Optional[str] = None
+    hasta: Optional[str] = None
+
+
+class BuscarLoteRequest(BaseModel):
+    consultas: list[str]
+    k: int = 5
+    tipo: Optional[str] = None
+    desde: Optional[str] = None
+    hasta: Optional[str] = None
 
 
 def _should_start(text: str) -> bool:
@@ -846,7 +2363,9 @@ async def conversar(req: ConversacionRequest, request: Request):
     if req.modo == "generar":
         session_id = request.headers.get("X-Session-Id", "default")
         try:
-            texto = generar_contenido(prompt, "Informe", session_id=session_id)
+            texto = await ejecutar_bloqueante(
+                generar_contenido, prompt, "Informe", session_id=session_id
+            )
         except Exception:
             texto = f"Generando informe: {prompt}"
         print("Mensaje recibido:", prompt)
@@ -856,7 +2375,7 @@ async def conversar(req: ConversacionRequest, request: Request):
     session_id = request.headers.get("X-Session-Id", "default")
     tema_docx = _detect_word_request(prompt)
     if tema_docx:
-        path = generar_docx_tema(tema_docx, session_id=session_id)
+        path = await generar_docx_tema(tema_docx, session_id=session_id)
         headers = {"Content-Disposition": "attachment; filename='informe.docx'"}
         background_tasks = BackgroundTasks()
         background_tasks.add_task(os.remove, path)
@@ -878,7 +2397,7 @@ async def conversar(req: ConversacionRequest, request: Request):
         return {"respuesta": texto_resp}
 
     try:
-        respuesta = invoke_llm(prompt, session_id=session_id)
+        respuesta = await ainvoke_llm(prompt, session_id=session_id, recuperar=True)
         error = None
     except HTTPException as exc:
         respuesta = ""
@@ -898,6 +2417,34 @@ async def conversar(req: ConversacionRequest, request: Request):
     return payload
 
 
+@app.get("/cache/llm")
+async def estadisticas_cache_llm():
+    """Aciertos, fallos y tiempo de inferencia ahorrado por la caché del LLM."""
+    return cache_llm().estadisticas()
+
+
+@app.delete("/cache/llm")
+async def limpiar_cache_llm():
+    """Vacía la caché de respuestas del LLM."""
+    cache_llm().limpiar()
+    return {"ok": True}
+
+
+@app.get("/sesiones")
+async def estadisticas_sesiones():
+    """Sesiones vivas, memoria aproximada y expulsiones del almacén de sesiones."""
+    return {
+        **almacen_sesiones().estadisticas(),
+        "especulacion": especulador_asistente.estadisticas(),
+    }
+
+
+@app.get("/cache/exportaciones")
+async def estadisticas_cache_exportaciones():
+    """Aciertos de la caché de exportaciones y ocupación del pool de pandoc."""
+    return {**cache_exportaciones().estadisticas(), "pandoc": conversor_pandoc.estadisticas()}
+
+
 @app.post("/config/idioma")
 async def cambiar_idioma(req: IdiomaRequest, request: Request):
     """Actualiza el idioma de la sesi\u00f3n."""
@@ -906,43 +2453,188 @@ async def cambiar_idioma(req: IdiomaRequest, request: Request):
     return {"ok": True, "idioma": get_language(session_id)}
 
 
+def _filtro_busqueda(
+    tipo: Optional[str], desde: Optional[str], hasta: Optional[str]
+) -> Optional[dict]:
+    """Traduce los filtros de búsqueda a una cláusula ``where`` de Chroma."""
+    condiciones: list[dict] = []
+    if tipo:
+        condiciones.append({"tipo": tipo})
+    # Una fecha sin hora en ``hasta`` incluye el día entero, como en el historial
+    fin = fin_exclusivo(hasta) if hasta else None
+    for valor, limite, operador in (
+        (desde, desde, "$gte"),
+        (hasta, fin or hasta, "$lt" if fin else "$lte"),
+    ):
+        if not valor:
+            continue
+        ts = _marca_tiempo(limite)
+        if ts is None:
+            raise HTTPException(status_code=400, detail=f"Fecha inválida: {valor}")
+        condiciones.append({"ts": {operador: ts}})
+    if not condiciones:
+        return None
+    return condiciones[0] if len(condiciones) == 1 else {"$and": condiciones}
+
+
+def _buscar_vectorial(
+    consultas: list[str], k: int, where: Optional[dict]
+) -> list[list[dict]]:
+    """Resultados de Chroma para cada consulta; listas vacías sin base vectorial.
+
+    Las consultas se codifican en un único lote y se resuelven con una sola
+    llamada a Chroma, con los filtros aplicados en la propia colección. Los
+    extractos salen de los metadatos; solo los vectores antiguos sin
+    ``snippet`` recurren al historial. Con el embedder de reserva todas las
+    distancias son iguales, así que no se consulta Chroma.
+    """
+    col = coleccion_informes()
+    if not col or not embeddings_reales():
+        return [[] for _ in consultas]
+    embs = servicio_embeddings().codificar_lote(consultas)
+    kwargs = {"where": where} if where else {}
+    try:
+        result = col.query(
+            query_embeddings=embs,
+            n_results=k,
+            include=["metadatas", "distances"],
+            **kwargs,
+        )
+    except Exception:
+        return [[] for _ in consultas]
+
+    ids_por_consulta = result.get("ids") or [[] for _ in consultas]
+    metas_por_consulta = result.get("metadatas") or [[] for _ in consultas]
+    distancias = result.get("distances") or [[] for _ in consultas]
+    sin_snippet = {
+        rid
+        for ids, metas in zip(ids_por_consulta, metas_por_consulta)
+        for rid, meta in zip(ids, metas)
+        if "snippet" not in (meta or {})
+    }
+    hist_map = almacen_historial().obtener_varios(sorted(sin_snippet)) if sin_snippet else {}
+
+    resultados = []
+    for ids, metas, dist in zip(ids_por_consulta, metas_por_consulta, distancias):
+        items = []
+        for i, (rid, meta) in enumerate(zip(ids, metas)):
+            meta = meta or {}
+            if "snippet" not in meta:
+                if rid not in hist_map:
+                    continue
+                base = hist_map[rid]
+                meta = {
+                    "tema": base["tema"],
+                    "tipo": base["tipo"],
+                    "timestamp": base["timestamp"],
+                    **meta,
+                    "snippet": (base.get("contenido") or "")[:SNIPPET_CHARS],
+                }
+            item = {
+                "id": rid,
+                "tema": meta.get("tema"),
+                "tipo": meta.get("tipo"),
+                "timestamp": meta.get("timestamp"),
+                "snippet": meta["snippet"],
+            }
+            if i < len(dist):
+                item["distancia"] = dist[i]
+            items.append(item)
+        resultados.append(items)
+    return resultados
+
+
+# Constante de Reciprocal Rank Fusion; 60 es el valor habitual
+RRF_K = 60
+
+
+def _fusionar_rrf(listas: list[list[dict]], k: int) -> list[dict]:
+    """Combina rankings por Reciprocal Rank Fusion y devuelve los ``k`` mejores."""
+    puntos: dict[str, float] = {}
+    items: dict[str, dict] = {}
+    for lista in listas:
+        for rango, item in enumerate(lista):
+            puntos[item["id"]] = puntos.get(item["id"], 0.0) + 1 / (RRF_K + rango + 1)
+            items[item["id"]] = {**item, **items.get(item["id"], {})}
+    orden = sorted(puntos, key=puntos.get, reverse=True)[:k]
+    fusionados = []
+    for rid in orden:
+        item = items[rid]
+        item.pop("puntuacion", None)
+        fusionados.append({**item, "puntuacion": round(puntos[rid], 6)})
+    return fusionados
+
+
+def buscar_lote(
+    consultas: list[str],
+    k: int = 5,
+    tipo: Optional[str] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+) -> list[list[dict]]:
+    """Búsqueda híbrida de informes para varias consultas a la vez.
+
+    Fusiona por RRF los resultados vectoriales de Chroma con los del índice
+    BM25 del historial. Sin base vectorial o sin un modelo de embeddings real
+    la búsqueda sigue funcionando solo con el índice léxico.
+    """
+    if not consultas:
+        return []
+    where = _filtro_busqueda(tipo, desde, hasta)
+    vectoriales = _buscar_vectorial(consultas, k, where)
+    almacen = almacen_historial()
+    return [
+        _fusionar_rrf(
+            [vec, almacen.buscar_texto(consulta, k, tipo=tipo, desde=desde, hasta=hasta)], k
+        )
+        for consulta, vec in zip(consultas, vectoriales)
+    ]
+
+
 @app.post("/buscar")
 async def buscar(req: BuscarRequest):
     """Busca informes similares a la consulta."""
     if not req.query:
         raise HTTPException(status_code=400, detail="Consulta vac\u00eda")
-    emb_raw = embedder.encode(req.query)
-    emb = emb_raw.tolist() if hasattr(emb_raw, "tolist") else emb_raw
-    try:
-        result = collection.query(
-            query_embeddings=[emb],
-            n_results=req.k,
-            include=["metadatas", "ids"],
-        )
-    except Exception:
-        return []
+    resultados = await run_in_threadpool(
+        buscar_lote, [req.query], req.k, req.tipo, req.desde, req.hasta
+    )
+    return resultados[0]
 
-    hist_map = {item["id"]: item for item in cargar_historial()}
-    items = []
-    ids = result.get("ids", [[]])[0]
-    metas = result.get("metadatas", [[]])[0]
-    for rid, meta in zip(ids, metas):
-        if rid in hist_map:
-            base = hist_map[rid]
-            items.append(
-                {
-                    "id": rid,
-                    "tema": meta.get("tema", base["tema"]),
-                    "tipo": meta.get("tipo", base["tipo"]),
-                    "timestamp": meta.get("timestamp", base["timestamp"]),
-                    "snippet": base.get("contenido", "")[:200],
-                }
-            )
-    return items
+
+@app.post("/buscar/lote")
+async def buscar_varias(req: BuscarLoteRequest):
+    """Resuelve varias búsquedas con una codificación y una consulta a Chroma."""
+    consultas = [c for c in req.consultas if c.strip()]
+    if not consultas:
+        raise HTTPException(status_code=400, detail="Consulta vac\u00eda")
+    if len(consultas) > 50:
+        raise HTTPException(status_code=400, detail="Máximo 50 consultas por lote")
+    resultados = await run_in_threadpool(
+        buscar_lote, consultas, req.k, req.tipo, req.desde, req.hasta
+    )
+    return [
+        {"consulta": consulta, "resultados": items}
+        for consulta, items in zip(consultas, resultados)
+    ]
+
+
+@app.get("/llm/planificador")
+async def metricas_planificador():
+    """Profundidad de cola y tiempos de espera por clase de prioridad."""
+    return planificador_llm.metricas()
+
+
+@app.get("/modelo/estado")
+async def estado_modelo():
+    """Estado de carga del modelo en Ollama para mostrarlo en la interfaz."""
+    return {**gestor_modelo.estado(), "enrutador": enrutador_modelos.estadisticas()}
 
 
-# Sincronizar la base vectorial al iniciar el servidor
-sync_chroma()
+@app.get("/chroma/sync")
+async def progreso_sync_chroma():
+    """Progreso de la reconciliación entre el historial y ChromaDB."""
+    return reconciliador_chroma.progreso()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import json
+import time
+from threading import Lock, Thread
+from typing import Iterator, Optional
+
+try:
+    import httpx
+except Exception:  # pragma: no cover - optional dependency
+    httpx = None
+
+
+class ModeloNoDisponible(RuntimeError):
+    """El servidor de Ollama no responde o no tiene el modelo."""
+
+
+def normalizar_host(host: str) -> str:
+    """Acepta ``OLLAMA_HOST`` con o sin esquema (``127.0.0.1:11434``)."""
+    host = (host or "127.0.0.1:11434").strip().rstrip("/")
+    return host if "://" in host else f"http://{host}"
+
+
+class GestorModelo:
+    """Ciclo de vida del modelo servido por Ollama.
+
+    Mantiene un único cliente HTTP con conexiones persistentes, precalienta el
+    modelo en segundo plano fijándolo en memoria con ``keep_alive`` y expone su
+    estado (``desconocido``, ``cargando``, ``listo``, ``no_disponible`` o
+    ``error``). Tras un fallo de conexión no se reintenta durante
+    ``REINTENTO`` segundos para no penalizar cada petición.
+    """
+
+    REINTENTO = 30.0
+
+    def __init__(
+        self,
+        host: str,
+        modelo: str,
+        keep_alive: str = "30m",
+        timeout: float = 600.0,
+    ) -> None:
+        self.host = normalizar_host(host)
+        self.modelo = modelo
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._lock = Lock()
+        self._cliente = None
+        self._hilo: Optional[Thread] = None
+        self._fallo = 0.0
+        self.instalados: list[str] = []
+        self._estado: dict = {
+            "estado": "desconocido",
+            "error": None,
+            "segundos_carga": None,
+            "ultimo_uso": None,
+        }
+
+    def _http(self):
+        if httpx is None:
+            raise ModeloNoDisponible("httpx no está instalado")
+        with self._lock:
+            if self._cliente is None:
+                self._cliente = httpx.Client(
+                    base_url=self.host,
+                    timeout=httpx.Timeout(self.timeout, connect=2.0),
+                    limits=httpx.Limits(max_keepalive_connections=8),
+                )
+            return self._cliente
+
+    def _actualizar(self, **cambios) -> None:
+        with self._lock:
+            self._estado.update(cambios)
+
+    def _fallar(self, exc: Exception, modelo: Optional[str] = None) -> ModeloNoDisponible:
+        caido = httpx is not None and isinstance(exc, httpx.TransportError)
+        if caido:
+            self._fallo = time.monotonic()
+        # Un error con otro modelo (p. ej. no instalado) no cambia el estado del principal
+        if caido or modelo in (None, self.modelo):
+            self._actualizar(
+                estado="no_disponible" if caido else "error",
+                error=str(exc) or type(exc).__name__,
+            )
+        return ModeloNoDisponible(str(exc))
+
+    def estado(self) -> dict:
+        with self._lock:
+            datos = dict(self._estado)
+        datos.update(modelo=self.modelo, host=self.host, listo=datos["estado"] == "listo")
+        return datos
+
+    def disponible(self) -> bool:
+        """``False`` si el último intento falló hace menos de ``REINTENTO`` s."""
+        return httpx is not None and time.monotonic() - self._fallo >= self.REINTENTO
+
+    def _cuerpo(self, prompt: str, stream: bool, modelo: Optional[str] = None) -> dict:
+        return {
+            "model": modelo or self.modelo,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+
+    def listar_modelos(self) -> list[str]:
+        """Modelos instalados en el servidor (vacío si no responde)."""
+        try:
+            resp = self._http().get("/api/tags")
+            resp.raise_for_status()
+            self.instalados = [m["name"] for m in resp.json().get("models", [])]
+        except Exception as exc:
+            self._fallar(exc)
+            return []
+        return self.instalados
+
+    def precalentar(self) -> bool:
+        """Carga el modelo en el servidor con una petición vacía."""
+        if httpx is None:
+            self._actualizar(estado="no_disponible", error="httpx no está instalado")
+            return False
+        self._actualizar(estado="cargando", error=None)
+        inicio = time.perf_counter()
+        try:
+            resp = self._http().post("/api/generate", json=self._cuerpo("", False))
+            resp.raise_for_status()
+        except Exception as exc:
+            self._fallar(exc)
+            return False
+        self._actualizar(estado="listo", segundos_carga=round(time.perf_counter() - inicio, 3))
+        self.listar_modelos()
+        return True
+
+    def iniciar_precalentamiento(self) -> None:
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._hilo = Thread(target=self.precalentar, daemon=True, name="precalentar-modelo")
+        self._hilo.start()
+
+    def generar(self, prompt: str, modelo: Optional[str] = None) -> str:
+        """Genera la respuesta completa reutilizando la conexión HTTP."""
+        try:
+            resp = self._http().post("/api/generate", json=self._cuerpo(prompt, False, modelo))
+            resp.raise_for_status()
+            texto = resp.json().get("response", "")
+        except ModeloNoDisponible:
+            raise
+        except Exception as exc:
+            raise self._fallar(exc, modelo) from exc
+        if modelo in (None, self.modelo):
+            self._actualizar(estado="listo", error=None, ultimo_uso=time.time())
+        return texto
+
+    def generar_stream(self, prompt: str, modelo: Optional[str] = None) -> Iterator[str]:
+        """Produce los fragmentos de la respuesta según llegan del servidor."""
+        try:
+            with self._http().stream(
+                "POST", "/api/generate", json=self._cuerpo(prompt, True, modelo)
+            ) as resp:
+                resp.raise_for_status()
+                for linea in resp.iter_lines():
+                    if not linea:
+                        continue
+                    datos = json.loads(linea)
+                    if datos.get("response"):
+                        yield datos["response"]
+                    if datos.get("done"):
+                        break
+        except ModeloNoDisponible:
+            raise
+        except Exception as exc:
+            raise self._fallar(exc, modelo) from exc
+        if modelo in (None, self.modelo):
+            self._actualizar(estado="listo", error=None, ultimo_uso=time.time())
+
+    def cerrar(self) -> None:
+        with self._lock:
+            if self._cliente is not None:
+                self._cliente.close()
+                self._cliente = None
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from threading import Event, Lock
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+# Clases de prioridad: menor valor se atiende antes
+INTERACTIVA = 0
+NORMAL = 1
+MASIVA = 2
+NOMBRES = {INTERACTIVA: "interactiva", NORMAL: "normal", MASIVA: "masiva"}
+
+
+class ColaLLMLlena(RuntimeError):
+    """La cola del planificador ha alcanzado su capacidad."""
+
+
+class TurnoCancelado(RuntimeError):
+    """Se abandonó la espera de un turno con ``Cancelacion.cancelar``."""
+
+
+class Cancelacion:
+    """Permite abandonar desde otro hilo o corrutina la espera de un ``turno``.
+
+    Mientras espera, ``turno`` registra cómo despertarse; ``cancelar`` lo
+    despierta y la petición sale de la cola sin llegar a ocupar un hueco.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.cancelada = False
+        self._despertar: Optional[Callable[[], None]] = None
+
+    def cancelar(self) -> None:
+        with self._lock:
+            self.cancelada = True
+            despertar = self._despertar
+        if despertar is not None:
+            despertar()
+
+    def _vincular(self, despertar: Callable[[], None]) -> None:
+        with self._lock:
+            self._despertar = despertar
+            cancelada = self.cancelada
+        if cancelada:
+            despertar()
+
+
+class _Espera:
+    __slots__ = ("clave", "prioridad", "evento", "futuro", "bucle", "llegada", "cancelada")
+
+    def __init__(self, clave: tuple, prioridad: int) -> None:
+        self.clave = clave
+        self.prioridad = prioridad
+        self.evento: Optional[Event] = None
+        self.futuro: Optional[asyncio.Future] = None
+        self.bucle: Optional[asyncio.AbstractEventLoop] = None
+        self.llegada = time.perf_counter()
+        self.cancelada = False
+
+    def __lt__(self, otra: "_Espera") -> bool:
+        return self.clave < otra.clave
+
+
+class PlanificadorLLM:
+    """Reparte los huecos de inferencia por prioridad y de forma justa por sesión.
+
+    Como mucho ``capacidad`` llamadas se ejecutan a la vez; el resto espera en
+    una cola acotada a ``max_cola``. Se atiende primero la clase de prioridad
+    más urgente y, dentro de ella, las sesiones se turnan (cada petición nueva
+    de una sesión va detrás de las que esa sesión ya tiene en cola), de modo
+    que una sesión con muchas peticiones no acapara el modelo. Sirve tanto a
+    hilos (``turno``) como a corrutinas (``turno_async``).
+    """
+
+    def __init__(self, capacidad: int = 4, max_cola: int = 64) -> None:
+        self.capacidad = max(1, capacidad)
+        self.max_cola = max_cola
+        self._lock = Lock()
+        self._cola: list[_Espera] = []
+        self._en_curso = 0
+        self._secuencia = itertools.count()
+        self._vuelta = 0
+        self._ultima_vuelta: dict[str, int] = {}
+        self._metricas = {
+            nombre: {"atendidas": 0, "rechazadas": 0, "espera_total": 0.0, "espera_max": 0.0}
+            for nombre in NOMBRES.values()
+        }
+
+    # ----- Cola -----
+    def _encolar(
+        self, prioridad: int, sesion: str, bucle: Optional[asyncio.AbstractEventLoop] = None
+    ) -> Optional[_Espera]:
+        """Reserva un hueco o encola; devuelve ``None`` si había hueco libre.
+
+        La espera se crea con su evento (hilos) o su futuro (corrutinas) antes
+        de entrar en la cola para que ``_despachar`` siempre pueda avisarla.
+        """
+        with self._lock:
+            nombre = NOMBRES.get(prioridad, "normal")
+            if self._en_curso < self.capacidad and not self._cola:
+                self._en_curso += 1
+                self._metricas[nombre]["atendidas"] += 1
+                return None
+            if len(self._cola) >= self.max_cola:
+                self._metricas[nombre]["rechazadas"] += 1
+                raise ColaLLMLlena("Demasiadas peticiones al modelo en cola")
+            vuelta = max(self._vuelta, self._ultima_vuelta.get(sesion, -1) + 1)
+            self._ultima_vuelta[sesion] = vuelta
+            espera = _Espera((prioridad, vuelta, next(self._secuencia)), prioridad)
+            if bucle is None:
+                espera.evento = Event()
+            else:
+                espera.bucle = bucle
+                espera.futuro = bucle.create_future()
+            heapq.heappush(self._cola, espera)
+            return espera
+
+    def _despachar(self) -> None:
+        """Cede los huecos libres a las esperas más prioritarias (con el lock)."""
+        while self._cola and self._en_curso < self.capacidad:
+            espera = heapq.heappop(self._cola)
+            if espera.cancelada:
+                continue
+            self._en_curso += 1
+            self._vuelta = espera.clave[1]
+            metricas = self._metricas[NOMBRES.get(espera.prioridad, "normal")]
+            esperado = time.perf_counter() - espera.llegada
+            metricas["atendidas"] += 1
+            metricas["espera_total"] += esperado
+            metricas["espera_max"] = max(metricas["espera_max"], esperado)
+            if espera.evento is not None:
+                espera.evento.set()
+            elif espera.bucle is not None:
+                try:
+                    espera.bucle.call_soon_threadsafe(self._resolver, espera)
+                except RuntimeError:  # el bucle ya se cerró
+                    self._en_curso -= 1
+        if not self._cola:
+            self._ultima_vuelta.clear()
+
+    def _resolver(self, espera: _Espera) -> None:
+        if espera.futuro.done():
+            # La corrutina se canceló tras concederle el hueco: se devuelve
+            self._liberar()
+        else:
+            espera.futuro.set_result(None)
+
+    def _liberar(self) -> None:
+        with self._lock:
+            self._en_curso -= 1
+            self._despachar()
+
+    def _cancelar(self, espera: _Espera) -> bool:
+        """Retira ``espera`` de la cola; ``False`` si ya se le había dado hueco."""
+        with self._lock:
+            espera.cancelada = True
+            if espera in self._cola:
+                self._cola.remove(espera)
+                heapq.heapify(self._cola)
+                return True
+            return False
+
+    # ----- API -----
+    @contextmanager
+    def turno(
+        self,
+        prioridad: int = NORMAL,
+        sesion: str = "default",
+        cancelacion: Optional[Cancelacion] = None,
+    ) -> Iterator[None]:
+        """Bloquea el hilo hasta obtener un hueco y lo libera al salir.
+
+        Si ``cancelacion`` se activa antes de obtenerlo lanza ``TurnoCancelado``
+        y el hueco queda para la siguiente petición.
+        """
+        if cancelacion is not None and cancelacion.cancelada:
+            raise TurnoCancelado("Turno cancelado antes de encolarse")
+        espera = self._encolar(prioridad, sesion)
+        if espera is not None:
+            if cancelacion is not None:
+                cancelacion._vincular(espera.evento.set)
+            espera.evento.wait()
+            if cancelacion is not None and cancelacion.cancelada and self._cancelar(espera):
+                raise TurnoCancelado("Turno cancelado en la cola")
+        if cancelacion is not None and cancelacion.cancelada:
+            self._liberar()
+            raise TurnoCancelado("Turno cancelado al obtener hueco")
+        try:
+            yield
+        finally:
+            self._liberar()
+
+    @asynccontextmanager
+    async def turno_async(self, prioridad: int = NORMAL, sesion: str = "default") -> AsyncIterator[None]:
+        """Como ``turno`` pero esperando sin bloquear el bucle de eventos."""
+        espera = self._encolar(prioridad, sesion, asyncio.get_running_loop())
+        if espera is not None:
+            try:
+                await espera.futuro
+            except asyncio.CancelledError:
+                if espera.futuro.done() and not espera.futuro.cancelled():
+                    # El hueco ya se había concedido: se devuelve
+                    self._liberar()
+                else:
+                    self._cancelar(espera)
+                raise
+        try:
+            yield
+        finally:
+            self._liberar()
+
+    def metricas(self) -> dict:
+        with self._lock:
+            en_cola = {nombre: 0 for nombre in NOMBRES.values()}
+            for espera in self._cola:
+                en_cola[NOMBRES.get(espera.prioridad, "normal")] += 1
+            clases = {}
+            for nombre, m in self._metricas.items():
+                media = m["espera_total"] / m["atendidas"] if m["atendidas"] else 0.0
+                clases[nombre] = {
+                    "atendidas": m["atendidas"],
+                    "rechazadas": m["rechazadas"],
+                    "en_cola": en_cola[nombre],
+                    "espera_media": round(media, 4),
+                    "espera_max": round(m["espera_max"], 4),
+                }
+            return {
+                "capacidad": self.capacidad,
+                "max_cola": self.max_cola,
+                "en_curso": self._en_curso,
+                "en_cola": len(self._cola),
+                "clases": clases,
+            }
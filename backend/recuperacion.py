@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+
+
+@dataclass
+class PoliticaContexto:
+    """Reglas para decidir cuánto contexto recuperado se inyecta en un prompt."""
+
+    k: int = 4
+    # Fragmentos candidatos que se piden a Chroma antes de aplicar MMR
+    candidatos: int = 12
+    similitud_min: float = 0.3
+    max_tokens: int = 800
+    lambda_mmr: float = 0.7
+    min_palabras: int = 4
+
+    @classmethod
+    def desde_config(cls, config: dict) -> "PoliticaContexto":
+        base = cls()
+        return cls(
+            k=int(config.get("contexto_k", base.k)),
+            candidatos=int(config.get("contexto_candidatos", base.candidatos)),
+            similitud_min=float(config.get("contexto_similitud_min", base.similitud_min)),
+            max_tokens=int(config.get("contexto_max_tokens", base.max_tokens)),
+            lambda_mmr=float(config.get("contexto_lambda_mmr", base.lambda_mmr)),
+            min_palabras=int(config.get("contexto_min_palabras", base.min_palabras)),
+        )
+
+    def merece_recuperar(self, texto: str) -> bool:
+        """Las consultas muy cortas no aportan señal suficiente para buscar."""
+        return len((texto or "").split()) >= self.min_palabras
+
+
+def estimar_tokens(texto: str) -> int:
+    """Aproximación barata: unos cuatro caracteres por token."""
+    return max(1, len(texto) // 4)
+
+
+def similitud(distancia: float, espacio: str = "l2") -> float:
+    """Convierte una distancia de Chroma en similitud coseno.
+
+    Supone embeddings normalizados (MiniLM lo está), donde la L2 al cuadrado
+    equivale a ``2 - 2·cos``.
+    """
+    if espacio == "l2":
+        return 1.0 - distancia / 2.0
+    return 1.0 - distancia
+
+
+def _coseno(a: Sequence[float], b: Sequence[float]) -> float:
+    num = sum(x * y for x, y in zip(a, b))
+    den = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return num / den if den else 0.0
+
+
+def mmr(
+    relevancias: Sequence[float],
+    vectores: Sequence[Optional[Sequence[float]]],
+    k: int,
+    lambda_mmr: float = 0.7,
+) -> list[int]:
+    """Índices elegidos por Maximal Marginal Relevance.
+
+    Cada paso toma el candidato que maximiza ``λ·relevancia - (1-λ)·máxima
+    similitud con los ya elegidos``, lo que descarta fragmentos casi repetidos.
+    Sin vectores el orden es el de relevancia.
+    """
+    restantes = list(range(len(relevancias)))
+    elegidos: list[int] = []
+    while restantes and len(elegidos) < k:
+        previos = [vectores[j] for j in elegidos if vectores[j] is not None]
+
+        def puntuar(i: int) -> float:
+            redundancia = 0.0
+            if vectores[i] is not None and previos:
+                redundancia = max(_coseno(vectores[i], v) for v in previos)
+            return lambda_mmr * relevancias[i] - (1 - lambda_mmr) * redundancia
+
+        mejor = max(restantes, key=puntuar)
+        elegidos.append(mejor)
+        restantes.remove(mejor)
+    return elegidos
+
+
+def seleccionar_contexto(
+    resultado: dict, politica: PoliticaContexto, espacio: str = "l2"
+) -> list[tuple[str, dict]]:
+    """Filtra la respuesta de ``query`` de Chroma según ``politica``.
+
+    Descarta los fragmentos por debajo del umbral de similitud, aplica MMR y
+    corta al alcanzar el presupuesto de tokens. Devuelve ``(texto, metadatos)``.
+    """
+
+    def primera(clave: str) -> list:
+        valores = resultado.get(clave)
+        return list(valores[0]) if valores is not None and len(valores) else []
+
+    docs = primera("documents")
+    metas = primera("metadatas") or [{}] * len(docs)
+    distancias = primera("distances")
+    vectores: list[Any] = primera("embeddings") or [None] * len(docs)
+
+    indices = list(range(len(docs)))
+    relevancias = [1.0] * len(docs)
+    if distancias:
+        relevancias = [similitud(d, espacio) for d in distancias]
+        indices = [i for i in indices if relevancias[i] >= politica.similitud_min]
+    orden = mmr(
+        [relevancias[i] for i in indices],
+        [vectores[i] for i in indices],
+        politica.k,
+        politica.lambda_mmr,
+    )
+
+    elegidos: list[tuple[str, dict]] = []
+    gastado = 0
+    for pos in orden:
+        i = indices[pos]
+        coste = estimar_tokens(docs[i])
+        if elegidos and gastado + coste > politica.max_tokens:
+            break
+        elegidos.append((docs[i], metas[i] or {}))
+        gastado += coste
+    return elegidos
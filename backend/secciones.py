@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+# Secciones usadas cuando la estructura no se puede interpretar
+SECCIONES_POR_DEFECTO = ("Introducción", "Desarrollo", "Conclusiones")
+MAX_SECCIONES = 20
+PALABRAS_POR_PAGINA = 400
+
+_ENCABEZADO_MD = re.compile(r"^\s*#{1,6}\s+(.+)$")
+_NUMERADO = re.compile(r"^\s*(?:\d{1,2}|[IVXLC]{1,6})[.)]\s+(.+)$")
+_NEGRITA = re.compile(r"^\s*(?:[-*]\s+)?\*\*(.+?)\*\*\s*[:.\-]?\s*(.*)$")
+_SUBNUMERADO = re.compile(r"^\s*\d+\.\d+")
+
+
+@dataclass
+class Seccion:
+    """Apartado de la estructura aprobada."""
+
+    titulo: str
+    descripcion: str = ""
+
+
+def _separar_titulo(linea: str) -> tuple[str, str]:
+    partes = re.split(r":|\s[-–—]\s", linea, maxsplit=1)
+    titulo = partes[0].strip(" *#")
+    descripcion = partes[1].strip() if len(partes) > 1 else ""
+    return titulo, descripcion
+
+
+def parsear_estructura(texto: str | None) -> list[Seccion]:
+    """Convierte la estructura propuesta por el asistente en secciones.
+
+    Reconoce encabezados markdown, listas numeradas de primer nivel (``1.``,
+    ``II)``) y títulos en negrita; las líneas restantes se añaden a la
+    descripción de la sección en curso. Si no encuentra ninguno, cada línea no
+    vacía se interpreta como una sección.
+    """
+    secciones: list[Seccion] = []
+    lineas = [ln.rstrip() for ln in (texto or "").splitlines() if ln.strip()]
+    for linea in lineas:
+        m_neg = _NEGRITA.match(linea)
+        m = _ENCABEZADO_MD.match(linea) or (
+            None if _SUBNUMERADO.match(linea) else _NUMERADO.match(linea)
+        )
+        if m_neg:
+            secciones.append(Seccion(m_neg.group(1).strip(" :"), m_neg.group(2).strip()))
+        elif m:
+            titulo, desc = _separar_titulo(m.group(1))
+            secciones.append(Seccion(titulo, desc))
+        elif secciones:
+            extra = linea.strip().lstrip("-*• ").strip()
+            actual = secciones[-1]
+            actual.descripcion = f"{actual.descripcion} {extra}".strip()
+
+    if not secciones:
+        for linea in lineas:
+            titulo, desc = _separar_titulo(linea.strip().lstrip("-*• "))
+            if titulo:
+                secciones.append(Seccion(titulo, desc))
+    if not secciones:
+        secciones = [Seccion(t) for t in SECCIONES_POR_DEFECTO]
+    return secciones[:MAX_SECCIONES]
+
+
+def resumir(texto: str, max_chars: int = 300) -> str:
+    """Resumen extractivo: primeras frases del texto hasta ``max_chars``."""
+    limpio = re.sub(r"^\s*#+\s.*$", "", texto, flags=re.M)
+    limpio = " ".join(limpio.split())
+    frases = re.split(r"(?<=[.!?])\s+", limpio)
+    resumen = ""
+    for frase in frases:
+        if len(resumen) + len(frase) > max_chars:
+            break
+        resumen = f"{resumen} {frase}".strip()
+    return resumen or limpio[:max_chars]
+
+
+def resumen_acumulado(
+    secciones: list[Seccion], textos: dict[int, str], hasta: int, max_chars: int = 1500
+) -> str:
+    """Resumen de las secciones anteriores a ``hasta``, priorizando las últimas."""
+    partes: list[str] = []
+    total = 0
+    for i in range(hasta - 1, -1, -1):
+        if i not in textos:
+            continue
+        parte = f"{secciones[i].titulo}: {resumir(textos[i])}"
+        if total + len(parte) > max_chars:
+            break
+        partes.append(parte)
+        total += len(parte)
+    return "\n".join(reversed(partes))
+
+
+class AlmacenCheckpoints:
+    """Guarda en disco las secciones terminadas de cada generación."""
+
+    def __init__(self, directorio: Path) -> None:
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def clave(datos: dict) -> str:
+        crudo = json.dumps(datos, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / f"{clave}.json"
+
+    def cargar(self, clave: str) -> Optional[dict]:
+        ruta = self._ruta(clave)
+        if not ruta.exists():
+            return None
+        try:
+            with ruta.open("r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def guardar(self, clave: str, datos: dict) -> None:
+        ruta = self._ruta(clave)
+        tmp = ruta.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(datos, fh, ensure_ascii=False)
+        os.replace(tmp, ruta)
+
+    def eliminar(self, clave: str) -> None:
+        try:
+            self._ruta(clave).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def prompt_seccion(
+    secciones: list[Seccion],
+    indice: int,
+    resumen: str,
+    tema: str,
+    tipo: str,
+    proposito: str | None = None,
+    estilo: str | None = None,
+    paginas: int | None = None,
+    extras: str | None = None,
+) -> str:
+    """Prompt acotado para redactar únicamente la sección ``indice``."""
+    seccion = secciones[indice]
+    palabras = max(150, (paginas or 5) * PALABRAS_POR_PAGINA // len(secciones))
+    indice_txt = "\n".join(f"{i + 1}. {s.titulo}" for i, s in enumerate(secciones))
+    prompt = (
+        f"Estás redactando un informe profesional tipo \"{tipo}\" sobre \"{tema}\". "
+        f"Propósito: {proposito or 'N/A'}. Estilo: {estilo or 'estándar'}. "
+        f"Consideraciones: {extras or 'ninguna'}.\n"
+        f"Índice completo:\n{indice_txt}\n"
+    )
+    if resumen:
+        prompt += f"Resumen de las secciones ya redactadas:\n{resumen}\n"
+    prompt += (
+        f"Redacta solo la sección {indice + 1}, \"{seccion.titulo}\""
+        + (f" ({seccion.descripcion})" if seccion.descripcion else "")
+        + f", con unas {palabras} palabras. Comienza con el encabezado "
+        f"\"## {seccion.titulo}\" y no repitas lo ya tratado."
+    )
+    return prompt
+
+
+def generar_por_secciones(
+    secciones: list[Seccion],
+    construir_prompt: Callable[[int, str], str],
+    invocar: Callable[[str], str],
+    checkpoints: Optional[AlmacenCheckpoints] = None,
+    clave: Optional[str] = None,
+    extra_checkpoint: Optional[dict] = None,
+) -> Iterator[dict]:
+    """Genera cada sección con una llamada independiente al modelo.
+
+    Produce un evento por sección (``indice``, ``total``, ``titulo``,
+    ``contenido``, ``reanudada``). Tras cada sección se escribe un checkpoint
+    para que un fallo posterior reanude en lugar de empezar de cero.
+    """
+    textos: dict[int, str] = {}
+    if checkpoints and clave:
+        previo = checkpoints.cargar(clave) or {}
+        textos = {int(k): v for k, v in previo.get("secciones", {}).items()}
+
+    total = len(secciones)
+    for i, seccion in enumerate(secciones):
+        reanudada = i in textos
+        if not reanudada:
+            resumen = resumen_acumulado(secciones, textos, i)
+            textos[i] = invocar(construir_prompt(i, resumen))
+            if checkpoints and clave:
+                checkpoints.guardar(
+                    clave,
+                    {**(extra_checkpoint or {}), "secciones": {str(k): v for k, v in textos.items()}},
+                )
+        yield {
+            "indice": i,
+            "total": total,
+            "titulo": seccion.titulo,
+            "contenido": textos[i],
+            "reanudada": reanudada,
+        }
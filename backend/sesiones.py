@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from threading import Lock
+from typing import AsyncIterator, Optional
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS sesiones (
+    espacio TEXT NOT NULL,
+    id TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    acceso REAL NOT NULL,
+    PRIMARY KEY (espacio, id)
+);
+CREATE INDEX IF NOT EXISTS idx_sesiones_acceso ON sesiones (acceso);
+"""
+
+
+class _Entrada:
+    __slots__ = ("datos", "acceso", "escrito", "tamano")
+
+    def __init__(self, datos: dict, tamano: int, ahora: float) -> None:
+        self.datos = datos
+        self.tamano = tamano
+        self.acceso = ahora
+        self.escrito = ahora
+
+
+class AlmacenSesiones:
+    """Estado por sesión con caducidad, expulsión LRU y persistencia opcional.
+
+    Cada entrada se identifica por ``(espacio, id)`` (p. ej. ``conversacion``
+    o ``idioma``) y guarda un diccionario serializable en JSON. En memoria se
+    mantienen como mucho ``max_memoria`` sesiones; las que llevan ``ttl``
+    segundos sin usarse caducan. Con ``path`` las sesiones se escriben además
+    en SQLite, de modo que las expulsadas de memoria y las de antes de un
+    reinicio se recuperan al volver a pedirlas; las caducadas se borran del
+    disco con ``purgar``, no en cada escritura. ``bloquear`` da exclusión
+    mutua por sesión sin que conversaciones distintas se esperen entre sí.
+    """
+
+    def __init__(
+        self, path: Optional[Path] = None, ttl: float = 24 * 3600, max_memoria: int = 1000
+    ) -> None:
+        self.path = Path(path) if path is not None else None
+        self.ttl = ttl
+        self.max_memoria = max(1, max_memoria)
+        self._lock = Lock()
+        self._entradas: OrderedDict[tuple[str, str], _Entrada] = OrderedDict()
+        # Lock de cada sesión y cuántas peticiones lo tienen o esperan
+        self._bloqueos: dict[tuple[str, str], list] = {}
+        self._contadores = {"creadas": 0, "restauradas": 0, "expulsadas": 0, "caducadas": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            with self._lock, self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.executescript(_ESQUEMA)
+
+    # ----- Internos (con ``self._lock``) -----
+    def _escribir(self, clave: tuple[str, str], serializado: str, ahora: float) -> None:
+        if self._conn is None:
+            return
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sesiones (espacio, id, datos, acceso) VALUES (?, ?, ?, ?)",
+                (*clave, serializado, ahora),
+            )
+
+    def _borrar(self, clave: tuple[str, str]) -> None:
+        self._entradas.pop(clave, None)
+        if self._conn is not None:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM sesiones WHERE espacio = ? AND id = ?", clave
+                )
+
+    def _recortar(self) -> None:
+        """Saca de memoria las sesiones menos usadas por encima del límite."""
+        while len(self._entradas) > self.max_memoria:
+            self._entradas.popitem(last=False)
+            self._contadores["expulsadas"] += 1
+
+    # ----- API -----
+    @asynccontextmanager
+    async def bloquear(self, espacio: str, sesion_id: str) -> AsyncIterator[None]:
+        """Sección crítica de la sesión.
+
+        El lock vive mientras alguna petición lo tiene o lo espera, de modo
+        que expulsar o borrar la sesión no lo sustituye por otro. Debe
+        retenerse solo durante las transiciones de estado, nunca mientras se
+        espera al modelo.
+        """
+        clave = (espacio, sesion_id)
+        with self._lock:
+            registro = self._bloqueos.setdefault(clave, [asyncio.Lock(), 0])
+            registro[1] += 1
+        try:
+            async with registro[0]:
+                yield
+        finally:
+            with self._lock:
+                registro[1] -= 1
+                if registro[1] == 0:
+                    del self._bloqueos[clave]
+
+    def cargar(self, espacio: str, sesion_id: str) -> Optional[dict]:
+        """Copia del estado guardado, o ``None`` si no existe o ha caducado."""
+        clave = (espacio, sesion_id)
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if ahora - entrada.acceso > self.ttl:
+                    self._contadores["caducadas"] += 1
+                    self._borrar(clave)
+                    return None
+                entrada.acceso = ahora
+                self._entradas.move_to_end(clave)
+                if ahora - entrada.escrito > self.ttl / 2:
+                    # Renueva la caducidad en disco de las sesiones que solo se leen
+                    self._escribir(clave, json.dumps(entrada.datos, ensure_ascii=False), ahora)
+                    entrada.escrito = ahora
+                return dict(entrada.datos)
+            if self._conn is None:
+                return None
+            fila = self._conn.execute(
+                "SELECT datos, acceso FROM sesiones WHERE espacio = ? AND id = ?", clave
+            ).fetchone()
+            if fila is None:
+                return None
+            if ahora - fila[1] > self.ttl:
+                self._contadores["caducadas"] += 1
+                self._borrar(clave)
+                return None
+            datos = json.loads(fila[0])
+            entrada = _Entrada(datos, len(fila[0]), ahora)
+            entrada.escrito = fila[1]
+            self._entradas[clave] = entrada
+            self._contadores["restauradas"] += 1
+            self._recortar()
+            return dict(datos)
+
+    def guardar(self, espacio: str, sesion_id: str, datos: dict) -> None:
+        clave = (espacio, sesion_id)
+        serializado = json.dumps(datos, ensure_ascii=False)
+        ahora = time.time()
+        with self._lock:
+            if clave not in self._entradas:
+                self._contadores["creadas"] += 1
+            self._entradas[clave] = _Entrada(dict(datos), len(serializado), ahora)
+            self._entradas.move_to_end(clave)
+            self._escribir(clave, serializado, ahora)
+            self._recortar()
+
+    def eliminar(self, espacio: str, sesion_id: str) -> None:
+        with self._lock:
+            self._borrar((espacio, sesion_id))
+
+    def purgar(self) -> int:
+        """Elimina las sesiones caducadas; devuelve cuántas había en memoria."""
+        ahora = time.time()
+        with self._lock:
+            caducadas = [c for c, e in self._entradas.items() if ahora - e.acceso > self.ttl]
+            for clave in caducadas:
+                self._borrar(clave)
+            self._contadores["caducadas"] += len(caducadas)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "DELETE FROM sesiones WHERE acceso < ?", (ahora - self.ttl,)
+                    )
+        return len(caducadas)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM sesiones")
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            por_espacio: dict[str, int] = {}
+            for espacio, _ in self._entradas:
+                por_espacio[espacio] = por_espacio.get(espacio, 0) + 1
+            en_disco = None
+            if self._conn is not None:
+                en_disco = self._conn.execute("SELECT COUNT(*) FROM sesiones").fetchone()[0]
+            return {
+                "vivas": len(self._entradas),
+                "por_espacio": por_espacio,
+                "bytes_memoria": sum(e.tamano for e in self._entradas.values()),
+                "en_disco": en_disco,
+                "persistente": self._conn is not None,
+                "max_memoria": self.max_memoria,
+                "ttl": self.ttl,
+                **self._contadores,
+            }
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import time
+from threading import Lock, Thread
+from typing import Any, Callable, Optional
+
+
+class ReconciliadorChroma:
+    """Reconcilia la colección de informes de Chroma con el historial.
+
+    Obtiene todos los ids de Chroma en bloque, calcula la diferencia con el
+    historial, codifica por lotes solo los informes ausentes y los inserta por
+    tramos. Chroma se lista antes que el historial, y cada vector huérfano se
+    vuelve a comprobar justo antes de borrarlo, para no perder el de un informe
+    guardado mientras tanto. Los vectores cuyos metadatos carecen de algún
+    campo de ``campos`` (p. ej. los guardados antes de añadirlo) se completan
+    sin recalcular el embedding. Está pensado para ejecutarse en un hilo mientras el servidor ya
+    atiende peticiones; ``progreso`` expone el avance.
+    """
+
+    def __init__(
+        self, lote: int = 64, pagina_ids: int = 5000, campos: tuple[str, ...] = ()
+    ) -> None:
+        self.lote = lote
+        self.pagina_ids = pagina_ids
+        self.campos = campos
+        self._lock = Lock()
+        self._hilo: Optional[Thread] = None
+        self._estado: dict = {"estado": "pendiente"}
+
+    def _actualizar(self, **cambios: Any) -> None:
+        with self._lock:
+            self._estado.update(cambios)
+
+    def progreso(self) -> dict:
+        with self._lock:
+            return dict(self._estado)
+
+    def en_curso(self) -> bool:
+        with self._lock:
+            return self._hilo is not None and self._hilo.is_alive()
+
+    def _ids_chroma(self, coleccion: Any) -> tuple[set[str], set[str]]:
+        """Ids de Chroma y, de ellos, los que tienen metadatos incompletos."""
+        ids: set[str] = set()
+        incompletos: set[str] = set()
+        include = ["metadatas"] if self.campos else []
+        offset = 0
+        while True:
+            res = coleccion.get(include=include, limit=self.pagina_ids, offset=offset)
+            pagina = res.get("ids", []) if res else []
+            ids.update(pagina)
+            if self.campos:
+                for id_, meta in zip(pagina, res.get("metadatas") or []):
+                    if any(c not in (meta or {}) for c in self.campos):
+                        incompletos.add(id_)
+            if len(pagina) < self.pagina_ids:
+                return ids, incompletos
+            offset += len(pagina)
+
+    def ejecutar(
+        self,
+        coleccion: Any,
+        almacen: Any,
+        codificar_lote: Callable[[list[str]], list],
+        metadatos: Callable[[dict], dict],
+    ) -> dict:
+        """Ejecuta la reconciliación de forma síncrona y devuelve el progreso final."""
+        with self._lock:
+            self._estado = {
+                "estado": "en_curso",
+                "inicio": time.time(),
+                "fin": None,
+                "total": 0,
+                "faltantes": 0,
+                "procesados": 0,
+                "huerfanos": 0,
+                "actualizados": 0,
+                "error": None,
+            }
+        try:
+            # Un informe se guarda primero en el historial y después en Chroma
+            en_chroma, incompletos = self._ids_chroma(coleccion)
+            historial = set(almacen.ids())
+            faltantes = sorted(historial - en_chroma)
+            huerfanos = sorted(en_chroma - historial)
+            incompletos = sorted(incompletos & historial)
+            self._actualizar(
+                total=len(historial), faltantes=len(faltantes), huerfanos=len(huerfanos)
+            )
+            for i in range(0, len(huerfanos), self.lote):
+                tramo = huerfanos[i:i + self.lote]
+                vivos = almacen.obtener_varios(tramo)
+                tramo = [id_ for id_ in tramo if id_ not in vivos]
+                if tramo:
+                    coleccion.delete(ids=tramo)
+            for i in range(0, len(faltantes), self.lote):
+                items = list(almacen.obtener_varios(faltantes[i:i + self.lote]).values())
+                if items:
+                    embs = codificar_lote([it["contenido"] or "" for it in items])
+                    coleccion.upsert(
+                        ids=[it["id"] for it in items],
+                        embeddings=embs,
+                        metadatas=[metadatos(it) for it in items],
+                    )
+                self._actualizar(procesados=min(i + self.lote, len(faltantes)))
+            for i in range(0, len(incompletos), self.lote):
+                items = list(almacen.obtener_varios(incompletos[i:i + self.lote]).values())
+                if items:
+                    coleccion.update(
+                        ids=[it["id"] for it in items],
+                        metadatas=[metadatos(it) for it in items],
+                    )
+                self._actualizar(actualizados=min(i + self.lote, len(incompletos)))
+            self._actualizar(estado="completado", fin=time.time())
+        except Exception as exc:  # pragma: no cover - depende del backend vectorial
+            self._actualizar(estado="error", error=str(exc), fin=time.time())
+        return self.progreso()
+
+    def iniciar(self, *args: Any) -> bool:
+        """Lanza ``ejecutar`` en un hilo demonio si no hay otro en curso."""
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return False
+            self._estado.update(estado="en_curso")
+            self._hilo = Thread(
+                target=self.ejecutar, args=args, daemon=True, name="sync-chroma"
+            )
+            self._hilo.start()
+        return True
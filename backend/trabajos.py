@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Optional
+from uuid import uuid4
+
+
+class ColaLlena(RuntimeError):
+    """Hay demasiados trabajos pendientes para aceptar otro."""
+
+
+class ColaTrabajos:
+    """Cola de trabajos en segundo plano con un número acotado de hilos.
+
+    Cada trabajo recibe una función ``actualizar(**campos)`` con la que
+    publica su avance; ``estado`` devuelve una copia consultable desde otra
+    petición. Solo se conservan los ``max_historial`` trabajos más recientes.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_pendientes: int = 32,
+        max_historial: int = 200,
+        nombre: str = "trabajo",
+    ) -> None:
+        self.max_pendientes = max_pendientes
+        self.max_historial = max_historial
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=nombre)
+        self._lock = Lock()
+        self._trabajos: OrderedDict[str, dict] = OrderedDict()
+
+    def _pendientes(self) -> int:
+        return sum(1 for t in self._trabajos.values() if t["estado"] in ("pendiente", "en_curso"))
+
+    def _actualizar(self, trabajo_id: str, **campos: Any) -> None:
+        with self._lock:
+            if trabajo_id in self._trabajos:
+                self._trabajos[trabajo_id].update(campos)
+
+    def _ejecutar(self, trabajo_id: str, func: Callable[..., Any]) -> None:
+        self._actualizar(trabajo_id, estado="en_curso", inicio=time.time())
+        try:
+            resultado = func(lambda **campos: self._actualizar(trabajo_id, **campos))
+        except Exception as exc:
+            detalle = getattr(exc, "detail", None) or str(exc) or type(exc).__name__
+            self._actualizar(trabajo_id, estado="error", error=str(detalle), fin=time.time())
+        else:
+            self._actualizar(trabajo_id, estado="completado", resultado=resultado, fin=time.time())
+
+    def enviar(self, func: Callable[[Callable[..., None]], Any], **info: Any) -> str:
+        """Encola ``func`` y devuelve el id del trabajo.
+
+        Lanza ``ColaLlena`` si ya hay ``max_pendientes`` trabajos sin terminar.
+        """
+        trabajo_id = str(uuid4())
+        with self._lock:
+            if self._pendientes() >= self.max_pendientes:
+                raise ColaLlena("Demasiados trabajos pendientes")
+            self._trabajos[trabajo_id] = {
+                **info,
+                "id": trabajo_id,
+                "estado": "pendiente",
+                "creado": time.time(),
+                "inicio": None,
+                "fin": None,
+                "error": None,
+                "resultado": None,
+            }
+            # Descarta los trabajos terminados más antiguos por encima del límite
+            for antiguo in list(self._trabajos):
+                if len(self._trabajos) <= self.max_historial:
+                    break
+                if self._trabajos[antiguo]["estado"] in ("completado", "error"):
+                    del self._trabajos[antiguo]
+        self._executor.submit(self._ejecutar, trabajo_id, func)
+        return trabajo_id
+
+    def estado(self, trabajo_id: str) -> Optional[dict]:
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+            return dict(trabajo) if trabajo is not None else None
+
+    def cerrar(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,76 @@
+"""Mide el tiempo de importación y de disponibilidad del backend.
+
+Cada medición se hace en un proceso nuevo para capturar el arranque en frío:
+
+* ``import``: tiempo de ``import backend.main``.
+* ``listo``: importación más la primera respuesta de ``GET /historial``.
+
+Uso::
+
+    python benchmarks/bench_arranque.py --repeticiones 5 --max-import 2.0
+
+Con ``--max-import``/``--max-listo`` el script termina con código 1 si la
+mediana supera el umbral, de modo que puede usarse como control de regresión.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+_SONDA = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import backend.main as bm
+t_import = time.perf_counter() - t0
+pesados = [m for m in ("chromadb", "sentence_transformers", "torch", "pdfplumber", "fitz", "langdetect")
+           if m in sys.modules]
+from fastapi.testclient import TestClient
+with TestClient(bm.app) as client:
+    client.get("/historial", params={"limit": 1})
+    t_listo = time.perf_counter() - t0
+print(json.dumps({"import": t_import, "listo": t_listo, "pesados": pesados}))
+"""
+
+
+def medir() -> dict:
+    salida = subprocess.run(
+        [sys.executable, "-c", _SONDA],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--max-import", type=float, default=None)
+    parser.add_argument("--max-listo", type=float, default=None)
+    args = parser.parse_args()
+
+    muestras = [medir() for _ in range(args.repeticiones)]
+    resultado = {
+        "import_mediana": statistics.median(m["import"] for m in muestras),
+        "listo_mediana": statistics.median(m["listo"] for m in muestras),
+        "pesados_al_importar": muestras[-1]["pesados"],
+        "repeticiones": args.repeticiones,
+    }
+    print(json.dumps(resultado, indent=2))
+
+    if args.max_import is not None and resultado["import_mediana"] > args.max_import:
+        return 1
+    if args.max_listo is not None and resultado["listo_mediana"] > args.max_listo:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
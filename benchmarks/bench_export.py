@@ -0,0 +1,124 @@
+"""Compara la latencia de exportar a DOCX con python-docx y con pandoc.
+
+Cada repetición convierte el mismo informe de ejemplo sin pasar por la caché
+de exportaciones:
+
+* ``nativo``: ``markdown_a_docx`` dentro del proceso.
+* ``pandoc``: un proceso ``pandoc`` por exportación, como antes (se omite si
+  pandoc no está instalado).
+
+Uso::
+
+    python benchmarks/bench_export.py --repeticiones 20 --secciones 12
+
+Con ``--max-nativo`` el script termina con código 1 si la mediana del
+renderizador nativo supera el umbral (en segundos).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from backend.document_generator import markdown_a_docx  # noqa: E402
+
+
+def informe_ejemplo(secciones: int) -> str:
+    """Markdown parecido al que devuelve el modelo: títulos, listas y tablas."""
+    partes = ["# Informe de ejemplo", ""]
+    for i in range(1, secciones + 1):
+        partes += [
+            f"## Sección {i}",
+            "",
+            "Este párrafo tiene **negrita**, *cursiva* y `código` para ejercitar "
+            "el formato en línea. " * 4,
+            "",
+            "- Primer punto",
+            "- Segundo punto con **énfasis**",
+            "  - Detalle anidado",
+            "1. Paso uno",
+            "2. Paso dos",
+            "",
+            "| Métrica | Valor |",
+            "|---------|------:|",
+            f"| Filas | {i * 10} |",
+            f"| Columnas | {i} |",
+            "",
+        ]
+    return "\n".join(partes)
+
+
+def medir(funcion, repeticiones: int) -> list[float]:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def resumen(tiempos: list[float]) -> dict:
+    return {
+        "mediana": round(statistics.median(tiempos), 4),
+        "min": round(min(tiempos), 4),
+        "max": round(max(tiempos), 4),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--secciones", type=int, default=12)
+    parser.add_argument("--plantilla", default=str(REPO_ROOT / "resources" / "template.docx"))
+    parser.add_argument("--max-nativo", type=float, default=None)
+    args = parser.parse_args()
+
+    markdown = informe_ejemplo(args.secciones)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        fuente = tmp_dir / "informe.md"
+        fuente.write_text(markdown, encoding="utf-8")
+
+        resultado = {
+            "secciones": args.secciones,
+            "repeticiones": args.repeticiones,
+            "nativo": resumen(
+                medir(
+                    lambda: markdown_a_docx(markdown, tmp_dir / "nativo.docx", args.plantilla),
+                    args.repeticiones,
+                )
+            ),
+            "pandoc": None,
+        }
+        if shutil.which("pandoc"):
+            cmd = ["pandoc", str(fuente), "-o", str(tmp_dir / "pandoc.docx")]
+            if Path(args.plantilla).is_file():
+                cmd += ["--reference-doc", args.plantilla]
+
+            def con_pandoc() -> None:
+                # Como exportar_a_archivo antes: escribe el .md temporal y lanza pandoc
+                fuente.write_text(markdown, encoding="utf-8")
+                subprocess.run(cmd, check=True, capture_output=True)
+
+            resultado["pandoc"] = resumen(medir(con_pandoc, args.repeticiones))
+            resultado["aceleracion"] = round(
+                resultado["pandoc"]["mediana"] / resultado["nativo"]["mediana"], 1
+            )
+    print(json.dumps(resultado, indent=2))
+
+    if args.max_nativo is not None and resultado["nativo"]["mediana"] > args.max_nativo:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,42 +8,78 @@ interface Props {
 }
 
 export default function Generate({ ctx, onDone }: Props) {
-  const [text, setText] = useState("");
   const [display, setDisplay] = useState("");
   const [running, setRunning] = useState(true);
-  const timer = useRef<NodeJS.Timeout | null>(null);
+  const [modelo, setModelo] = useState<string | null>(null);
+  const abortRef = useRef<AbortController | null>(null);
 
   useEffect(() => {
+    const controller = new AbortController();
+    abortRef.current = controller;
+
     async function run() {
-      const resp = await fetch("http://127.0.0.1:8000/generar", {
+      const resp = await fetch("http://127.0.0.1:8000/generar/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(ctx),
+        signal: controller.signal,
       });
-      if (resp.ok) {
-        const data = await resp.json();
-        setText(data.contenido);
+      if (!resp.ok || !resp.body) {
+        setRunning(false);
+        return;
       }
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let all = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        // Los eventos SSE se separan por una línea en blanco
+        let sep = buffer.indexOf("\n\n");
+        while (sep !== -1) {
+          const raw = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          const event = /^event: (.*)$/m.exec(raw)?.[1];
+          const data = /^data: (.*)$/m.exec(raw)?.[1];
+          if (event === "token" && data) {
+            all += JSON.parse(data).texto;
+            setDisplay(all);
+          } else if (event === "fin") {
+            onDone(all);
+          }
+          sep = buffer.indexOf("\n\n");
+        }
+      }
+      setRunning(false);
     }
-    run();
-    return () => {
-      if (timer.current) clearInterval(timer.current);
-    };
-  }, [ctx]);
+    run().catch(() => setRunning(false));
+    return () => controller.abort();
+  }, [ctx, onDone]);
 
+  // Consulta el estado del modelo hasta que esté cargado en Ollama
   useEffect(() => {
-    if (!text) return;
-    let i = 0;
-    timer.current = setInterval(() => {
-      i += 1;
-      setDisplay(text.slice(0, i));
-      if (i >= text.length) {
-        if (timer.current) clearInterval(timer.current);
-        setRunning(false);
-        onDone(text);
+    let activo = true;
+    async function consultar() {
+      try {
+        const resp = await fetch("http://127.0.0.1:8000/modelo/estado");
+        if (!resp.ok) return;
+        const data = await resp.json();
+        if (!activo) return;
+        setModelo(data.estado);
+        if (data.estado === "cargando" || data.estado === "desconocido") {
+          setTimeout(consultar, 2000);
+        }
+      } catch {
+        /* el backend aún no responde */
       }
-    }, 30);
-  }, [text, onDone]);
+    }
+    consultar();
+    return () => {
+      activo = false;
+    };
+  }, []);
 
   return (
     <div className="w-full max-w-2xl">
@@ -52,6 +88,9 @@ export default function Generate({ ctx, onDone }: Props) {
         <div className="text-sm text-gray-600">Estilo: {ctx.estilo}</div>
         <div className="text-sm text-gray-600">Páginas: {ctx.paginas}</div>
       </div>
+      {running && !display && modelo === "cargando" && (
+        <div className="mb-2 text-sm text-gray-500">Cargando el modelo…</div>
+      )}
       <div className="prose max-h-96 overflow-y-auto border rounded p-2 bg-white">
         <ReactMarkdown>{display}</ReactMarkdown>
       </div>
@@ -59,7 +98,7 @@ export default function Generate({ ctx, onDone }: Props) {
         <button
           className="mt-2 bg-red-600 text-white px-4 py-1 rounded"
           onClick={() => {
-            if (timer.current) clearInterval(timer.current);
+            abortRef.current?.abort();
             setRunning(false);
           }}
         >
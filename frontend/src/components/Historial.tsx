@@ -11,22 +11,49 @@ interface Props {
   onSelect: (id: string) => void;
 }
 
+const PAGE_SIZE = 50;
+
 export default function Historial({ onSelect }: Props) {
   const [items, setItems] = useState<HistItem[]>([]);
   const [query, setQuery] = useState("");
+  // Cursores de las páginas visitadas; el último es el de la página actual
+  const [cursors, setCursors] = useState<(string | null)[]>([null]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
   useEffect(() => {
     cargar();
   }, []);
 
-  async function cargar() {
-    const resp = await fetch("http://127.0.0.1:8000/historial");
-    if (resp.ok) setItems(await resp.json());
+  async function cargar(cursor: string | null = null) {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE), orden: "desc" });
+    if (cursor) params.set("cursor", cursor);
+    const resp = await fetch(`http://127.0.0.1:8000/historial?${params}`);
+    if (resp.ok) {
+      setItems(await resp.json());
+      setNextCursor(resp.headers.get("X-Next-Cursor"));
+    }
+  }
+
+  function siguiente() {
+    if (!nextCursor) return;
+    setCursors((prev) => [...prev, nextCursor]);
+    cargar(nextCursor);
+  }
+
+  function anterior() {
+    if (cursors.length <= 1) return;
+    const prev = cursors.slice(0, -1);
+    setCursors(prev);
+    cargar(prev[prev.length - 1]);
   }
 
   async function buscar(e: React.FormEvent) {
     e.preventDefault();
-    if (!query) return cargar();
+    if (!query) {
+      setCursors([null]);
+      return cargar();
+    }
+    setNextCursor(null);
     const resp = await fetch("http://127.0.0.1:8000/buscar", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
@@ -68,6 +95,24 @@ export default function Historial({ onSelect }: Props) {
           </li>
         ))}
       </ul>
+      {(cursors.length > 1 || nextCursor) && (
+        <div className="flex justify-between mt-2">
+          <button
+            className="text-sm text-blue-600 disabled:text-gray-400"
+            onClick={anterior}
+            disabled={cursors.length <= 1}
+          >
+            Anterior
+          </button>
+          <button
+            className="text-sm text-blue-600 disabled:text-gray-400"
+            onClick={siguiente}
+            disabled={!nextCursor}
+          >
+            Siguiente
+          </button>
+        </div>
+      )}
     </div>
   );
 }
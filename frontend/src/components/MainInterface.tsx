@@ -11,6 +11,7 @@ interface GenContext {
   paginas?: number;
   idioma?: string;
   longitud?: string;
+  estructura?: string;
 }
 
 export default function MainInterface() {
@@ -21,6 +22,9 @@ export default function MainInterface() {
   const [escribiendo, setEscribiendo] = useState(false);
   const [display, setDisplay] = useState("");
   const [editable, setEditable] = useState("");
+  // Último índice aprobado en la conversación; con él /generar_informe
+  // redacta el informe sección a sección
+  const [estructura, setEstructura] = useState<string | null>(null);
   const timerRef = useRef<NodeJS.Timeout | null>(null);
   const endRef = useRef<HTMLDivElement>(null);
 
@@ -64,10 +68,13 @@ export default function MainInterface() {
         reply = "Sin respuesta generada.";
       }
       setMessages((p) => [...p, { role: "bot", text: reply }]);
-      if (data.iniciar_generacion) {
+      const aprobada = data?.contexto?.estructura || data?.estructura || estructura;
+      if (aprobada) setEstructura(aprobada);
+      if (data?.iniciar_generacion) {
         setShowGen(true);
         setGenerating(true);
-        iniciarGeneracion(data.contexto || { tema: text } as GenContext);
+        const ctx: GenContext = data.contexto || { tema: text };
+        iniciarGeneracion(aprobada ? { ...ctx, estructura: aprobada } : ctx);
       }
     } catch (err) {
       setMessages((p) => [
@@ -99,7 +106,7 @@ export default function MainInterface() {
     while (true) {
       const { value, done } = await reader.read();
       if (done) break;
-      const chunk = decoder.decode(value);
+      const chunk = decoder.decode(value, { stream: true });
       buffer += chunk;
       const idx = buffer.indexOf('{"finalizado": true}');
       if (idx !== -1) {
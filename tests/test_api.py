@@ -3,6 +3,7 @@ from pathlib import Path
 import os
 import sys
 sys.path.insert(0, os.path.abspath("."))
+import pytest
 from fastapi.testclient import TestClient
 import backend.main as bm
 from langchain_community.llms.ollama import OllamaEndpointNotFoundError
@@ -16,6 +17,9 @@ def setup_module(module):
     bm.EXPORT_DIR.mkdir(parents=True, exist_ok=True)
     bm.TMP_DIR = Path("tests/tmp")
     bm.TMP_DIR.mkdir(parents=True, exist_ok=True)
+    bm.CACHE_DIR = Path("tests/cache")
+    bm.cache_llm().limpiar()
+    bm.almacen_sesiones().limpiar()
 
 
 client = TestClient(bm.app)
@@ -26,7 +30,7 @@ def test_asistente_flujo(monkeypatch):
     monkeypatch.setattr(
         bm,
         "generar_pregunta",
-        lambda paso, est: bm._PREGUNTAS_PREDETERMINADAS.get(paso, ""),
+        lambda paso, est, session_id="default": bm._PREGUNTAS_PREDETERMINADAS.get(paso, ""),
     )
     cid = "test_conv"
     resp = client.post(f"/asistente/{cid}", json={"mensaje": "hola"})
@@ -52,6 +56,88 @@ def test_asistente_flujo(monkeypatch):
     data = resp.json()
     assert data["reply"] == "Contexto completado"
     assert data["contexto"]["paginas"] == 5
+    assert data["contexto"]["estructura"] == "estructura"
+
+
+def test_asistente_conversaciones_en_paralelo(monkeypatch):
+    import threading
+
+    # Ambas generaciones deben estar en curso a la vez para cruzar la barrera
+    barrera = threading.Barrier(2, timeout=5)
+
+    def estructura(tema, *a, **k):
+        barrera.wait()
+        return f"estructura {tema}"
+
+    monkeypatch.setattr(bm, "generar_estructura", estructura)
+    monkeypatch.setattr(bm, "generar_pregunta", lambda paso, est, session_id="default": "pregunta")
+    monkeypatch.setitem(bm.CONFIG, "asistente_prefetch", False)
+    for cid in ("par_a", "par_b"):
+        for mensaje in ("hola", "Trabajo", cid, "tecnico", "3"):
+            client.post(f"/asistente/{cid}", json={"mensaje": mensaje})
+
+    respuestas = {}
+
+    def enviar(cid):
+        respuestas[cid] = client.post(f"/asistente/{cid}", json={"mensaje": "ninguna"}).json()
+
+    hilos = [threading.Thread(target=enviar, args=(cid,)) for cid in ("par_a", "par_b")]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(10)
+    assert respuestas["par_a"]["estructura"] == "estructura par_a"
+    assert respuestas["par_b"]["estructura"] == "estructura par_b"
+
+
+def test_asistente_especula_siguiente_paso(monkeypatch):
+    import asyncio
+    import httpx
+
+    llamadas = []
+
+    def estructura(tema, *a, extras=None, **k):
+        llamadas.append(extras)
+        return f"estructura {extras or 'base'}"
+
+    monkeypatch.setattr(bm, "generar_estructura", estructura)
+    monkeypatch.setattr(bm, "generar_pregunta", lambda paso, est, session_id="default": f"pregunta {paso}")
+
+    async def conversar(cid, extras):
+        transporte = httpx.ASGITransport(app=bm.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://t") as cliente:
+            for mensaje in ("hola", "Trabajo", "IA", "tecnico", "3"):
+                resp = await cliente.post(f"/asistente/{cid}", json={"mensaje": mensaje})
+                # Deja terminar la especulación mientras el usuario "escribe"
+                await asyncio.sleep(0.05)
+            assert resp.json()["reply"] == "pregunta 4"
+            resp = await cliente.post(f"/asistente/{cid}", json={"mensaje": extras})
+            return resp.json()["estructura"]
+
+    antes = bm.especulador_asistente.estadisticas()
+    # Sin consideraciones extra se reutiliza la estructura especulada
+    assert asyncio.run(conversar("esp_a", "Ninguna")) == "estructura base"
+    assert llamadas == [None]
+    # Con consideraciones la especulación se descarta y se genera de nuevo
+    assert asyncio.run(conversar("esp_b", "citar APA")) == "estructura citar APA"
+    assert llamadas == [None, None, "citar APA"]
+    despues = bm.especulador_asistente.estadisticas()
+    assert despues["aciertos"] - antes["aciertos"] == 9
+    assert despues["descartes"] - antes["descartes"] == 1
+
+
+def test_pregunta_no_depende_de_la_respuesta_anterior(monkeypatch):
+    prompts = []
+    monkeypatch.setattr(bm, "llm", object())
+    monkeypatch.setattr(bm, "invoke_llm", lambda prompt, **k: prompts.append(prompt) or "p")
+    antes = bm.EstadoConversacion(paso=1, proposito="Trabajo")
+    despues = bm.EstadoConversacion(paso=2, proposito="Trabajo", tema="IA")
+    bm.generar_pregunta(2, antes)
+    bm.generar_pregunta(2, despues)
+    assert prompts[0] == prompts[1] and "Trabajo" in prompts[0]
+    assert bm._entradas_pregunta(2, antes) == bm._entradas_pregunta(2, despues)
+    bm.generar_pregunta(3, despues)
+    assert "Tema: IA" in prompts[2]
 
 
 def test_generar(monkeypatch):
@@ -87,6 +173,33 @@ def test_exportar(monkeypatch, tmp_path):
     assert resp.status_code == 200
 
 
+def test_exportar_reutiliza_cache(monkeypatch):
+    bm.cache_exportaciones().limpiar()
+    comandos = []
+
+    def convertir(cmd):
+        comandos.append(cmd)
+        Path(cmd[cmd.index("-o") + 1]).write_bytes(b"%PDF")
+
+    monkeypatch.setattr(bm.conversor_pandoc, "convertir", convertir)
+    for _ in range(2):
+        resp = client.post("/exportar", json={"contenido": "repetido", "formato": "pdf"})
+        assert resp.status_code == 200 and resp.content == b"%PDF"
+    assert len(comandos) == 1
+    # El archivo servido sigue en la caché para la siguiente descarga
+    assert bm.cache_exportaciones().estadisticas()["archivos"] == 1
+
+
+def test_exportar_docx_sin_pandoc(monkeypatch):
+    def convertir(cmd):
+        raise AssertionError("el DOCX no debería pasar por pandoc")
+
+    monkeypatch.setattr(bm.conversor_pandoc, "convertir", convertir)
+    resp = client.post("/exportar", json={"contenido": "# Título\n\n- a", "formato": "docx"})
+    assert resp.status_code == 200
+    assert resp.content[:2] == b"PK"
+
+
 def test_buscar(monkeypatch):
     item = {
         "id": "1",
@@ -106,6 +219,7 @@ def test_buscar(monkeypatch):
 
     monkeypatch.setattr(bm, "collection", DummyCol())
     monkeypatch.setattr(bm.embedder, "encode", lambda x: [0.0])
+    monkeypatch.setattr(bm.embedder, "es_real", lambda: True)
 
     resp = client.post("/buscar", json={"query": "algo"})
     assert resp.status_code == 200
@@ -113,6 +227,81 @@ def test_buscar(monkeypatch):
     assert data[0]["id"] == "1"
 
 
+def test_buscar_lote(monkeypatch):
+    llamadas = []
+
+    class DummyCol:
+        def query(self, query_embeddings, n_results, include, where=None):
+            llamadas.append({"n": len(query_embeddings), "where": where})
+            meta = {"tema": "t", "tipo": "r", "timestamp": "2024", "snippet": "extracto"}
+            return {
+                "ids": [["1"]] * len(query_embeddings),
+                "metadatas": [[meta]] * len(query_embeddings),
+                "distances": [[0.5]] * len(query_embeddings),
+            }
+
+    monkeypatch.setattr(bm, "collection", DummyCol())
+    monkeypatch.setattr(bm.embedder, "encode", lambda x: [0.0])
+    monkeypatch.setattr(bm.embedder, "es_real", lambda: True)
+    resp = client.post(
+        "/buscar/lote",
+        json={"consultas": ["a", "b"], "tipo": "r", "desde": "2024-01"},
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [d["consulta"] for d in data] == ["a", "b"]
+    assert data[1]["resultados"][0]["snippet"] == "extracto"
+    assert llamadas == [
+        {
+            "n": 2,
+            "where": {"$and": [{"tipo": "r"}, {"ts": {"$gte": bm._marca_tiempo("2024-01")}}]},
+        }
+    ]
+    assert client.post("/buscar/lote", json={"consultas": ["a"], "desde": "ayer"}).status_code == 400
+
+
+def test_buscar_con_embedder_de_reserva_usa_solo_bm25(monkeypatch):
+    bm.guardar_historial(
+        [
+            {"id": "a", "tema": "Plan PRJ-0042", "tipo": "r", "contenido": "x", "timestamp": "2024"},
+            {"id": "b", "tema": "otro", "tipo": "r", "contenido": "y", "timestamp": "2024"},
+        ]
+    )
+
+    class ColeccionViva:
+        añadidos = []
+
+        def query(self, **kwargs):
+            # Con vectores nulos cualquier informe está "igual de cerca"
+            return {"ids": [["b"]], "metadatas": [[{"tema": "otro"}]], "distances": [[0.0]]}
+
+        def get(self, ids):
+            return {"ids": []}
+
+        def add(self, ids, embeddings, metadatas):
+            self.añadidos.extend(ids)
+
+    monkeypatch.setattr(bm, "collection", ColeccionViva())
+    monkeypatch.setattr(bm.embedder, "_real", bm._DummyEmbedder())
+    resp = client.post("/buscar", json={"query": "prj-0042"})
+    assert [r["id"] for r in resp.json()] == ["a"]
+    bm.agregar_a_chroma({"id": "c", "tema": "t", "tipo": "r", "contenido": "z", "timestamp": "2024"})
+    assert ColeccionViva.añadidos == []
+
+
+def test_buscar_sin_base_vectorial(monkeypatch):
+    bm.guardar_historial(
+        [
+            {"id": "a", "tema": "Plan PRJ-0042", "tipo": "r", "contenido": "x", "timestamp": "2024"},
+            {"id": "b", "tema": "otro", "tipo": "r", "contenido": "y", "timestamp": "2024"},
+        ]
+    )
+    monkeypatch.setattr(bm, "collection", None)
+    resp = client.post("/buscar", json={"query": "prj-0042"})
+    assert resp.status_code == 200
+    assert [it["id"] for it in resp.json()] == ["a"]
+
+
 def test_conversar_iniciar():
     """Ensure conversar endpoint triggers generation flag."""
     resp = client.post(
@@ -152,7 +341,7 @@ def test_documento_invalido(tmp_path):
 
 
 def test_generar_docx(monkeypatch):
-    def fake_llm(prompt, session_id="default"):
+    def fake_llm(prompt, session_id="default", **kwargs):
         if "título" in prompt.lower():
             return "Titulo de prueba"
         if "introducción" in prompt.lower():
@@ -172,7 +361,7 @@ def test_generar_docx(monkeypatch):
 
 
 def test_conversar_generar_word(monkeypatch):
-    def fake_llm(prompt, session_id="default"):
+    def fake_llm(prompt, session_id="default", **kwargs):
         if "título" in prompt.lower():
             return "Titulo"
         if "introducción" in prompt.lower():
@@ -216,3 +405,352 @@ def test_rag_document(monkeypatch, tmp_path):
     resp = client.post("/conversar", json={"mensaje": "dato curioso"})
     assert resp.status_code == 200
     assert "dato curioso" in resp.json()["respuesta"]
+
+
+def test_historial_paginado():
+    bm.guardar_historial(
+        [
+            {"id": str(i), "tema": "t", "tipo": "r", "contenido": "c", "timestamp": f"2024-0{i + 1}"}
+            for i in range(3)
+        ]
+    )
+    resp = client.get("/historial", params={"limit": 2, "orden": "desc"})
+    assert resp.status_code == 200
+    assert [it["id"] for it in resp.json()] == ["2", "1"]
+    cursor = resp.headers["X-Next-Cursor"]
+    resp = client.get("/historial", params={"limit": 2, "orden": "desc", "cursor": cursor})
+    assert [it["id"] for it in resp.json()] == ["0"]
+    assert "X-Next-Cursor" not in resp.headers
+    assert client.get("/historial", params={"cursor": "x"}).status_code == 400
+
+
+def test_limpiador_incremental_equivale_a_clean():
+    texto = "  Hola (nota al margen) mundo – éxito (¿pregunta?) fin (abc)  \n"
+    esperado = bm.clean_llm_output(texto)
+    for tam in range(1, 8):
+        limpiador = bm.LimpiadorIncremental()
+        salida = "".join(limpiador.agregar(texto[i:i + tam]) for i in range(0, len(texto), tam))
+        salida += limpiador.finalizar()
+        assert salida == esperado
+
+
+def test_generar_stream(monkeypatch):
+    class StreamLLM:
+        def stream(self, prompt):
+            yield from ["Intro", "ducción ", "(draft) ", "final"]
+
+    monkeypatch.setattr(bm, "llm", StreamLLM())
+    monkeypatch.setattr(bm, "obtener_contexto_semantico", lambda *a, **k: "")
+    resp = client.post("/generar/stream", json={"tema": "x", "tipo": "y"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    eventos = [json.loads(l[len("data: "):]) for l in resp.text.splitlines() if l.startswith("data: ")]
+    texto = "".join(e.get("texto", "") for e in eventos)
+    assert texto == "Introducción  final"
+    informe = client.get(f"/historial/{eventos[-1]['id']}").json()
+    assert informe["contenido"] == texto
+
+
+def test_generar_stream_con_estructura_va_por_secciones(monkeypatch):
+    recibidas = {}
+
+    def por_secciones(tema, tipo, estructura=None, **k):
+        recibidas["estructura"] = estructura
+        yield {"evento": "inicio", "total": 2}
+        yield {"evento": "seccion", "contenido": "Uno"}
+        yield {"evento": "seccion", "contenido": "Dos"}
+
+    monkeypatch.setattr(bm, "generar_informe_por_secciones", por_secciones)
+    monkeypatch.setattr(bm, "stream_llm", lambda *a, **k: pytest.fail("sin secciones"))
+    resp = client.post(
+        "/generar/stream", json={"tema": "x", "tipo": "y", "estructura": "1. A\n2. B"}
+    )
+    eventos = [json.loads(l[len("data: "):]) for l in resp.text.splitlines() if l.startswith("data: ")]
+    assert recibidas["estructura"] == "1. A\n2. B"
+    assert [e.get("texto") for e in eventos[:-1]] == ["Uno", "\n\nDos"]
+    informe = client.get(f"/historial/{eventos[-1]['id']}").json()
+    assert informe["contenido"] == "Uno\n\nDos"
+
+
+def test_generar_informe_transmite_tokens_reales(monkeypatch):
+    class StreamLLM:
+        def stream(self, prompt):
+            assert "Longitud: corta" in prompt
+            yield from ["Intro", "ducción ", "final"]
+
+    monkeypatch.setattr(bm, "llm", StreamLLM())
+    monkeypatch.setattr(bm, "obtener_contexto_semantico", lambda *a, **k: "")
+    resp = client.post("/generar_informe", json={"tema": "x", "longitud": "corta"})
+    assert resp.status_code == 200
+    cuerpo, fin = resp.text.rsplit("\n", 1)
+    assert cuerpo == "Introducción final"
+    assert json.loads(fin) == {"finalizado": True}
+
+
+@pytest.mark.parametrize(
+    "cuerpo, estructura",
+    [
+        ({"estructura": "1. A\n2. B"}, "1. A\n2. B"),
+        ({"longitud": "largo"}, None),
+        ({"paginas": 12}, None),
+    ],
+)
+def test_generar_informe_largo_va_por_secciones(monkeypatch, cuerpo, estructura):
+    recibidas = {}
+
+    def por_secciones(tema, tipo, estructura=None, **k):
+        recibidas["estructura"] = estructura
+        yield {"evento": "inicio", "total": 2}
+        yield {"evento": "seccion", "contenido": "Uno"}
+        yield {"evento": "seccion", "contenido": "Dos"}
+
+    monkeypatch.setattr(bm, "generar_informe_por_secciones", por_secciones)
+    monkeypatch.setattr(bm, "stream_llm", lambda *a, **k: pytest.fail("sin secciones"))
+    resp = client.post("/generar_informe", json={"tema": "x", **cuerpo})
+    cuerpo_resp, fin = resp.text.rsplit("\n", 1)
+    assert recibidas["estructura"] == estructura
+    assert cuerpo_resp == "Uno\n\nDos"
+    assert json.loads(fin) == {"finalizado": True}
+
+
+def test_generar_stream_sin_llm(monkeypatch):
+    monkeypatch.setattr(bm, "llm", None)
+    monkeypatch.setattr(bm.shutil, "which", lambda x: None)
+    resp = client.post(
+        "/generar/stream", json={"tema": "x", "tipo": "y", "usar_cache": False}
+    )
+    assert resp.status_code == 503
+
+
+def test_llm_lento_no_bloquea_servidor(monkeypatch):
+    import asyncio
+    import time
+
+    import httpx
+
+    class SlowLLM:
+        def invoke(self, prompt):
+            time.sleep(0.5)
+            return "lento"
+
+    monkeypatch.setattr(bm, "llm", SlowLLM())
+
+    async def escenario():
+        transport = httpx.ASGITransport(app=bm.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            inicio = time.perf_counter()
+            generaciones = [
+                asyncio.create_task(
+                    ac.post("/generar", json={"tema": "x", "tipo": "y", "usar_cache": False})
+                )
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0.05)
+            rapida = await ac.post("/config/idioma", json={"idioma": "es"})
+            latencia_rapida = time.perf_counter() - inicio
+            respuestas = await asyncio.gather(*generaciones)
+            return rapida, latencia_rapida, respuestas, time.perf_counter() - inicio
+
+    rapida, latencia_rapida, respuestas, total = asyncio.run(escenario())
+    assert rapida.status_code == 200
+    assert latencia_rapida < 0.4
+    assert all(r.status_code == 200 for r in respuestas)
+    # Las dos generaciones se solapan en lugar de sumarse
+    assert total < 0.9
+
+
+def test_generar_docx_secciones_en_paralelo(monkeypatch):
+    import asyncio
+    import threading
+    import time
+
+    hilos = set()
+
+    def slow_llm(prompt, session_id="default", **kwargs):
+        hilos.add(threading.current_thread().name)
+        time.sleep(0.2)
+        return "texto"
+
+    monkeypatch.setattr(bm, "invoke_llm", slow_llm)
+    inicio = time.perf_counter()
+    path = asyncio.run(bm.generar_docx_tema("IA"))
+    assert time.perf_counter() - inicio < 0.6
+    # Las secciones van al ejecutor compartido, no a un pool propio
+    assert all(nombre.startswith("llm") for nombre in hilos)
+    os.remove(path)
+
+
+def test_generar_por_secciones(monkeypatch):
+    llamadas = []
+
+    def fake_llm(prompt, session_id="default", usar_cache=True, **kwargs):
+        llamadas.append(prompt)
+        return f"## Sección {len(llamadas)}"
+
+    monkeypatch.setattr(bm, "invoke_llm", fake_llm)
+    resp = client.post(
+        "/generar/secciones",
+        json={"tema": "x", "tipo": "y", "estructura": "1. Intro\n2. Cierre"},
+    )
+    assert resp.status_code == 200
+    eventos = [l[len("event: "):] for l in resp.text.splitlines() if l.startswith("event: ")]
+    assert eventos == ["inicio", "seccion", "seccion", "fin"]
+    assert len(llamadas) == 2
+    assert "Intro" in llamadas[1]
+
+
+def test_cache_llm(monkeypatch):
+    llamadas = []
+
+    def contar(prompt):
+        llamadas.append(prompt)
+        return "respuesta"
+
+    monkeypatch.setattr(bm, "_invoke_llm", contar)
+    antes = bm.cache_llm().estadisticas()
+    assert bm.invoke_llm("pregunta repetida") == "respuesta"
+    assert bm.invoke_llm("pregunta repetida") == "respuesta"
+    assert len(llamadas) == 1
+    bm.invoke_llm("pregunta repetida", usar_cache=False)
+    assert len(llamadas) == 2
+    stats = client.get("/cache/llm").json()
+    assert stats["aciertos"] == antes["aciertos"] + 1
+    assert stats["fallos"] == antes["fallos"] + 1
+
+
+def test_estado_modelo():
+    resp = client.get("/modelo/estado")
+    assert resp.status_code == 200
+    assert resp.json()["modelo"] == bm.MODEL_NAME
+    assert "listo" in resp.json()
+
+
+def test_tiempo_de_inferencia_excluye_cola_y_consumidor(monkeypatch):
+    import threading
+    import time
+
+    from backend.planificador import PlanificadorLLM
+
+    registros = []
+    monkeypatch.setattr(bm, "planificador_llm", PlanificadorLLM(capacidad=1))
+    monkeypatch.setattr(bm.enrutador_modelos, "registrar", lambda m, t, s: registros.append(s))
+    monkeypatch.setattr(bm, "_invoke_llm", lambda prompt: "respuesta")
+    monkeypatch.setattr(bm, "_stream_llm_en", lambda prompt, modelo, usado=None: iter(["a", "b"]))
+
+    # Otra llamada ocupa el único hueco durante 0.3 s
+    ocupado = threading.Event()
+
+    def ocupar():
+        with bm.planificador_llm.turno():
+            ocupado.set()
+            time.sleep(0.3)
+
+    hilo = threading.Thread(target=ocupar)
+    hilo.start()
+    ocupado.wait()
+    assert bm.invoke_llm("p", usar_cache=False, recuperar=False) == "respuesta"
+    hilo.join()
+
+    for _ in bm.stream_llm("p", usar_cache=False, recuperar=False):
+        time.sleep(0.2)  # cliente lento
+    assert all(s < 0.1 for s in registros) and len(registros) == 2
+
+
+def test_modelo_enrutado_que_falla_registra_el_que_responde(monkeypatch):
+    registros = []
+    monkeypatch.setattr(bm, "modelo_para", lambda tarea: "mixtral")
+    monkeypatch.setattr(bm, "OllamaLLM", None)
+    monkeypatch.setattr(bm.gestor_modelo, "disponible", lambda: True)
+
+    def fallar(prompt, modelo):
+        raise bm.ModeloNoDisponible("no instalado")
+
+    monkeypatch.setattr(bm.gestor_modelo, "generar", fallar)
+    monkeypatch.setattr(bm.enrutador_modelos, "registrar", lambda m, t, s: registros.append(m))
+    monkeypatch.setattr(bm.enrutador_modelos, "marcar_fallo", lambda m: registros.append("fallo:" + m))
+    monkeypatch.setattr(bm, "_invoke_llm", lambda prompt: "respuesta")
+    assert bm.invoke_llm("hola", usar_cache=False, recuperar=False) == "respuesta"
+    assert registros == ["fallo:mixtral", bm.MODEL_NAME]
+
+
+def test_filtro_busqueda_hasta_incluye_el_dia():
+    from datetime import datetime
+
+    where = bm._filtro_busqueda(None, None, "2024-01-03")
+    assert where == {"ts": {"$lt": datetime(2024, 1, 4).timestamp()}}
+
+
+def test_recuperacion_solo_donde_se_pide(monkeypatch):
+    consultas = []
+    monkeypatch.setattr(bm, "obtener_contexto_semantico", lambda p, *a, **k: consultas.append(p) or "")
+    monkeypatch.setattr(bm, "_invoke_llm", lambda prompt: "respuesta")
+    bm.invoke_llm("sin contexto", usar_cache=False)
+    assert consultas == []
+    bm.generar_contenido("tema", "Informe", usar_cache=False)
+    assert len(consultas) == 1
+
+
+def test_pregunta_usa_la_sesion_de_la_conversacion(monkeypatch):
+    sesiones = []
+    monkeypatch.setattr(bm, "llm", object())
+    monkeypatch.setattr(
+        bm, "invoke_llm", lambda prompt, session_id="default", **k: sesiones.append(session_id) or "p"
+    )
+    cid = "conv_sesion"
+    cabeceras = {"X-Session-Id": "usuario-7"}
+    client.post(f"/asistente/{cid}", json={"mensaje": "hola"}, headers=cabeceras)
+    client.post(f"/asistente/{cid}", json={"mensaje": "Trabajo"}, headers=cabeceras)
+    assert sesiones and set(sesiones) == {"usuario-7"}
+
+
+def test_especulacion_va_en_masiva_y_se_puede_cancelar(monkeypatch):
+    from contextlib import contextmanager
+
+    from backend.planificador import MASIVA, Cancelacion, TurnoCancelado
+
+    prioridades = []
+
+    @contextmanager
+    def turno(prioridad, sesion="default", cancelacion=None):
+        prioridades.append((prioridad, cancelacion))
+        yield
+
+    monkeypatch.setattr(bm.planificador_llm, "turno", turno)
+    monkeypatch.setattr(bm, "_invoke_llm", lambda prompt: "respuesta")
+    cancelacion = Cancelacion()
+    trabajo = lambda: bm.invoke_llm("p", usar_cache=False, tarea="pregunta")
+    assert bm._especulativo(cancelacion, trabajo) == "respuesta"
+    assert prioridades == [(MASIVA, cancelacion)]
+    cancelacion.cancelar()
+    with pytest.raises(TurnoCancelado):
+        bm._especulativo(cancelacion, trabajo)
+    assert len(prioridades) == 1
+    # Fuera de una especulación se mantiene la prioridad de la tarea
+    bm.invoke_llm("p", usar_cache=False, tarea="pregunta")
+    assert prioridades[-1] == (bm.INTERACTIVA, None)
+
+
+def test_registrar_informe_fuera_del_bucle_de_eventos(monkeypatch):
+    import asyncio
+
+    en_bucle = []
+
+    def agregar(item):
+        try:
+            asyncio.get_running_loop()
+            en_bucle.append(True)
+        except RuntimeError:
+            en_bucle.append(False)
+
+    class StreamLLM:
+        def stream(self, prompt):
+            yield "texto"
+
+    monkeypatch.setattr(bm, "agregar_a_chroma", agregar)
+    monkeypatch.setattr(bm, "generar_contenido", lambda *a, **k: "contenido")
+    monkeypatch.setattr(bm, "llm", StreamLLM())
+    monkeypatch.setattr(bm, "obtener_contexto_semantico", lambda *a, **k: "")
+    client.post("/generar", json={"tema": "x", "tipo": "y"})
+    client.post("/generar/stream", json={"tema": "x", "tipo": "y", "usar_cache": False})
+    client.post("/generar_informe", json={"tema": "x"})
+    assert en_bucle == [False, False, False]
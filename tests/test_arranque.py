@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+PESADOS = ("chromadb", "sentence_transformers", "pdfplumber", "fitz", "langdetect")
+
+
+def test_importar_backend_no_carga_dependencias_pesadas(tmp_path):
+    # Módulos ficticios: si el backend los importase al arrancar, aparecerían
+    # en sys.modules aunque las librerías reales no estén instaladas.
+    for nombre in PESADOS:
+        (tmp_path / f"{nombre}.py").write_text("", encoding="utf-8")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), str(REPO_ROOT)]))
+    codigo = (
+        "import json, sys\n"
+        "import backend.main\n"
+        f"print(json.dumps([m for m in {PESADOS!r} if m in sys.modules]))\n"
+    )
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert json.loads(salida.stdout.strip().splitlines()[-1]) == []
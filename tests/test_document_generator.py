@@ -0,0 +1,52 @@
+import docx
+
+from backend.document_generator import markdown_a_docx
+
+_MARKDOWN = """# Informe *final*
+
+Texto con **negrita** y _cursiva_
+en dos líneas.
+
+- punto
+  - subpunto
+1. paso
+
+| Col | Valor |
+|-----|:-----:|
+| a   | **1** |
+"""
+
+
+def test_markdown_a_docx_estructura(tmp_path):
+    destino = tmp_path / "informe.docx"
+    markdown_a_docx(_MARKDOWN, destino, plantilla=tmp_path / "no_existe.docx")
+    doc = docx.Document(str(destino))
+
+    estilos = [(p.style.name, p.text) for p in doc.paragraphs]
+    assert estilos == [
+        ("Heading 1", "Informe final"),
+        ("Normal", "Texto con negrita y cursiva en dos líneas."),
+        ("List Bullet", "punto"),
+        ("List Bullet 2", "subpunto"),
+        ("List Number", "paso"),
+    ]
+    runs = {r.text: r for r in doc.paragraphs[1].runs}
+    assert runs["negrita"].bold and runs["cursiva"].italic
+
+    tabla = doc.tables[0]
+    assert [[c.text for c in fila.cells] for fila in tabla.rows] == [["Col", "Valor"], ["a", "1"]]
+    assert tabla.rows[1].cells[1].paragraphs[0].runs[0].bold
+
+
+def test_markdown_a_docx_usa_estilos_de_plantilla(tmp_path):
+    plantilla = docx.Document()
+    plantilla.styles["Normal"].font.name = "Garamond"
+    plantilla.add_paragraph("contenido de la plantilla")
+    plantilla.save(str(tmp_path / "plantilla.docx"))
+
+    destino = tmp_path / "informe.docx"
+    markdown_a_docx("Hola", destino, plantilla=tmp_path / "plantilla.docx")
+    doc = docx.Document(str(destino))
+    # Solo se heredan los estilos, no el cuerpo de la plantilla
+    assert [p.text for p in doc.paragraphs] == ["Hola"]
+    assert doc.styles["Normal"].font.name == "Garamond"
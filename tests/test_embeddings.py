@@ -0,0 +1,33 @@
+from backend.embeddings import ServicioEmbeddings
+
+
+class ContadorEmbedder:
+    def __init__(self):
+        self.llamadas = []
+
+    def encode(self, texto, batch_size=None):
+        self.llamadas.append(texto)
+        if isinstance(texto, list):
+            return [[float(len(t)), 1.0] for t in texto]
+        return [float(len(texto)), 1.0]
+
+
+def test_cache_en_memoria_y_disco(tmp_path):
+    emb = ContadorEmbedder()
+    servicio = ServicioEmbeddings(emb, tmp_path / "emb.db")
+    assert list(servicio.codificar("hola")) == [4.0, 1.0]
+    servicio.codificar("hola")
+    assert len(emb.llamadas) == 1
+
+    otro = ServicioEmbeddings(emb, tmp_path / "emb.db")
+    assert list(otro.codificar("hola")) == [4.0, 1.0]
+    assert len(emb.llamadas) == 1
+
+
+def test_lote_codifica_solo_ausentes(tmp_path):
+    emb = ContadorEmbedder()
+    servicio = ServicioEmbeddings(emb, tmp_path / "emb.db", batch_size=8)
+    servicio.codificar("a")
+    vectores = servicio.codificar_lote(["a", "bb", "ccc", "bb"])
+    assert [list(v)[0] for v in vectores] == [1.0, 2.0, 3.0, 2.0]
+    assert emb.llamadas[-1] == ["bb", "ccc"]
@@ -0,0 +1,48 @@
+from backend.enrutador import EnrutadorModelos, Hardware
+
+INSTALADOS = ["mistral:latest", "mixtral:latest"]
+
+
+def _enrutador(ram_gb: float = 64.0) -> EnrutadorModelos:
+    return EnrutadorModelos(
+        "mistral",
+        ligero="mistral",
+        pesado="mixtral",
+        hardware=Hardware(ram_gb=ram_gb, vram_gb=0.0, nucleos=8),
+        min_tps=5.0,
+        reintento=0.0,
+    )
+
+
+def test_tareas_ligeras_y_pesadas():
+    enrutador = _enrutador()
+    assert enrutador.elegir("pregunta", INSTALADOS) == "mistral"
+    assert enrutador.elegir("contenido", INSTALADOS) == "mixtral"
+    assert enrutador.elegir("contenido", ["mistral"]) == "mistral"
+    assert _enrutador(ram_gb=8).elegir("contenido", INSTALADOS) == "mistral"
+    pocos_nucleos = _enrutador()
+    pocos_nucleos.hardware = Hardware(ram_gb=64.0, vram_gb=0.0, nucleos=4)
+    assert pocos_nucleos.elegir("contenido", INSTALADOS) == "mistral"
+    pocos_nucleos.hardware = Hardware(ram_gb=8.0, vram_gb=24.0, nucleos=4)
+    assert pocos_nucleos.elegir("contenido", INSTALADOS) == "mixtral"
+
+
+def test_degrada_el_pesado_si_va_lento():
+    enrutador = _enrutador()
+    enrutador.reintento = 3600
+    # La primera medida incluye la carga del modelo y se descarta
+    enrutador.registrar("mixtral", tokens=10, segundos=60)
+    assert enrutador.elegir("contenido", INSTALADOS) == "mixtral"
+    enrutador.registrar("mixtral", tokens=10, segundos=10)
+    assert enrutador.elegir("contenido", INSTALADOS) == "mistral"
+    assert enrutador.estadisticas()["degradados"] == ["mixtral"]
+    enrutador.reintento = 0
+    assert enrutador.elegir("contenido", INSTALADOS) == "mixtral"
+
+
+def test_fallo_del_modelo_usa_el_de_por_defecto():
+    enrutador = _enrutador()
+    enrutador.reintento = 3600
+    enrutador.marcar_fallo("mixtral")
+    assert enrutador.elegir("contenido", INSTALADOS) == "mistral"
+    assert enrutador.estadisticas()["fallos"] == {"mixtral": 1}
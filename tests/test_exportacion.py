@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from backend.exportacion import CacheExportaciones, ColaConversionLlena, ConversorPandoc
+
+
+def test_cache_clave_depende_de_plantilla(tmp_path):
+    plantilla = tmp_path / "plantilla.css"
+    plantilla.write_text("a")
+    clave = CacheExportaciones.clave("texto", "pdf", [str(plantilla)])
+    assert clave == CacheExportaciones.clave("texto", "pdf", [str(plantilla)])
+    assert clave != CacheExportaciones.clave("texto", "docx", [str(plantilla)])
+    os.utime(plantilla, (time.time() + 10, time.time() + 10))
+    assert clave != CacheExportaciones.clave("texto", "pdf", [str(plantilla)])
+
+
+def test_cache_expulsa_por_tamano(tmp_path):
+    cache = CacheExportaciones(tmp_path / "cache", max_bytes=10)
+    cache.GRACIA = 0
+    assert cache.obtener("a", ".pdf") is None
+    for clave in ("a", "b"):
+        origen = tmp_path / f"{clave}.tmp"
+        origen.write_bytes(b"x" * 8)
+        cache.guardar(origen, clave, ".pdf")
+    # "a" es el más antiguo y se expulsa para dejar sitio a "b"
+    assert cache.obtener("a", ".pdf") is None
+    assert cache.obtener("b", ".pdf").read_bytes() == b"x" * 8
+    assert cache.contiene(cache.ruta("b", ".pdf"))
+    stats = cache.estadisticas()
+    assert stats["archivos"] == 1 and stats["expulsados"] == 1 and stats["aciertos"] == 1
+
+
+def test_conversor_limita_cola_y_tiempo():
+    conversor = ConversorPandoc(workers=1, max_cola=0, timeout=0.5)
+    lento = [sys.executable, "-c", "import time; time.sleep(5)"]
+    with pytest.raises(subprocess.TimeoutExpired):
+        conversor.convertir(lento)
+
+    conversor.timeout = 5
+    hilo = threading.Thread(
+        target=conversor.convertir, args=([sys.executable, "-c", "import time; time.sleep(0.5)"],)
+    )
+    hilo.start()
+    time.sleep(0.2)
+    with pytest.raises(ColaConversionLlena):
+        conversor.convertir([sys.executable, "-c", "pass"])
+    hilo.join()
+    stats = conversor.estadisticas()
+    assert stats["agotadas"] == 1 and stats["rechazadas"] == 1 and stats["completadas"] == 1
+
+
+def test_bloqueo_compartido_aunque_haya_muchas_claves(tmp_path):
+    cache = CacheExportaciones(tmp_path)
+    dentro = []
+    solapes = []
+
+    def convertir():
+        with cache.bloquear("misma"):
+            dentro.append(1)
+            solapes.append(len(dentro))
+            time.sleep(0.02)
+            dentro.pop()
+
+    hilos = [threading.Thread(target=convertir) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+        # Otras claves no deben sustituir el lock que aún esperan los hilos
+        for i in range(100):
+            with cache.bloquear(f"otra{i}"):
+                pass
+    for hilo in hilos:
+        hilo.join(2)
+    assert solapes == [1, 1, 1]
+    assert cache._bloqueos == {}
@@ -0,0 +1,85 @@
+import json
+
+from backend.historial_store import AlmacenHistorial
+
+
+def _item(i: int) -> dict:
+    return {
+        "id": str(i),
+        "tema": f"tema {i}",
+        "tipo": "Informe",
+        "contenido": "texto " * 10,
+        "estilo": "técnico",
+        "timestamp": f"2024-01-{i + 1:02d}T00:00:00",
+    }
+
+
+def test_importa_json_una_vez(tmp_path):
+    legado = tmp_path / "historial.json"
+    legado.write_text(json.dumps([_item(0), _item(1)]), encoding="utf-8")
+    almacen = AlmacenHistorial(tmp_path / "historial.db", legado=legado)
+    assert almacen.contar() == 2
+    assert almacen.obtener("1")["estilo"] == "técnico"
+    almacen.eliminar("0")
+    almacen.cerrar()
+
+    reabierto = AlmacenHistorial(tmp_path / "historial.db", legado=legado)
+    assert reabierto.contar() == 1
+    assert reabierto.obtener("0") is None
+
+
+def test_lapidas_y_compactacion(tmp_path):
+    almacen = AlmacenHistorial(tmp_path / "historial.db")
+    almacen.COMPACTAR_MIN = 2
+    for i in range(4):
+        almacen.agregar(_item(i))
+    assert almacen.eliminar("1")
+    assert not almacen.eliminar("1")
+    assert not almacen.necesita_compactar()
+    almacen.eliminar("2")
+    assert almacen.necesita_compactar()
+    assert almacen.compactar() == 2
+    assert almacen.lapidas() == 0
+    assert [it["id"] for it in almacen.listar_metadatos()] == ["0", "3"]
+
+
+def test_paginacion_por_cursor(tmp_path):
+    almacen = AlmacenHistorial(tmp_path / "historial.db")
+    for i in range(5):
+        almacen.agregar(_item(i))
+    almacen.agregar({**_item(9), "tipo": "Resumen"})
+
+    vistos = []
+    cursor = None
+    while True:
+        pagina, cursor = almacen.listar_pagina(limite=2, cursor=cursor, orden="desc", tipo="Informe")
+        vistos.extend(it["id"] for it in pagina)
+        assert all("contenido" not in it for it in pagina)
+        if cursor is None:
+            break
+    assert vistos == ["4", "3", "2", "1", "0"]
+
+    rango, _ = almacen.listar_pagina(desde="2024-01-02", hasta="2024-01-03T23:59:59")
+    assert [it["id"] for it in rango] == ["1", "2"]
+    # Una fecha sin hora en ``hasta`` incluye todo ese día
+    rango, _ = almacen.listar_pagina(desde="2024-01-02", hasta="2024-01-03")
+    assert [it["id"] for it in rango] == ["1", "2"]
+
+
+def test_buscar_texto_bm25(tmp_path):
+    almacen = AlmacenHistorial(tmp_path / "historial.db")
+    almacen.agregar({**_item(0), "tema": "Energía solar", "contenido": "Proyecto PRJ-0042"})
+    almacen.agregar({**_item(1), "tema": "Logística", "contenido": "rutas y energia"})
+    almacen.agregar(_item(2))
+    resultados = almacen.buscar_texto("energia PRJ-0042")
+    assert [r["id"] for r in resultados] == ["0", "1"]
+    assert resultados[0]["snippet"] == "Proyecto PRJ-0042"
+    assert almacen.buscar_texto("energia", tipo="Otro") == []
+    assert [r["id"] for r in almacen.buscar_texto("energia", hasta=_item(1)["timestamp"][:10])] == ["0", "1"]
+
+    almacen.eliminar("0")
+    assert [r["id"] for r in almacen.buscar_texto("energia")] == ["1"]
+    almacen.agregar({**_item(1), "contenido": "sin coincidencias"})
+    assert almacen.buscar_texto("rutas") == []
+    almacen.compactar()
+    assert sorted(r["id"] for r in almacen.buscar_texto("tema")) == ["1", "2"]
@@ -0,0 +1,164 @@
+import pytest
+
+import backend.ingesta as ing
+import backend.main as bm
+
+
+def test_fragmentar_con_solape():
+    palabras = [f"p{i}" for i in range(25)]
+    frags = list(ing.fragmentar([(1, " ".join(palabras[:12])), (2, " ".join(palabras[12:]))], 10, 3))
+    assert [f.indice for f in frags] == [0, 1, 2, 3]
+    assert frags[0].texto.split() == palabras[:10]
+    assert frags[1].texto.split()[:3] == palabras[7:10]
+    assert [f.pagina for f in frags] == [1, 1, 2, 2]
+    assert frags[-1].texto.split()[-1] == "p24"
+
+
+def test_fragmentar_texto_corto_y_solape_invalido():
+    assert [f.texto for f in ing.fragmentar([(1, "hola mundo")])] == ["hola mundo"]
+    assert list(ing.fragmentar([(1, "")])) == []
+    with pytest.raises(ValueError):
+        list(ing.fragmentar([(1, "a")], 5, 5))
+
+
+class _Coleccion:
+    def __init__(self):
+        self.llamadas = []
+
+    def upsert(self, **kwargs):
+        self.llamadas.append(kwargs)
+
+
+def test_agregar_documento_por_fragmentos(monkeypatch):
+    col = _Coleccion()
+    monkeypatch.setattr(bm, "docs_collection", col)
+    paginas = [(1, "uno " * 200), (2, "dos " * 200)]
+    manifiesto = bm.agregar_documento("", fuente="a.pdf", paginas=paginas)
+    ids = [i for ll in col.llamadas for i in ll["ids"]]
+    metas = [m for ll in col.llamadas for m in ll["metadatas"]]
+    assert [f["id"] for f in manifiesto] == ids
+    assert len(ids) > 2
+    assert len(set(ids)) == len(ids)
+    assert {m["fuente"] for m in metas} == {"a.pdf"}
+    assert {m["pagina"] for m in metas} == {1, 2}
+
+
+class _PaginaFalsa:
+    def __init__(self, n):
+        self.n = n
+
+    def get_text(self):
+        return f"texto {self.n}"
+
+
+class _DocFalso:
+    def __init__(self, paginas):
+        self.paginas = paginas
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __len__(self):
+        return self.paginas
+
+    def load_page(self, i):
+        return _PaginaFalsa(i + 1)
+
+
+class _FitzFalso:
+    def __init__(self, paginas):
+        self.paginas = paginas
+
+    def open(self, path):
+        return _DocFalso(self.paginas)
+
+
+def test_paginas_pdf_en_streaming():
+    paginas = ing.paginas_pdf("x.pdf", fitz=_FitzFalso(3))
+    assert next(paginas) == (1, "texto 1")
+    assert list(paginas) == [(2, "texto 2"), (3, "texto 3")]
+
+
+def test_paginas_pdf_limite():
+    with pytest.raises(ing.LimiteExcedido):
+        list(ing.paginas_pdf("x.pdf", fitz=_FitzFalso(10), max_paginas=5))
+
+
+def test_documento_demasiado_grande(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(bm, "MAX_DOCUMENTO_BYTES", 10)
+    file = tmp_path / "grande.txt"
+    file.write_text("x" * 100, encoding="utf-8")
+    with file.open("rb") as fh:
+        resp = TestClient(bm.app).post("/documento", files={"file": ("grande.txt", fh, "text/plain")})
+    assert resp.status_code == 413
+
+
+def test_documento_repetido_no_se_reindexa(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    col = _Coleccion()
+    monkeypatch.setattr(bm, "docs_collection", col)
+    monkeypatch.setattr(bm, "CACHE_DIR", tmp_path / "cache")
+    file = tmp_path / "ref.txt"
+    file.write_text("referencia " * 50, encoding="utf-8")
+    cliente = TestClient(bm.app)
+    respuestas = []
+    for nombre in ("ref.txt", "copia.txt"):
+        with file.open("rb") as fh:
+            respuestas.append(cliente.post("/documento", files={"file": (nombre, fh, "text/plain")}))
+    assert respuestas[0].json() == respuestas[1].json()
+    assert len(col.llamadas) == 1
+    doc_id = col.llamadas[0]["metadatas"][0]["doc_id"]
+    assert len(doc_id) == 64
+    assert bm.manifiestos_documentos().cargar(doc_id)["fuente"] == "ref.txt"
+
+
+def test_ingesta_asincrona(monkeypatch, tmp_path):
+    import time
+
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(bm, "docs_collection", _Coleccion())
+    monkeypatch.setattr(bm, "CACHE_DIR", tmp_path / "cache")
+    file = tmp_path / "cola.txt"
+    file.write_text("texto en cola " * 100, encoding="utf-8")
+    cliente = TestClient(bm.app)
+    with file.open("rb") as fh:
+        resp = cliente.post("/documentos", files={"file": ("cola.txt", fh, "text/plain")})
+    assert resp.status_code == 202
+    trabajo = resp.json()["id"]
+    for _ in range(100):
+        estado = cliente.get(f"/documentos/{trabajo}").json()
+        if estado["estado"] in ("completado", "error"):
+            break
+        time.sleep(0.02)
+    assert estado["estado"] == "completado"
+    assert estado["paginas"] == 1 and estado["fragmentos"] > 1
+    texto = cliente.get(f"/documentos/{trabajo}/texto").json()["contenido"]
+    assert texto.startswith("texto en cola")
+    assert cliente.get("/documentos/otro").status_code == 404
+
+
+def test_ingesta_asincrona_limpia_subida_si_falla_encolar(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    def fallar(*args, **kwargs):
+        raise RuntimeError("cola caída")
+
+    subidas = tmp_path / "uploads"
+    subidas.mkdir()
+    monkeypatch.setattr(bm, "UPLOAD_DIR", subidas)
+    monkeypatch.setattr(bm, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(bm.cola_ingesta, "enviar", fallar)
+    file = tmp_path / "cola.txt"
+    file.write_text("texto en cola " * 100, encoding="utf-8")
+    cliente = TestClient(bm.app, raise_server_exceptions=False)
+    with file.open("rb") as fh:
+        resp = cliente.post("/documentos", files={"file": ("cola.txt", fh, "text/plain")})
+    assert resp.status_code == 500
+    assert list(subidas.iterdir()) == []
@@ -0,0 +1,20 @@
+from backend.llm_cache import CacheLLM
+
+
+def test_expulsion_lru(tmp_path):
+    cache = CacheLLM(tmp_path / "c.db", max_entradas=2)
+    cache.guardar("a", "1", segundos=2.0)
+    cache.guardar("b", "2")
+    assert cache.obtener("a") == "1"
+    cache.guardar("c", "3")
+    assert cache.obtener("b") is None
+    assert cache.obtener("a") == "1"
+    stats = cache.estadisticas()
+    assert stats["entradas"] == 2
+    assert stats["segundos_ahorrados"] == 4.0
+
+
+def test_ttl(tmp_path):
+    cache = CacheLLM(tmp_path / "c.db", ttl=-1)
+    cache.guardar("a", "1")
+    assert cache.obtener("a") is None
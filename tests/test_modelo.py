@@ -0,0 +1,54 @@
+import json
+
+import httpx
+
+from backend.modelo import GestorModelo, normalizar_host
+
+
+def _gestor(handler) -> GestorModelo:
+    gestor = GestorModelo("127.0.0.1:11434", "mistral", keep_alive="10m")
+    gestor._cliente = httpx.Client(base_url=gestor.host, transport=httpx.MockTransport(handler))
+    return gestor
+
+
+def test_precalentar_y_generar_con_keep_alive():
+    cuerpos = []
+
+    def handler(request):
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": [{"name": "mistral:latest"}]})
+        cuerpos.append(json.loads(request.content))
+        return httpx.Response(200, json={"response": "hola", "done": True})
+
+    gestor = _gestor(handler)
+    assert gestor.estado()["estado"] == "desconocido"
+    assert gestor.precalentar()
+    assert gestor.estado()["listo"]
+    assert gestor.instalados == ["mistral:latest"]
+    assert gestor.generar("hi") == "hola"
+    assert all(c["keep_alive"] == "10m" and c["model"] == "mistral" for c in cuerpos)
+    assert cuerpos[0]["prompt"] == ""
+
+
+def test_generar_stream():
+    lineas = [{"response": "ho"}, {"response": "la"}, {"response": "", "done": True}]
+
+    def handler(request):
+        return httpx.Response(200, content="\n".join(json.dumps(x) for x in lineas))
+
+    assert list(_gestor(handler).generar_stream("hi")) == ["ho", "la"]
+
+
+def test_servidor_caido_no_se_reintenta_enseguida():
+    def handler(request):
+        raise httpx.ConnectError("rechazada")
+
+    gestor = _gestor(handler)
+    assert not gestor.precalentar()
+    assert gestor.estado()["estado"] == "no_disponible"
+    assert not gestor.disponible()
+
+
+def test_normalizar_host():
+    assert normalizar_host("localhost:11434/") == "http://localhost:11434"
+    assert normalizar_host("https://ollama:1") == "https://ollama:1"
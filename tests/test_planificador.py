@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.planificador import (
+    INTERACTIVA,
+    MASIVA,
+    Cancelacion,
+    ColaLLMLlena,
+    PlanificadorLLM,
+    TurnoCancelado,
+)
+
+
+def _lanzar(planificador, orden, nombre, prioridad, sesion="s"):
+    def trabajo():
+        with planificador.turno(prioridad, sesion):
+            orden.append(nombre)
+
+    hilo = threading.Thread(target=trabajo)
+    hilo.start()
+    return hilo
+
+
+def _esperar_cola(planificador, n):
+    for _ in range(200):
+        if planificador.metricas()["en_cola"] == n:
+            return
+        time.sleep(0.005)
+    raise AssertionError("la cola no alcanzó el tamaño esperado")
+
+
+def test_interactivas_adelantan_y_sesiones_se_turnan():
+    planificador = PlanificadorLLM(capacidad=1)
+    orden = []
+    with planificador.turno(MASIVA, "a"):
+        hilos = [
+            _lanzar(planificador, orden, "a1", MASIVA, "a"),
+            _lanzar(planificador, orden, "a2", MASIVA, "a"),
+        ]
+        _esperar_cola(planificador, 2)
+        hilos.append(_lanzar(planificador, orden, "b1", MASIVA, "b"))
+        _esperar_cola(planificador, 3)
+        hilos.append(_lanzar(planificador, orden, "chat", INTERACTIVA, "c"))
+        _esperar_cola(planificador, 4)
+    for hilo in hilos:
+        hilo.join(2)
+    assert orden == ["chat", "a1", "b1", "a2"]
+    metricas = planificador.metricas()
+    assert metricas["en_curso"] == 0
+    assert metricas["clases"]["masiva"]["atendidas"] == 4
+
+
+def test_cola_acotada():
+    planificador = PlanificadorLLM(capacidad=1, max_cola=0)
+    with planificador.turno():
+        with pytest.raises(ColaLLMLlena):
+            with planificador.turno():
+                pass
+    assert planificador.metricas()["clases"]["normal"]["rechazadas"] == 1
+
+
+def test_turno_async_cancelado_no_pierde_huecos():
+    planificador = PlanificadorLLM(capacidad=1)
+
+    async def escenario():
+        async with planificador.turno_async():
+            tarea = asyncio.create_task(planificador.turno_async().__aenter__())
+            await asyncio.sleep(0.01)
+            tarea.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tarea
+        async with planificador.turno_async(INTERACTIVA):
+            return planificador.metricas()["en_curso"]
+
+    assert asyncio.run(escenario()) == 1
+    assert planificador.metricas()["en_curso"] == 0
+
+
+def test_cancelacion_retira_la_espera_de_la_cola():
+    planificador = PlanificadorLLM(capacidad=1)
+    cancelacion = Cancelacion()
+    resultado = []
+
+    def especulativo():
+        try:
+            with planificador.turno(MASIVA, "esp", cancelacion):
+                resultado.append("ejecutado")
+        except TurnoCancelado:
+            resultado.append("cancelado")
+
+    with planificador.turno(INTERACTIVA, "a"):
+        hilo = threading.Thread(target=especulativo)
+        hilo.start()
+        _esperar_cola(planificador, 1)
+        cancelacion.cancelar()
+        hilo.join(2)
+        assert resultado == ["cancelado"]
+        assert planificador.metricas()["en_cola"] == 0
+    assert planificador.metricas()["en_curso"] == 0
+    with pytest.raises(TurnoCancelado):
+        with planificador.turno(MASIVA, "esp", cancelacion):
+            pass
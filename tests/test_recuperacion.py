@@ -0,0 +1,38 @@
+from backend.recuperacion import PoliticaContexto, mmr, seleccionar_contexto
+
+
+def _resultado(docs, distancias, vectores):
+    return {
+        "documents": [docs],
+        "metadatas": [[{"fuente": f"d{i}"} for i in range(len(docs))]],
+        "distances": [distancias],
+        "embeddings": [vectores],
+    }
+
+
+def test_umbral_y_mmr_descartan_irrelevantes_y_repetidos():
+    res = _resultado(
+        ["a", "a bis", "b", "lejano"],
+        [0.2, 0.21, 0.4, 1.9],
+        [[1.0, 0.0], [0.99, 0.01], [0.0, 1.0], [0.5, 0.5]],
+    )
+    politica = PoliticaContexto(k=2, similitud_min=0.3, lambda_mmr=0.5)
+    elegidos = seleccionar_contexto(res, politica)
+    assert [doc for doc, _ in elegidos] == ["a", "b"]
+
+
+def test_presupuesto_de_tokens():
+    docs = ["x" * 400, "y" * 400, "z" * 400]
+    res = _resultado(docs, [0.1, 0.2, 0.3], [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    elegidos = seleccionar_contexto(res, PoliticaContexto(k=3, max_tokens=250))
+    assert len(elegidos) == 2
+
+
+def test_mmr_sin_vectores_respeta_relevancia():
+    assert mmr([0.1, 0.9, 0.5], [None, None, None], 2) == [1, 2]
+
+
+def test_consultas_cortas_no_recuperan():
+    politica = PoliticaContexto(min_palabras=4)
+    assert not politica.merece_recuperar("hola")
+    assert politica.merece_recuperar("resume el informe de ventas trimestral")
@@ -0,0 +1,55 @@
+import pytest
+
+import backend.secciones as sec
+
+
+def test_parsear_estructura():
+    texto = (
+        "Estructura propuesta:\n"
+        "1. Introducción: contexto del tema\n"
+        "   - antecedentes\n"
+        "1.1 Alcance\n"
+        "2. Marco teórico - conceptos clave\n"
+        "**Metodología**: enfoque mixto\n"
+        "## Conclusiones\n"
+    )
+    secciones = sec.parsear_estructura(texto)
+    assert [s.titulo for s in secciones] == [
+        "Introducción",
+        "Marco teórico",
+        "Metodología",
+        "Conclusiones",
+    ]
+    assert "antecedentes" in secciones[0].descripcion
+    assert secciones[1].descripcion == "conceptos clave"
+
+
+def test_estructura_vacia_usa_secciones_por_defecto():
+    titulos = [s.titulo for s in sec.parsear_estructura("")]
+    assert titulos == list(sec.SECCIONES_POR_DEFECTO)
+
+
+def test_reanuda_desde_checkpoint(tmp_path):
+    secciones = sec.parsear_estructura("1. Uno\n2. Dos\n3. Tres")
+    checkpoints = sec.AlmacenCheckpoints(tmp_path)
+    prompts = []
+
+    def construir(i, resumen):
+        return f"{i}|{resumen}"
+
+    def falla_en_tercera(prompt):
+        prompts.append(prompt)
+        if prompt.startswith("2|"):
+            raise RuntimeError("caída")
+        return f"Texto de la sección {prompt[0]}."
+
+    with pytest.raises(RuntimeError):
+        list(sec.generar_por_secciones(secciones, construir, falla_en_tercera, checkpoints, "k"))
+    assert "Uno: Texto de la sección 0." in prompts[1]
+
+    prompts.clear()
+    eventos = list(
+        sec.generar_por_secciones(secciones, construir, lambda p: "fin", checkpoints, "k")
+    )
+    assert [e["reanudada"] for e in eventos] == [True, True, False]
+    assert eventos[2]["contenido"] == "fin"
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from backend.sesiones import AlmacenSesiones
+
+
+def test_persiste_entre_instancias(tmp_path):
+    path = tmp_path / "sesiones.db"
+    almacen = AlmacenSesiones(path)
+    almacen.guardar("conversacion", "c1", {"paso": 2, "tema": "IA"})
+    assert almacen.cargar("conversacion", "c1") == {"paso": 2, "tema": "IA"}
+    assert almacen.cargar("idioma", "c1") is None
+
+    # Un reinicio recupera la conversación desde disco
+    otro = AlmacenSesiones(path)
+    assert otro.cargar("conversacion", "c1") == {"paso": 2, "tema": "IA"}
+    assert otro.estadisticas()["restauradas"] == 1
+
+
+def test_expulsion_lru_y_caducidad(tmp_path):
+    almacen = AlmacenSesiones(max_memoria=2)
+    for i in range(3):
+        almacen.guardar("conversacion", str(i), {"paso": i})
+    almacen.cargar("conversacion", "1")
+    stats = almacen.estadisticas()
+    assert stats["vivas"] == 2 and stats["expulsadas"] == 1
+    # Sin disco la sesión expulsada se pierde
+    assert almacen.cargar("conversacion", "0") is None
+
+    persistente = AlmacenSesiones(tmp_path / "s.db", max_memoria=1)
+    persistente.guardar("conversacion", "a", {"paso": 1})
+    persistente.guardar("conversacion", "b", {"paso": 2})
+    assert persistente.cargar("conversacion", "a") == {"paso": 1}
+
+    persistente.ttl = 0.01
+    time.sleep(0.02)
+    assert persistente.cargar("conversacion", "a") is None
+    assert persistente.purgar() == 0
+    assert persistente.estadisticas()["en_disco"] == 0
+
+
+def test_bloqueo_por_sesion():
+    almacen = AlmacenSesiones(max_memoria=1)
+
+    async def flujo():
+        orden = []
+        almacen.guardar("conversacion", "a", {"paso": 1})
+
+        async def segunda():
+            async with almacen.bloquear("conversacion", "a"):
+                orden.append("segunda")
+
+        async with almacen.bloquear("conversacion", "a"):
+            # Otra conversación no espera al lock de la primera
+            async with almacen.bloquear("conversacion", "b"):
+                pass
+            espera = asyncio.create_task(segunda())
+            await asyncio.sleep(0)
+            # Expulsar o borrar la sesión no cambia el lock que se está usando
+            almacen.guardar("conversacion", "c", {"paso": 1})
+            almacen.eliminar("conversacion", "a")
+            await asyncio.sleep(0.01)
+            orden.append("primera")
+        await asyncio.wait_for(espera, 1)
+        assert orden == ["primera", "segunda"]
+        assert almacen._bloqueos == {}
+
+    asyncio.run(flujo())
+
+
+def test_guardar_no_borra_caducadas_hasta_purgar(tmp_path):
+    almacen = AlmacenSesiones(tmp_path / "s.db", ttl=0.5)
+    almacen.guardar("conversacion", "vieja", {"paso": 1})
+    time.sleep(0.6)
+    almacen.guardar("conversacion", "nueva", {"paso": 2})
+    assert almacen.estadisticas()["en_disco"] == 2
+    almacen.purgar()
+    assert almacen.estadisticas()["en_disco"] == 1
+    assert almacen.cargar("conversacion", "nueva") == {"paso": 2}
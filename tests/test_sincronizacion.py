@@ -0,0 +1,88 @@
+from backend.historial_store import AlmacenHistorial
+from backend.sincronizacion import ReconciliadorChroma
+
+
+class ColeccionFalsa:
+    def __init__(self, ids, metadatas=None):
+        self.ids = set(ids)
+        self.metadatas = dict(metadatas or {})
+        self.upserts = []
+        self.gets = 0
+
+    def get(self, include, limit, offset):
+        self.gets += 1
+        ids = sorted(self.ids)[offset:offset + limit]
+        res = {"ids": ids}
+        if "metadatas" in include:
+            res["metadatas"] = [self.metadatas.get(i, {}) for i in ids]
+        return res
+
+    def upsert(self, ids, embeddings, metadatas):
+        self.upserts.append(list(ids))
+        self.ids.update(ids)
+        self.metadatas.update(zip(ids, metadatas))
+
+    def update(self, ids, metadatas):
+        self.metadatas.update(zip(ids, metadatas))
+
+    def delete(self, ids):
+        self.ids.difference_update(ids)
+
+
+def test_reconcilia_solo_faltantes(tmp_path):
+    almacen = AlmacenHistorial(tmp_path / "h.db")
+    for i in range(5):
+        almacen.agregar({"id": str(i), "tema": "t", "tipo": "r", "contenido": "c", "timestamp": "2024"})
+    col = ColeccionFalsa({"0", "1", "huerfano"})
+    codificados = []
+
+    def codificar_lote(textos):
+        codificados.append(len(textos))
+        return [[0.0] for _ in textos]
+
+    rec = ReconciliadorChroma(lote=2, pagina_ids=2)
+    progreso = rec.ejecutar(col, almacen, codificar_lote, lambda it: {"tema": it["tema"]})
+    assert progreso["estado"] == "completado"
+    assert progreso["faltantes"] == 3 and progreso["procesados"] == 3
+    assert progreso["huerfanos"] == 1
+    assert codificados == [2, 1]
+    assert col.ids == {"0", "1", "2", "3", "4"}
+    assert col.gets == 2
+
+
+def test_no_borra_el_vector_de_un_informe_guardado_durante_la_reconciliacion(tmp_path):
+    almacen = AlmacenHistorial(tmp_path / "h.db")
+    col = ColeccionFalsa({"nuevo"})
+    listar_chroma = col.get
+
+    def get(include, limit, offset):
+        res = listar_chroma(include, limit, offset)
+        # El informe llega al historial después de listar Chroma
+        almacen.agregar({"id": "nuevo", "tema": "t", "tipo": "r", "contenido": "c", "timestamp": "2024"})
+        return res
+
+    col.get = get
+    rec = ReconciliadorChroma(lote=2, pagina_ids=2)
+    progreso = rec.ejecutar(col, almacen, lambda textos: [[0.0] for _ in textos], lambda it: {})
+    assert progreso["estado"] == "completado"
+    assert col.ids == {"nuevo"}
+
+
+def test_completa_metadatos_antiguos_sin_recodificar(tmp_path):
+    almacen = AlmacenHistorial(tmp_path / "h.db")
+    for i in range(3):
+        almacen.agregar({"id": str(i), "tema": "t", "tipo": "r", "contenido": "c", "timestamp": "2024"})
+    col = ColeccionFalsa(
+        {"0", "1", "2"},
+        {"0": {"tema": "t"}, "1": {"tema": "t", "ts": 1.0}, "2": {"tema": "t", "ts": 1.0, "snippet": "c"}},
+    )
+    codificados = []
+    rec = ReconciliadorChroma(lote=2, campos=("snippet", "ts"))
+    progreso = rec.ejecutar(
+        col, almacen, codificados.append, lambda it: {"tema": it["tema"], "ts": 2.0, "snippet": "c"}
+    )
+    assert progreso["estado"] == "completado"
+    assert progreso["actualizados"] == 2
+    assert codificados == []
+    assert col.metadatas["0"]["ts"] == 2.0 and col.metadatas["1"]["snippet"] == "c"
+    assert col.metadatas["2"]["ts"] == 1.0
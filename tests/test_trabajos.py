@@ -0,0 +1,44 @@
+import threading
+import time
+
+import pytest
+
+from backend.trabajos import ColaLlena, ColaTrabajos
+
+
+def _esperar(cola, trabajo_id):
+    for _ in range(200):
+        estado = cola.estado(trabajo_id)
+        if estado["estado"] in ("completado", "error"):
+            return estado
+        time.sleep(0.01)
+    raise AssertionError("el trabajo no terminó")
+
+
+def test_trabajo_publica_avance_y_errores():
+    cola = ColaTrabajos(workers=1)
+
+    def ok(actualizar):
+        actualizar(paginas=3)
+        return "hecho"
+
+    def falla(actualizar):
+        raise ValueError("roto")
+
+    estado = _esperar(cola, cola.enviar(ok, fuente="a"))
+    assert estado["paginas"] == 3 and estado["resultado"] == "hecho" and estado["fuente"] == "a"
+    estado = _esperar(cola, cola.enviar(falla))
+    assert estado["estado"] == "error" and estado["error"] == "roto"
+    assert cola.estado("desconocido") is None
+    cola.cerrar()
+
+
+def test_cola_llena():
+    cola = ColaTrabajos(workers=1, max_pendientes=1)
+    liberar = threading.Event()
+    trabajo = cola.enviar(lambda actualizar: liberar.wait(1))
+    with pytest.raises(ColaLlena):
+        cola.enviar(lambda actualizar: None)
+    liberar.set()
+    _esperar(cola, trabajo)
+    cola.cerrar()